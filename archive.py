@@ -0,0 +1,127 @@
+import os
+import uuid
+from datetime import datetime
+
+# Cold tier for emergency_requests: immutable, zstd-compressed Parquet parts
+# under <archive_dir>/month=YYYY-MM/. Parts are only ever added; the
+# archive_parts table in the live DB is the list of parts that exist, so a part
+# file that is not listed there (e.g. left by a crashed archive run) is ignored.
+# pyarrow is only needed once something has been archived.
+
+COLUMNS = [
+    "request_rowid", "request_id", "user_id", "name", "latitude", "longitude", "type_code",
+    "subtype_code", "details", "timestamp", "geohash", "idempotency_key",
+]
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Archived requests need pyarrow: pip install pyarrow")
+    return pyarrow
+
+def schema():
+    pa = _pyarrow()
+    return pa.schema([
+        ("request_rowid", pa.int64()),
+        ("request_id", pa.string()),
+        ("user_id", pa.string()),
+        ("name", pa.string()),  # still Fernet-encrypted
+        ("latitude", pa.float64()),
+        ("longitude", pa.float64()),
+        ("type_code", pa.string()),
+        ("subtype_code", pa.string()),
+        ("details", pa.string()),
+        ("timestamp", pa.timestamp("us")),
+        ("geohash", pa.string()),
+        ("idempotency_key", pa.string()),
+    ])
+
+def part_path(archive_dir: str, month: str, min_rowid: int, max_rowid: int) -> str:
+    # A VACUUM can renumber rowids, so the range alone is not unique
+    suffix = uuid.uuid4().hex[:8]
+    return os.path.join(archive_dir, f"month={month}", f"part-{min_rowid:012d}-{max_rowid:012d}-{suffix}.parquet")
+
+def write_part(path: str, rows: list):
+    """Write rows (dicts with COLUMNS) to a new part file; atomic and durable once it returns."""
+    pa = _pyarrow()
+    table = pa.Table.from_pylist(rows, schema=schema()).sort_by([("timestamp", "descending"), ("request_id", "descending")])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    pa.parquet.write_table(table, tmp, compression="zstd", row_group_size=16 * 1024)
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _filter_expression(type_code=None, subtype_code=None, start: datetime = None, end: datetime = None,
+                       before: tuple = None):
+    pa = _pyarrow()
+    pc = pa.compute
+    ts = pc.field("timestamp")
+    conditions = []
+    if type_code:
+        conditions.append(pc.field("type_code") == type_code)
+    if subtype_code:
+        conditions.append(pc.field("subtype_code") == subtype_code)
+    if start:
+        conditions.append(ts >= pa.scalar(start, pa.timestamp("us")))
+    if end:
+        conditions.append(ts <= pa.scalar(end, pa.timestamp("us")))
+    if before:
+        before_ts = pa.scalar(before[0], pa.timestamp("us"))
+        conditions.append((ts < before_ts) | ((ts == before_ts) & (pc.field("request_id") < before[1])))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+def read_requests(parts: list, type_code=None, subtype_code=None, start: datetime = None, end: datetime = None,
+                  before: tuple = None, limit: int = 1000) -> list:
+    """Newest-first archived requests matching the filters, at most `limit`.
+
+    parts is a list of (path, min_timestamp, max_timestamp), already pruned
+    to the ones that can match; before is a (timestamp, request_id) keyset
+    cursor. Parts are read newest first and reading stops as soon as the
+    remaining parts cannot contribute to the page.
+    """
+    pa = _pyarrow()
+    expression = _filter_expression(type_code, subtype_code, start, end, before)
+    tables = []
+    found = 0
+    page_floor = None
+    for path, _, max_ts in sorted(parts, key=lambda p: p[2], reverse=True):
+        if page_floor is not None and max_ts < page_floor:
+            break
+        table = pa.parquet.read_table(path, columns=COLUMNS, filters=expression)
+        if table.num_rows:
+            tables.append(table)
+            found += table.num_rows
+        if found >= limit:
+            # Oldest timestamp that can still make the page
+            merged = pa.concat_tables(tables).sort_by([("timestamp", "descending"), ("request_id", "descending")])
+            tables = [merged.slice(0, limit)]
+            found = limit
+            page_floor = merged["timestamp"][limit - 1].as_py()
+    if not tables:
+        return []
+    merged = pa.concat_tables(tables).sort_by([("timestamp", "descending"), ("request_id", "descending")])
+    return merged.slice(0, limit).to_pylist()
+
+def iter_requests(parts: list, type_code=None, subtype_code=None, start: datetime = None, end: datetime = None,
+                  batch_size: int = 1000):
+    """Yield matching archived requests in lists of at most batch_size dicts.
+
+    Reads one record batch at a time, so memory stays flat however large
+    the parts are. Newest part first; newest first within each part.
+    """
+    pa = _pyarrow()
+    expression = _filter_expression(type_code, subtype_code, start, end)
+    for path, _, _ in sorted(parts, key=lambda p: p[2], reverse=True):
+        parquet_file = pa.parquet.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=COLUMNS):
+            if expression is not None:
+                batch = pa.Table.from_batches([batch]).filter(expression)
+            if batch.num_rows:
+                yield batch.to_pylist()
@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+import archive
+from main import engine, prepare_database, EmergencyRequest, ArchivePart, REQUEST_ROWID, ARCHIVE_DIR
+
+# Moves emergency requests older than --older-than-days out of the live DB and
+# into monthly Parquet parts under ARCHIVE_DIR. Each batch writes its part
+# files first and then, in one transaction, lists them in archive_parts and
+# deletes the rows, so a crash at any point leaves every request in exactly one
+# tier. Part files left unlisted by a crash are removed on the next run.
+#
+# The newest request (highest rowid) is never archived, even when it is old
+# enough. emergency_requests has no AUTOINCREMENT, so SQLite gives a new row
+# max(rowid) + 1: deleting the max row would hand its rowid to the next
+# request, and delta cursors and the incident replay (rowid > last seen) would
+# skip it. Keeping that row makes the max, and so every new rowid, only grow.
+#
+# The live database is not VACUUMed afterwards: SQLite reuses the freed pages
+# for new requests. emergency_requests has no INTEGER PRIMARY KEY, so a VACUUM
+# may renumber its rowids, which the live feed's delta cursors, the admin API
+# ETags, archive_parts' rowid ranges and the search index all rely on.
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", 180))
+
+def remove_orphans(listed: set):
+    removed = 0
+    for root, _, files in os.walk(ARCHIVE_DIR):
+        for name in files:
+            path = os.path.relpath(os.path.join(root, name), ARCHIVE_DIR)
+            if path not in listed and (name.endswith(".parquet") or name.endswith(".tmp")):
+                os.remove(os.path.join(ARCHIVE_DIR, path))
+                removed += 1
+    if removed:
+        print(f"Removed {removed} unlisted part files from an interrupted run.")
+
+async def archive_requests(older_than_days: int, batch_size: int):
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    await prepare_database()
+    async with engine.begin() as conn:
+        listed = {path for (path,) in await conn.execute(select(ArchivePart.path))}
+    remove_orphans(listed)
+    columns = [REQUEST_ROWID.label("request_rowid")] + [
+        getattr(EmergencyRequest, name) for name in archive.COLUMNS if name != "request_rowid"
+    ]
+    newest = select(func.max(REQUEST_ROWID)).select_from(EmergencyRequest.__table__).scalar_subquery()
+    total = 0
+    while True:
+        async with engine.connect() as conn:
+            rows = (await conn.execute(
+                select(*columns)
+                .where(EmergencyRequest.timestamp < cutoff)
+                .where(REQUEST_ROWID < newest)
+                .order_by(EmergencyRequest.timestamp)
+                .limit(batch_size)
+            )).mappings().fetchall()
+        if not rows:
+            break
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(row["timestamp"].strftime("%Y-%m"), []).append(dict(row))
+        parts = []
+        for month, month_rows in by_month.items():
+            rowids = [r["request_rowid"] for r in month_rows]
+            path = archive.part_path(ARCHIVE_DIR, month, min(rowids), max(rowids))
+            await asyncio.to_thread(archive.write_part, path, month_rows)
+            parts.append({
+                "path": os.path.relpath(path, ARCHIVE_DIR),
+                "month": month,
+                "min_timestamp": min(r["timestamp"] for r in month_rows),
+                "max_timestamp": max(r["timestamp"] for r in month_rows),
+                "min_rowid": min(rowids),
+                "max_rowid": max(rowids),
+                "rows": len(month_rows),
+                "created_at": datetime.utcnow(),
+            })
+        async with engine.begin() as conn:
+            await conn.execute(ArchivePart.__table__.insert(), parts)
+            rowids = [r["request_rowid"] for r in rows]
+            for i in range(0, len(rowids), 500):
+                await conn.execute(EmergencyRequest.__table__.delete().where(REQUEST_ROWID.in_(rowids[i:i + 500])))
+        total += len(rows)
+        print(f"Archived {total} requests (up to {rows[-1]['timestamp']:%Y-%m-%d})...", flush=True)
+    print(f"Archive complete: moved {total} requests older than {cutoff:%Y-%m-%d} to {ARCHIVE_DIR}.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old emergency requests into monthly Parquet archive files.")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=50000, help="requests per archive transaction")
+    args = parser.parse_args()
+    engine.echo = False
+    asyncio.run(archive_requests(args.older_than_days, args.batch_size))
@@ -0,0 +1,84 @@
+"""Throughput of one-commit-per-SOS vs. the group-commit writer.
+
+Runs against a throwaway database:
+
+    python benchmarks/bench_group_commit.py --requests 5000 --concurrency 200
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="sos-bench-")
+os.environ.setdefault("FERNET_KEY", "Ekpu5BCIHUqK7ylLzTl2h70oKiu0gWjYHJS_G0QLrkU=")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+logging.disable(logging.INFO)
+
+import geohash
+import main
+from group_commit import GroupCommitWriter
+
+def make_row(user_id: str) -> dict:
+    return {
+        "request_id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "name": main.fernet.encrypt(b"Bench").decode(),
+        "latitude": 28.6,
+        "longitude": 77.2,
+        "type_code": "ATTACK",
+        "subtype_code": "BULLETS",
+        "details": None,
+        "timestamp": datetime.utcnow(),
+        "geohash": geohash.encode(28.6, 77.2),
+    }
+
+async def one_commit_per_request(row):
+    async with main.SessionLocal() as session:
+        await main.insert_requests(session, [row])
+        await session.commit()
+
+async def run(label, write, rows, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    async def one(row):
+        async with semaphore:
+            await write(row)
+    started = time.perf_counter()
+    await asyncio.gather(*(one(row) for row in rows))
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {len(rows):>7} rows  {elapsed:8.2f}s  {len(rows) / elapsed:10.0f} rows/s")
+    return len(rows) / elapsed
+
+async def bench(requests: int, concurrency: int, batch: int, delay_ms: int):
+    main.engine.echo = False
+    await main.prepare_database()
+    user_id = str(uuid.uuid4())
+    async with main.SessionLocal() as session:
+        await session.execute(main.User.__table__.insert().values(user_id=user_id, phone="9000000000", name="Bench"))
+        await session.commit()
+
+    baseline = await run("one commit per request", one_commit_per_request,
+                         [make_row(user_id) for _ in range(requests)], concurrency)
+    writer = GroupCommitWriter(main.flush_requests, max_batch=batch, max_delay=delay_ms / 1000)
+    await writer.start()
+    grouped = await run(f"group commit ({batch}/{delay_ms}ms)", writer.submit,
+                        [make_row(user_id) for _ in range(requests)], concurrency)
+    await writer.stop()
+    print(f"speedup: {grouped / baseline:.1f}x  writer: {writer.stats()}  synchronous={main.SQLITE_SYNCHRONOUS}")
+    await main.engine.dispose()
+    shutil.rmtree(os.environ["DATA_DIR"], ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=main.SUBMIT_BATCH_SIZE)
+    parser.add_argument("--delay-ms", type=int, default=main.SUBMIT_BATCH_DELAY_MS)
+    args = parser.parse_args()
+    asyncio.run(bench(args.requests, args.concurrency, args.batch, args.delay_ms))
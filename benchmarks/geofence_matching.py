@@ -0,0 +1,121 @@
+"""Benchmark: matching reports against tens of thousands of geofences.
+
+Registers N synthetic geofences (circles and polygons of 200 m to 20 km
+around Indian cities, a third of them limited to some report types), times
+validating them the way /admin/api/geofences does and building the index
+from their stored cells the way a worker reloads it, then times matching
+reports, checks a sample of answers against a brute-force scan over every
+geofence, and times adding and removing one geofence:
+
+    python benchmarks/geofence_matching.py --geofences 50000
+    python benchmarks/geofence_matching.py --geofences 200000 --reports 50000
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import geohash
+import geofences
+from nearest_facility import CITIES
+
+TYPE_FILTERS = [["ATTACK"], ["INJURY"], ["ATTACK", "INJURY"], ["MEDICAL"]]
+REPORT_TYPES = [("ATTACK", "BULLETS"), ("ATTACK", "DRONES"), ("INJURY", "DEATH"), ("INJURY", "MINOR"),
+                ("MEDICAL", None), ("HELPLINE", None)]
+
+def place(rng) -> tuple:
+    if rng.random() < 0.8:
+        lat, lon = rng.choice(CITIES)
+        return lat + rng.gauss(0, 0.3), lon + rng.gauss(0, 0.3)
+    return rng.uniform(8.0, 35.0), rng.uniform(68.0, 97.0)
+
+def random_geofence(rng, i: int) -> dict:
+    lat, lon = place(rng)
+    radius_m = min(math.exp(rng.uniform(math.log(200), math.log(20000))), geofences.MAX_RADIUS_M)
+    body = {"name": f"Geofence {i}", "subscriber": f"unit-{i % 500}"}
+    if rng.random() < 0.3:
+        body["type_codes"] = rng.choice(TYPE_FILTERS)
+    if rng.random() < 0.5:
+        body["circle"] = {"latitude": lat, "longitude": lon, "radius_m": radius_m}
+        return body
+    # A star-shaped polygon around (lat, lon)
+    vertices = rng.randint(6, 40)
+    dlat = radius_m / 1000 / geofences.KM_PER_DEGREE
+    dlon = dlat / math.cos(math.radians(lat))
+    ring = []
+    for k in range(vertices):
+        angle = 2 * math.pi * k / vertices
+        scale = rng.uniform(0.4, 1.0)
+        ring.append([lon + dlon * scale * math.cos(angle), lat + dlat * scale * math.sin(angle)])
+    ring.append(ring[0])
+    body["geometry"] = {"type": "Polygon", "coordinates": [ring]}
+    return body
+
+def percentile(sorted_values, pct):
+    return sorted_values[max(0, int(round(pct / 100 * len(sorted_values))) - 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--geofences", type=int, default=50000)
+    parser.add_argument("--reports", type=int, default=20000)
+    parser.add_argument("--verify", type=int, default=500, help="reports to check against a brute-force scan")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    bodies = [random_geofence(rng, i) for i in range(args.geofences)]
+    started = time.perf_counter()
+    rows = [SimpleNamespace(geofence_id=f"G{i:07d}", **geofences.parse_geofence(body)) for i, body in enumerate(bodies)]
+    elapsed = time.perf_counter() - started
+    print(f"validated {len(rows):,} geofences in {elapsed:.2f}s ({elapsed / len(rows) * 1e6:.0f}us each)")
+
+    started = time.perf_counter()
+    index = geofences.GeofenceIndex()
+    for row in rows:
+        index.add(geofences.Geofence.from_row(row), row.cells.split())
+    stats = index.stats()
+    print(f"built index in {time.perf_counter() - started:.2f}s: {stats['cells']:,} cells at precisions "
+          f"{stats['precisions']}")
+
+    reports = []
+    for _ in range(args.reports):
+        lat, lon = place(rng)
+        type_code, subtype_code = rng.choice(REPORT_TYPES)
+        reports.append((lat, lon, type_code, subtype_code, geohash.encode(lat, lon)))
+    latencies = []
+    matched = 0
+    for lat, lon, type_code, subtype_code, point_geohash in reports:
+        started = time.perf_counter()
+        result = index.match(lat, lon, type_code, subtype_code, point_geohash)
+        latencies.append(time.perf_counter() - started)
+        matched += len(result)
+    latencies.sort()
+    print(f"matched {args.reports:,} reports: p50 {percentile(latencies, 50) * 1e6:.1f}us  "
+          f"p99 {percentile(latencies, 99) * 1e6:.1f}us  max {latencies[-1] * 1e6:.1f}us  "
+          f"(mean {index.candidates / args.reports:.1f} candidates, {matched / args.reports:.2f} matches per report)")
+
+    all_geofences = [geofence for geofence, _ in index.geofences.values()]
+    mismatches = 0
+    for lat, lon, type_code, subtype_code, point_geohash in reports[:args.verify]:
+        expected = {g.geofence_id for g in all_geofences if g.accepts(type_code, subtype_code) and g.contains(lat, lon)}
+        got = {g.geofence_id for g in index.match(lat, lon, type_code, subtype_code, point_geohash)}
+        if got != expected:
+            mismatches += 1
+    print(f"brute-force check: {mismatches} mismatches in {min(args.verify, len(reports))} reports")
+
+    row = SimpleNamespace(geofence_id="new", **geofences.parse_geofence(random_geofence(rng, args.geofences)))
+    started = time.perf_counter()
+    index.add(geofences.Geofence.from_row(row), row.cells.split())
+    index.remove("new")
+    print(f"add + remove one geofence: {(time.perf_counter() - started) * 1e6:.0f}us")
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,494 @@
+"""Load test: throughput and p50/p95/p99 latency per route, in-process.
+
+Drives the ASGI app through httpx without a network, against a database
+seeded to the requested size, and saves the results as JSON:
+
+    python benchmarks/loadtest.py --rows 10000 --scenario mixed --duration 20
+    python benchmarks/loadtest.py --rows 1000000 --data-dir /tmp/sos-1m --keep
+    python benchmarks/loadtest.py --compare benchmarks/results/<earlier run>.json
+
+Seeding 1M+ rows takes a while; pass --data-dir and --keep to reuse the
+database between runs. Add a scenario to SCENARIOS for each new performance
+change so it can be measured here.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000, help="emergency requests to seed (e.g. 10000, 1000000, 10000000)")
+    parser.add_argument("--scenario", default="mixed", help="one of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--duration", type=float, default=20, help="seconds to run after warmup")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds to run before measuring")
+    parser.add_argument("--concurrency", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--data-dir", help="DATA_DIR to seed/reuse (default: a temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded data directory")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for data and request mix")
+    parser.add_argument("--out", help="results file (default: benchmarks/results/<scenario>-<rows>-<commit>-<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--archive-older-than", type=int, metavar="DAYS",
+                        help="move requests older than DAYS to the Parquet archive before running")
+    parser.add_argument("--facilities", type=int, default=0, metavar="N",
+                        help="write N synthetic medical facilities to FACILITIES_PATH before running")
+    parser.add_argument("--geofences", type=int, default=0, metavar="N",
+                        help="register N synthetic geofences around large cities before running")
+    return parser.parse_args()
+
+# Scenarios are weighted mixes of the operations below
+SCENARIOS = {
+    "citizen": {"POST /login": 1, "GET /auth-status": 6, "POST /submit": 3},
+    "admin": {
+        "GET /supersecretadmin": 1,
+        "GET /admin/api/requests": 4,
+        "GET /admin/api/requests?type": 2,
+        "GET /admin/api/requests?ndjson": 1,
+        "GET /admin/api/users": 1,
+        "GET /admin/api/clusters": 4,
+        "GET /admin/api/clusters?points": 1,
+        "GET /admin/api/stats": 2,
+        "GET /admin/api/types": 2,
+    },
+    "mixed": {
+        "POST /login": 1, "GET /auth-status": 6, "POST /submit": 3,
+        "GET /admin/api/requests": 1, "GET /admin/api/clusters": 1, "GET /admin/api/stats": 1,
+        "GET /admin/api/types": 1,
+    },
+    "ingest": {"POST /api/ingest": 1},
+    # Encrypt on /submit next to cheap requests that show how much crypto
+    # work blocks the event loop
+    "crypto": {"POST /submit": 4, "GET /auth-status": 4},
+    # Pages reaching into older history; run with --archive-older-than to read the cold tier
+    "history": {"GET /admin/api/requests": 2, "GET /admin/api/requests?old": 3, "GET /admin/api/stats": 1},
+    # MEDICAL submits answered with the nearest facilities; run with --facilities
+    "medical": {"POST /submit?medical": 3, "GET /auth-status": 1},
+    # Clustered ATTACK/INJURY reports feeding the incident queue, read by triage
+    "triage": {"POST /submit?hotspot": 6, "GET /admin/api/incidents": 2, "GET /auth-status": 2},
+    # Full exports streaming next to normal dashboard traffic
+    "export": {"GET /admin/api/requests/export": 1, "GET /admin/api/requests": 4, "GET /auth-status": 4},
+    # Free-text searches on details while reports keep coming in
+    "search": {"GET /admin/api/requests?search": 4, "GET /admin/api/requests": 2, "POST /submit": 2},
+    # Citizen traffic while Prometheus scrapes; compare runs with METRICS=0 for the recording overhead
+    "metrics": {"GET /admin/metrics": 1, "POST /submit": 3, "GET /auth-status": 6},
+    # Citizens submitting while admins run large historical queries; submit p99
+    # should match the "citizen" scenario (reads use their own pool)
+    "split": {
+        "POST /submit": 4, "GET /auth-status": 4, "GET /admin/api/requests?old": 1,
+        "GET /admin/api/requests?ndjson": 1, "GET /admin/api/requests/export": 1, "GET /admin/api/clusters": 1,
+    },
+    # Dashboards re-polling with If-None-Match while a few reports arrive, plus
+    # full-size pages that show JSON encoding and compression cost
+    "poll": {
+        "GET /admin/api/requests?poll": 6, "GET /admin/api/users?poll": 2, "GET /admin/api/types": 2,
+        "GET /admin/api/requests?full": 1, "POST /submit": 1,
+    },
+    # Reports from cities matched against --geofences N geofences, with alerts
+    # going through the outbox; compare with --geofences 0 for the matching cost
+    "geofence": {"POST /submit?city": 4, "GET /auth-status": 4, "GET /admin/api/outbox": 1},
+}
+
+# India, where the seeded requests are spread
+LAT_RANGE = (8.0, 35.0)
+LON_RANGE = (68.0, 97.0)
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.scenario not in SCENARIOS:
+        sys.exit(f"Unknown scenario {args.scenario!r}; choose from {', '.join(SCENARIOS)}")
+    os.environ["DATA_DIR"] = os.path.abspath(args.data_dir) if args.data_dir else tempfile.mkdtemp(prefix="sos-load-")
+    os.makedirs(os.environ["DATA_DIR"], exist_ok=True)
+    # Measure the request path, not the per-user and per-IP limits
+    os.environ.setdefault("SUBMIT_LIMIT", "1000000000")
+    os.environ.setdefault("ADMIN_RATE_LIMIT", "1000000000")
+    os.environ.setdefault("INGEST_API_KEY", "loadtest")
+    os.environ.setdefault("FERNET_KEY", "Ekpu5BCIHUqK7ylLzTl2h70oKiu0gWjYHJS_G0QLrkU=")
+    if args.facilities:
+        from nearest_facility import write_facilities
+        os.environ.setdefault("FACILITIES_PATH", os.path.join(os.environ["DATA_DIR"], "facilities.csv"))
+        write_facilities(os.environ["FACILITIES_PATH"], args.facilities, args.seed)
+    sys.path.insert(0, ROOT)
+
+import logging
+logging.disable(logging.WARNING)
+
+import httpx
+
+operations = {}
+
+def operation(route):
+    def register(fn):
+        operations[route] = fn
+        return fn
+    return register
+
+class VirtualUser:
+    def __init__(self, client, rng, phone):
+        self.client = client
+        self.rng = rng
+        self.phone = phone
+        self.etags = {}
+
+    def point(self):
+        return self.rng.uniform(*LAT_RANGE), self.rng.uniform(*LON_RANGE)
+
+@operation("POST /login")
+async def op_login(vu):
+    return await vu.client.post("/login", data={"phone": vu.phone, "name": "Load", "surname": "Test"})
+
+@operation("GET /auth-status")
+async def op_auth_status(vu):
+    return await vu.client.get("/auth-status")
+
+@operation("POST /submit")
+async def op_submit(vu):
+    from models import DEFAULT_REQUEST_SUBTYPES
+    subtype_code = vu.rng.choice(list(DEFAULT_REQUEST_SUBTYPES) + [None, None])
+    type_code = DEFAULT_REQUEST_SUBTYPES[subtype_code][1] if subtype_code else vu.rng.choice(["HELPLINE", "MEDICAL"])
+    lat, lon = vu.point()
+    data = {"type_code": type_code, "latitude": lat, "longitude": lon, "details": "load test"}
+    if subtype_code:
+        data["subtype_code"] = subtype_code
+    return await vu.client.post("/submit", data=data)
+
+@operation("POST /submit?medical")
+async def op_submit_medical(vu):
+    lat, lon = vu.point()
+    return await vu.client.post("/submit", data={"type_code": "MEDICAL", "latitude": lat, "longitude": lon})
+
+@operation("POST /submit?hotspot")
+async def op_submit_hotspot(vu):
+    # A few places receiving many reports, as during an attack
+    rng = random.Random(vu.rng.randrange(20))
+    lat, lon = rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)
+    subtype_code = vu.rng.choice(["BULLETS", "ARTILLERY", "DRONES", "LIFE_THREAT", "DEATH", "MINOR"])
+    type_code = "INJURY" if subtype_code in ("LIFE_THREAT", "DEATH", "MINOR") else "ATTACK"
+    return await vu.client.post("/submit", data={
+        "type_code": type_code, "subtype_code": subtype_code, "details": "load test",
+        "latitude": lat + vu.rng.gauss(0, 0.002), "longitude": lon + vu.rng.gauss(0, 0.002)
+    })
+
+@operation("POST /submit?city")
+async def op_submit_city(vu):
+    from nearest_facility import CITIES
+    lat, lon = vu.rng.choice(CITIES)
+    subtype_code = vu.rng.choice(["BULLETS", "ARTILLERY", "DRONES", "LIFE_THREAT", "DEATH", "MINOR"])
+    type_code = "INJURY" if subtype_code in ("LIFE_THREAT", "DEATH", "MINOR") else "ATTACK"
+    return await vu.client.post("/submit", data={
+        "type_code": type_code, "subtype_code": subtype_code, "details": "load test",
+        "latitude": lat + vu.rng.gauss(0, 0.3), "longitude": lon + vu.rng.gauss(0, 0.3)
+    })
+
+@operation("GET /supersecretadmin")
+async def op_admin_page(vu):
+    import main
+    return await vu.client.get("/supersecretadmin", auth=(main.ADMIN_USERNAME, main.ADMIN_PASSWORD))
+
+@operation("GET /admin/api/requests")
+async def op_requests(vu):
+    import main
+    return await vu.client.get("/admin/api/requests", params={"limit": 100}, auth=(main.ADMIN_USERNAME, main.ADMIN_PASSWORD))
+
+@operation("GET /admin/api/requests?type")
+async def op_requests_filtered(vu):
+    import main
+    start = (datetime.utcnow() - timedelta(days=vu.rng.randint(1, 30))).strftime("%Y-%m-%dT%H:%M")
+    return await vu.client.get("/admin/api/requests", params={"type_code": "ATTACK", "start": start, "limit": 100},
+                               auth=(main.ADMIN_USERNAME, main.ADMIN_PASSWORD))
+
+@operation("GET /admin/api/requests?old")
+async def op_requests_old(vu):
+    import main
+    end = datetime.utcnow() - timedelta(days=vu.rng.randint(30, 89))
+    return await vu.client.get("/admin/api/requests", params={
+        "start": (end - timedelta(days=7)).strftime("%Y-%m-%dT%H:%M"), "end": end.strftime("%Y-%m-%dT%H:%M"), "limit": 100
+    }, auth=(main.ADMIN_USERNAME, main.ADMIN_PASSWORD))
+
+SEARCH_TERMS = ["ambulance", "bleeding", "trapped debris", "school", "gunshot highway", "burns child", "chest pain"]
+
+@operation("GET /admin/api/requests?search")
+async def op_requests_search(vu):
+    import main
+    return await vu.client.get("/admin/api/requests", params={"search": vu.rng.choice(SEARCH_TERMS), "limit": 100},
+                               auth=(main.ADMIN_USERNAME, main.ADMIN_PASSWORD))
+
+async def conditional_get(vu, path, params):
+    """GET that sends back the ETag of this VU's previous response, as a browser would."""
+    import main
+    key = (path, tuple(sorted(params.items())))
+    headers = {"If-None-Match": vu.etags[key]} if key in vu.etags else {}
+    response = await vu.client.get(path, params=params, headers=headers, auth=(main.ADMIN_USERNAME, main.ADMIN_PASSWORD))
+    if "etag" in response.headers:
+        vu.etags[key] = response.headers["etag"]
+    return response
+
+@operation("GET /admin/api/requests?poll")
+async def op_requests_poll(vu):
+    return await conditional_get(vu, "/admin/api/requests", {"limit": 100})
+
+@operation("GET /admin/api/requests?full")
+async def op_requests_full(vu):
+    import main
+    return await vu.client.get("/admin/api/requests", params={"limit": 5000}, auth=(main.ADMIN_USERNAME, main.ADMIN_PASSWORD))
+
+@operation("GET /admin/api/requests?ndjson")
+async def op_requests_ndjson(vu):
+    import main
+    return await vu.client.get("/admin/api/requests", params={"format": "ndjson", "limit": 1000},
+                               auth=(main.ADMIN_USERNAME, main.ADMIN_PASSWORD))
+
+@operation("GET /admin/api/requests/export")
+async def op_export(vu):
+    import main
+    params = {"format": vu.rng.choice(["csv", "geojson", "ndjson"]), "gzip": vu.rng.choice(["true", "false"])}
+    return await vu.client.get("/admin/api/requests/export", params=params, auth=(main.ADMIN_USERNAME, main.ADMIN_PASSWORD))
+
+@operation("GET /admin/metrics")
+async def op_metrics(vu):
+    import main
+    return await vu.client.get("/admin/metrics", auth=(main.ADMIN_USERNAME, main.ADMIN_PASSWORD))
+
+@operation("GET /admin/api/outbox")
+async def op_outbox(vu):
+    import main
+    return await vu.client.get("/admin/api/outbox", params={"limit": 50}, auth=(main.ADMIN_USERNAME, main.ADMIN_PASSWORD))
+
+@operation("GET /admin/api/incidents")
+async def op_incidents(vu):
+    import main
+    return await vu.client.get("/admin/api/incidents", params={"limit": 20}, auth=(main.ADMIN_USERNAME, main.ADMIN_PASSWORD))
+
+@operation("GET /admin/api/users")
+async def op_users(vu):
+    import main
+    return await vu.client.get("/admin/api/users", params={"limit": 100}, auth=(main.ADMIN_USERNAME, main.ADMIN_PASSWORD))
+
+@operation("GET /admin/api/users?poll")
+async def op_users_poll(vu):
+    return await conditional_get(vu, "/admin/api/users", {"limit": 100})
+
+@operation("GET /admin/api/clusters")
+async def op_clusters(vu):
+    import main
+    return await vu.client.get("/admin/api/clusters", params={
+        "min_lat": LAT_RANGE[0], "min_lon": LON_RANGE[0], "max_lat": LAT_RANGE[1], "max_lon": LON_RANGE[1], "zoom": 5
+    }, auth=(main.ADMIN_USERNAME, main.ADMIN_PASSWORD))
+
+@operation("GET /admin/api/clusters?points")
+async def op_cluster_points(vu):
+    import main
+    lat, lon = vu.point()
+    return await vu.client.get("/admin/api/clusters", params={
+        "min_lat": lat, "min_lon": lon, "max_lat": lat + 0.05, "max_lon": lon + 0.05, "zoom": 13
+    }, auth=(main.ADMIN_USERNAME, main.ADMIN_PASSWORD))
+
+@operation("GET /admin/api/stats")
+async def op_stats(vu):
+    import main
+    return await vu.client.get("/admin/api/stats", params={"group_by": vu.rng.choice(["day", "day,type_code", "hour", "cell"])},
+                               auth=(main.ADMIN_USERNAME, main.ADMIN_PASSWORD))
+
+@operation("GET /admin/api/types")
+async def op_types(vu):
+    return await vu.client.get("/admin/api/types")
+
+@operation("POST /api/ingest")
+async def op_ingest(vu):
+    reports = []
+    for _ in range(50):
+        lat, lon = vu.point()
+        reports.append({
+            "phone": vu.phone, "name": "Load", "type_code": "MEDICAL", "latitude": lat, "longitude": lon,
+            "idempotency_key": str(uuid.uuid4())
+        })
+    return await vu.client.post("/api/ingest", json=reports, headers={"X-Ingest-Key": os.environ["INGEST_API_KEY"]})
+
+def seed_database(db_path: str, rows: int, seed: int):
+    """Top the database up to `rows` requests with the synthetic data generator; returns the row count."""
+    import insert_dummy_data
+    import rebuild_rollups
+    conn = sqlite3.connect(db_path)
+    existing = conn.execute("SELECT count(*) FROM emergency_requests").fetchone()[0]
+    conn.close()
+    if existing >= rows:
+        return existing
+    insert_dummy_data.generate(db_path, rows - existing, seed=seed)
+    conn = sqlite3.connect(db_path)
+    conn.execute("DELETE FROM request_rollups_hourly")
+    conn.execute(rebuild_rollups.INSERT_SLICE.text, {"start": "0000", "end": "9999"})
+    conn.commit()
+    conn.close()
+    return rows
+
+def seed_geofences(db_path: str, count: int, seed: int) -> int:
+    """Top the active geofences up to `count` with geofence_matching.py's generator; returns the count."""
+    import geofences
+    from geofence_matching import random_geofence
+    conn = sqlite3.connect(db_path)
+    existing = conn.execute("SELECT count(*) FROM geofences WHERE active = 1").fetchone()[0]
+    rng = random.Random(seed)
+    created_at = datetime.utcnow().isoformat(" ")
+    rows = [dict(geofences.parse_geofence(random_geofence(rng, i)), geofence_id=str(uuid.uuid4()), active=1,
+                 created_at=created_at) for i in range(existing, count)]
+    if rows:
+        columns = list(rows[0])
+        conn.executemany(f"INSERT INTO geofences ({', '.join(columns)}) VALUES ({', '.join(':' + c for c in columns)})", rows)
+        conn.commit()
+    conn.close()
+    return max(existing, count)
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, int(round(pct / 100 * len(sorted_values))) - 1)
+    return sorted_values[index]
+
+def summarize(samples: dict, elapsed: float) -> dict:
+    routes = {}
+    for route, entries in sorted(samples.items()):
+        latencies = sorted(latency for latency, _ in entries)
+        statuses = {}
+        for _, status in entries:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        routes[route] = {
+            "requests": len(entries),
+            "errors": sum(1 for _, status in entries if status >= 500 or status == 0),
+            "rps": round(len(entries) / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2),
+            "statuses": statuses,
+        }
+    return routes
+
+async def timed(vu, route, measure_from, samples):
+    started = time.perf_counter()
+    try:
+        status = (await operations[route](vu)).status_code
+    except Exception as e:
+        # Unhandled app errors surface here in-process instead of as a 500
+        logging.warning(f"{route} raised {e!r}")
+        status = 0
+    if started >= measure_from:
+        samples.setdefault(route, []).append((time.perf_counter() - started, status))
+
+async def virtual_user(vu, weights, deadline, measure_from, samples):
+    routes, cumulative = list(weights), list(weights.values())
+    await timed(vu, "POST /login", measure_from, samples)
+    while time.perf_counter() < deadline:
+        await timed(vu, vu.rng.choices(routes, cumulative)[0], measure_from, samples)
+
+async def run(args) -> dict:
+    import main
+    main.engine.echo = False
+    await main.startup()
+    rows = seed_database(os.path.join(os.environ["DATA_DIR"], "emergency.db"), args.rows, args.seed)
+    if args.archive_older_than is not None:
+        import archive_requests
+        await archive_requests.archive_requests(args.archive_older_than, 50000, vacuum=False)
+    if args.geofences:
+        seed_geofences(os.path.join(os.environ["DATA_DIR"], "emergency.db"), args.geofences, args.seed)
+    # Pick up the seeded data in the throttle and caches, as a fresh process would
+    await main.shutdown()
+    await main.startup()
+
+    weights = SCENARIOS[args.scenario]
+    samples = {}
+    transport = httpx.ASGITransport(app=main.app)
+    clients = [httpx.AsyncClient(transport=transport, base_url="http://loadtest") for _ in range(args.concurrency)]
+    measure_from = time.perf_counter() + args.warmup
+    deadline = measure_from + args.duration
+    print(f"Running {args.scenario!r} for {args.duration:g}s (+{args.warmup:g}s warmup), "
+          f"{args.concurrency} users, {rows:,} rows")
+    await asyncio.gather(*(
+        virtual_user(VirtualUser(client, random.Random(args.seed + i), f"7{i:09d}"), weights, deadline, measure_from, samples)
+        for i, client in enumerate(clients)
+    ))
+    elapsed = max(time.perf_counter(), deadline) - measure_from
+    for client in clients:
+        await client.aclose()
+    await main.shutdown()
+    await main.engine.dispose()
+
+    routes = summarize(samples, elapsed)
+    total = sum(r["requests"] for r in routes.values())
+    return {
+        "scenario": args.scenario,
+        "rows": rows,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 2),
+        "total_requests": total,
+        "total_rps": round(total / elapsed, 1),
+        "routes": routes,
+        "commit": git_commit(),
+        "started_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "WRITE_BEHIND": main.WRITE_BEHIND,
+            "SUBMIT_THROTTLE": main.SUBMIT_THROTTLE,
+            "SQLITE_SYNCHRONOUS": main.SQLITE_SYNCHRONOUS,
+            "RATE_LIMIT_BACKEND": main.RATE_LIMIT_BACKEND,
+            "archive_older_than": args.archive_older_than,
+            "facilities": args.facilities,
+            "geofences": args.geofences,
+        },
+    }
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def print_report(result: dict, baseline: dict = None):
+    header = f"{'route':<34} {'reqs':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'err':>5}"
+    print(header)
+    print("-" * len(header))
+    for route, r in result["routes"].items():
+        line = f"{route:<34} {r['requests']:>7} {r['rps']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} {r['errors']:>5}"
+        previous = (baseline or {}).get("routes", {}).get(route)
+        if previous:
+            line += f"   rps {change(previous['rps'], r['rps'])}  p95 {change(previous['p95_ms'], r['p95_ms'])}"
+        print(line)
+    print(f"total: {result['total_requests']} requests, {result['total_rps']} req/s at {result['commit']}")
+    if baseline:
+        print(f"compared with {baseline.get('commit')} ({baseline.get('scenario')}, {baseline.get('rows'):,} rows)")
+
+def change(before, after) -> str:
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+if __name__ == "__main__":
+    result = asyncio.run(run(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    out = args.out or os.path.join(
+        RESULTS_DIR, f"{result['scenario']}-{result['rows']}-{result['commit']}-{datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"results written to {out}")
+    if not args.data_dir and not args.keep:
+        shutil.rmtree(os.environ["DATA_DIR"], ignore_errors=True)
@@ -0,0 +1,95 @@
+"""Benchmark: nearest-facility lookups on a synthetic facility file.
+
+Writes N facilities (clustered around Indian cities, like real hospitals),
+times loading and building the index, times k-nearest queries, checks a
+sample of answers against a brute-force haversine scan, and times a hot
+reload after the file changes:
+
+    python benchmarks/nearest_facility.py --facilities 100000
+    python benchmarks/nearest_facility.py --facilities 1000000 --k 5
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from facilities import FacilityDirectory, haversine_km
+
+# (latitude, longitude) of large cities; facilities cluster around them
+CITIES = [
+    (28.61, 77.21), (19.08, 72.88), (12.97, 77.59), (13.08, 80.27), (22.57, 88.36), (17.39, 78.49),
+    (23.02, 72.57), (18.52, 73.86), (26.91, 75.79), (26.85, 80.95), (21.15, 79.09), (30.73, 76.78),
+    (25.59, 85.14), (11.02, 76.96), (9.93, 76.27), (26.14, 91.74), (23.26, 77.41), (20.30, 85.82),
+]
+KINDS = ["hospital", "clinic", "trauma_centre", "primary_health_centre"]
+
+def write_facilities(path: str, count: int, seed: int = 42):
+    rng = random.Random(seed)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["facility_id", "name", "kind", "latitude", "longitude", "capacity"])
+        for i in range(count):
+            if rng.random() < 0.7:
+                lat, lon = rng.choice(CITIES)
+                lat, lon = lat + rng.gauss(0, 0.3), lon + rng.gauss(0, 0.3)
+            else:
+                lat, lon = rng.uniform(8.0, 35.0), rng.uniform(68.0, 97.0)
+            kind = rng.choice(KINDS)
+            writer.writerow([f"F{i:07d}", f"Facility {i}", kind, round(lat, 6), round(lon, 6), rng.randint(5, 800)])
+
+def percentile(sorted_values, pct):
+    return sorted_values[max(0, int(round(pct / 100 * len(sorted_values))) - 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--facilities", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--verify", type=int, default=200, help="queries to check against a brute-force scan")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="sos-facilities-") as tmp:
+        path = os.path.join(tmp, "facilities.csv")
+        write_facilities(path, args.facilities, args.seed)
+        directory = FacilityDirectory(path)
+        started = time.perf_counter()
+        directory.check()
+        print(f"loaded {len(directory.index):,} facilities in {time.perf_counter() - started:.2f}s")
+
+        rng = random.Random(args.seed)
+        points = [(rng.uniform(8.0, 35.0), rng.uniform(68.0, 97.0)) for _ in range(args.queries)]
+        latencies = []
+        for lat, lon in points:
+            started = time.perf_counter()
+            directory.nearest(lat, lon, args.k)
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        print(f"k={args.k} over {args.queries:,} queries: p50 {percentile(latencies, 50) * 1e6:.0f}us  "
+              f"p99 {percentile(latencies, 99) * 1e6:.0f}us  max {latencies[-1] * 1e6:.0f}us")
+
+        facilities = directory.index.facilities
+        mismatches = 0
+        for lat, lon in points[:args.verify]:
+            expected = sorted(facilities, key=lambda f: haversine_km(lat, lon, f["latitude"], f["longitude"]))[:args.k]
+            got = [f for _, f in directory.nearest(lat, lon, args.k)]
+            if [f["facility_id"] for f in got] != [f["facility_id"] for f in expected]:
+                mismatches += 1
+        print(f"brute-force check: {mismatches} mismatches in {min(args.verify, len(points))} queries")
+
+        write_facilities(path, args.facilities + 1, args.seed + 1)
+        started = time.perf_counter()
+        reloaded = directory.check()
+        print(f"hot reload: {'rebuilt' if reloaded else 'NOT rebuilt'} {len(directory.index):,} facilities "
+              f"in {time.perf_counter() - started:.2f}s")
+        if mismatches:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
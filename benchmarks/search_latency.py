@@ -0,0 +1,112 @@
+"""Benchmark: full-text search on details vs. a LIKE scan.
+
+Seeds a throwaway database (or reuses --data-dir), builds the search index
+and times first pages and deep pages for common, rare and filtered queries,
+through the same query the admin API runs:
+
+    python benchmarks/search_latency.py --rows 100000
+    python benchmarks/search_latency.py --rows 1000000 --data-dir /tmp/sos-1m --keep
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# (label, search text, type_code, subtype_code)
+QUERIES = [
+    ("common word", "ambulance", None, None),
+    ("common word, ATTACK", "ambulance", "ATTACK", None),
+    ("rare phrase", "trapped temple ambulance", None, None),
+    ("rare phrase, INJURY/MINOR", "bleeding school", "INJURY", "MINOR"),
+    ("no match", "helicopter", None, None),
+]
+
+def percentile(sorted_values, pct):
+    return sorted_values[max(0, int(round(pct / 100 * len(sorted_values))) - 1)]
+
+async def timed(query, repeat: int) -> tuple:
+    import main
+    latencies = []
+    for _ in range(repeat):
+        async with main.SessionLocal() as session:
+            started = time.perf_counter()
+            rows = (await session.execute(query)).fetchall()
+            latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return rows, percentile(latencies, 50) * 1000, latencies[-1] * 1000
+
+async def bench(args):
+    import main
+    import search
+    main.engine.echo = False
+    table = main.EmergencyRequest.__table__
+    print(f"{'query':<36} {'plan':<6} {'rows':>5} {'p50 ms':>8} {'max ms':>8}")
+    for label, text, type_code, subtype_code in QUERIES:
+        fts = main.filter_requests(table.select(), type_code, subtype_code, search_text=text)
+        like = main.filter_requests(table.select(), type_code, subtype_code)
+        for word in search.match_query(text).replace('"', "").replace("*", "").split():
+            like = like.where(main.EmergencyRequest.details.ilike(f"%{word}%"))
+        for plan, q in (("fts", fts), ("like", like)):
+            rows, p50, worst = await timed(main.requests_page_query(q, None).limit(args.limit), args.repeat)
+            print(f"{label:<36} {plan:<6} {len(rows):>5} {p50:8.1f} {worst:8.1f}")
+        # Deep page: follow the cursor a few pages in
+        cursor = None
+        for _ in range(args.pages):
+            rows = (await timed(main.requests_page_query(fts, cursor).limit(args.limit), 1))[0]
+            if len(rows) < args.limit:
+                break
+            cursor = main.encode_cursor(rows[-1].timestamp.isoformat(), rows[-1].request_id)
+        if cursor:
+            rows, p50, worst = await timed(main.requests_page_query(fts, cursor).limit(args.limit), args.repeat)
+            print(f"{label + f' (page {args.pages + 1})':<36} {'fts':<6} {len(rows):>5} {p50:8.1f} {worst:8.1f}")
+    await main.engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=20, help="pages to follow for the deep-page timing")
+    parser.add_argument("--data-dir", help="reuse this database instead of a throwaway one")
+    parser.add_argument("--keep", action="store_true", help="keep the throwaway database")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    os.environ["DATA_DIR"] = os.path.abspath(args.data_dir or tempfile.mkdtemp(prefix="sos-search-"))
+    os.environ.setdefault("FERNET_KEY", "Ekpu5BCIHUqK7ylLzTl2h70oKiu0gWjYHJS_G0QLrkU=")
+    import logging
+    logging.disable(logging.INFO)
+    import insert_dummy_data
+    import search
+
+    db_path = os.path.join(os.environ["DATA_DIR"], "emergency.db")
+    if os.path.exists(db_path):
+        existing = sqlite3.connect(db_path).execute("SELECT count(*) FROM emergency_requests").fetchone()[0]
+    else:
+        existing = 0
+    if existing < args.rows:
+        started = time.perf_counter()
+        insert_dummy_data.generate(db_path, args.rows - existing, seed=args.seed)
+        print(f"seeded {args.rows - existing:,} requests in {time.perf_counter() - started:.1f}s")
+    conn = sqlite3.connect(db_path)
+    created = search.create_index(conn)
+    if created:
+        started = time.perf_counter()
+        conn.execute(search.REBUILD)
+        conn.commit()
+        print(f"built the search index in {time.perf_counter() - started:.1f}s")
+    conn.close()
+
+    asyncio.run(bench(args))
+    if not args.data_dir and not args.keep:
+        shutil.rmtree(os.environ["DATA_DIR"], ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Benchmark: cold start and per-worker memory.
+
+Times importing main.py and running its startup in fresh interpreters, and
+the time from launching a server to its first response, against a seeded
+throwaway database (or --data-dir). Then starts N workers with `uvicorn
+--workers N` (each worker imports everything itself) and with serve.py
+(imported once, then forked) and reports their memory from
+/proc/<pid>/smaps_rollup: RSS, PSS (shared pages split between the processes
+sharing them) and USS (pages no other process shares):
+
+    python benchmarks/startup.py --rows 200000 --workers 4
+    python benchmarks/startup.py --data-dir /tmp/sos-200k --repeat 10
+
+--app-dir runs the same measurements against another checkout, e.g. one made
+with `git worktree add /tmp/sos-before HEAD~1`, to compare before and after.
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Run in a fresh interpreter; prints the import and startup times as JSON
+COLD_START = """
+import time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+import asyncio
+
+async def run():
+    began = time.perf_counter()
+    await main.startup()
+    ready = time.perf_counter()
+    await main.shutdown()
+    return ready - began
+
+startup = asyncio.run(run())
+print("RESULT", __import__("json").dumps({"import": imported - started, "startup": startup}))
+"""
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def cold_start(app_dir: str, env: dict) -> dict:
+    output = subprocess.run([sys.executable, "-c", COLD_START], cwd=app_dir, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.split("RESULT", 1)[1])
+
+def children(pid: int) -> list:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids = [int(p) for p in f.read().split()]
+    except FileNotFoundError:
+        return []
+    return pids + [grandchild for child in pids for grandchild in children(child)]
+
+def memory(pid: int) -> dict:
+    """RSS, PSS and USS of one process in MiB."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                fields[name] = int(value.split()[0]) / 1024
+    return {"rss": fields["Rss"], "pss": fields["Pss"], "uss": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+def is_worker(pid: int) -> bool:
+    with open(f"/proc/{pid}/cmdline", "rb") as f:
+        return b"resource_tracker" not in f.read()
+
+def wait_until(predicate, timeout: float, interval: float = 0.01):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if predicate():
+            return True
+        time.sleep(interval)
+    return False
+
+def responds(port: int) -> bool:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/admin/api/types", timeout=1) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+def launch(command: list, app_dir: str, env: dict, workers: int, log_path: str, timeout: float = 60) -> tuple:
+    """Start a server; returns (process, seconds to first response) once every worker has started."""
+    port = free_port()
+    log = open(log_path, "w")
+    started = time.perf_counter()
+    process = subprocess.Popen(command + ["--port", str(port)], cwd=app_dir, env=env,
+                               stdout=log, stderr=subprocess.STDOUT)
+    if not wait_until(lambda: responds(port) or process.poll() is not None, timeout) or process.poll() is not None:
+        raise SystemExit(f"{' '.join(command)} did not start; see {log_path}")
+    first_response = time.perf_counter() - started
+
+    def all_started():
+        with open(log_path) as f:
+            return f.read().count("Application startup complete") >= workers
+
+    wait_until(all_started, timeout, 0.05)
+    time.sleep(0.5)
+    log.close()
+    return process, first_response
+
+def stop(process):
+    process.terminate()
+    try:
+        process.wait(15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def measure_server(label: str, command: list, app_dir: str, env: dict, workers: int, log_path: str) -> dict:
+    process, first_response = launch(command, app_dir, env, workers, log_path)
+    try:
+        parent = memory(process.pid)
+        samples = [memory(pid) for pid in children(process.pid) if is_worker(pid)]
+        if samples:
+            total = parent["pss"] + sum(s["pss"] for s in samples)
+        else:
+            # A single process serving by itself
+            samples, total, parent = [parent], parent["pss"], {"pss": 0.0}
+    finally:
+        stop(process)
+    result = {"label": label, "workers": len(samples), "first_response_s": first_response, "parent_pss": parent["pss"],
+              "total_pss": total, **{f"worker_{k}": statistics.mean(s[k] for s in samples) for k in ("rss", "pss", "uss")}}
+    print(f"{label:<28} {len(samples):>3} {first_response:8.2f}s {result['worker_rss']:8.1f} {result['worker_pss']:8.1f} "
+          f"{result['worker_uss']:8.1f} {total:9.1f}")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5, help="cold starts to time")
+    parser.add_argument("--data-dir", help="reuse this database instead of a throwaway one")
+    parser.add_argument("--app-dir", default=ROOT, help="checkout of the app to measure")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(args.data_dir or tempfile.mkdtemp(prefix="sos-startup-"))
+    app_dir = os.path.abspath(args.app_dir)
+    env = dict(os.environ, DATA_DIR=data_dir)
+    env.setdefault("FERNET_KEY", "Ekpu5BCIHUqK7ylLzTl2h70oKiu0gWjYHJS_G0QLrkU=")
+    os.environ.update(env)
+    db_path = os.path.join(data_dir, "emergency.db")
+    if not os.path.exists(db_path):
+        import insert_dummy_data
+        insert_dummy_data.generate(db_path, args.rows, seed=args.seed)
+    try:
+        # The first run warms the OS page cache for the interpreter, the packages and the database
+        cold_start(app_dir, env)
+        runs = [cold_start(app_dir, env) for _ in range(args.repeat)]
+        print(f"cold start in {app_dir} ({args.repeat} runs, median):")
+        for phase in ("import", "startup"):
+            values = sorted(run[phase] for run in runs)
+            print(f"  {phase:<8} {statistics.median(values) * 1000:8.0f} ms   (min {values[0] * 1000:.0f}, max {values[-1] * 1000:.0f})")
+
+        print(f"\n{'server':<28} {'n':>3} {'first':>9} {'RSS MiB':>8} {'PSS MiB':>8} {'USS MiB':>8} {'total PSS':>9}")
+        log_path = os.path.join(data_dir, "server.log")
+        uvicorn = [sys.executable, "-m", "uvicorn", "main:app", "--log-level", "info"]
+        measure_server("uvicorn (1 worker)", uvicorn, app_dir, env, 1, log_path)
+        measure_server(f"uvicorn --workers {args.workers}", uvicorn + ["--workers", str(args.workers)],
+                       app_dir, env, args.workers, log_path)
+        if os.path.exists(os.path.join(app_dir, "serve.py")):
+            measure_server(f"serve.py --workers {args.workers}",
+                           [sys.executable, "serve.py", "--workers", str(args.workers)],
+                           app_dir, env, args.workers, log_path)
+    finally:
+        if not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
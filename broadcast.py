@@ -0,0 +1,47 @@
+import asyncio
+
+
+class Subscription:
+    def __init__(self, filters: dict, max_queue: int):
+        self.filters = {k: v for k, v in filters.items() if v}
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def matches(self, event: dict) -> bool:
+        return all(event.get(k) == v for k, v in self.filters.items())
+
+
+class Broadcaster:
+    """In-process fan-out of newly committed events to live subscribers.
+
+    Publishing is a non-blocking put into each matching subscriber's bounded
+    queue. A subscriber that falls too far behind is marked as overflowed and
+    dropped; it is expected to reconnect and catch up from the database.
+    """
+
+    def __init__(self, max_queue: int = 1000):
+        self.max_queue = max_queue
+        self.subscribers = set()
+
+    def subscribe(self, **filters) -> Subscription:
+        subscription = Subscription(filters, self.max_queue)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+
+    def publish(self, events):
+        for subscription in list(self.subscribers):
+            for event in events:
+                if not subscription.matches(event):
+                    continue
+                try:
+                    subscription.queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    subscription.overflowed = True
+                    self.unsubscribe(subscription)
+                    break
+
+    def __len__(self):
+        return len(self.subscribers)
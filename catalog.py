@@ -0,0 +1,51 @@
+import hashlib
+import json
+
+
+class ReferenceCatalog:
+    """In-memory copy of request_types / request_subtypes.
+
+    Loaded once at startup and served from memory, so label lookups, /submit
+    validation and /admin/api/types cost no queries. Call load() again after
+    the tables change.
+    """
+
+    def __init__(self):
+        self.types = {}
+        self.subtypes = {}
+        self.version = 0
+        self.etag = None
+        self.payload = b"[]"
+
+    def load(self, types, subtypes):
+        """Replace the catalog from (type_code, type_name) and (subtype_code, subtype_name, type_code) rows."""
+        self.types = {code: name for code, name in types}
+        self.subtypes = {code: (name, type_code) for code, name, type_code in subtypes}
+        data = [{
+            "type_code": code,
+            "type_name": name,
+            "subtypes": [
+                {"subtype_code": s_code, "subtype_name": s_name}
+                for s_code, (s_name, s_type) in self.subtypes.items() if s_type == code
+            ]
+        } for code, name in self.types.items()]
+        self.payload = json.dumps(data).encode()
+        self.version += 1
+        self.etag = '"catalog-%s"' % hashlib.sha1(self.payload).hexdigest()[:16]
+
+    def type_name(self, type_code):
+        return self.types.get(type_code, type_code)
+
+    def subtype_name(self, subtype_code):
+        if not subtype_code:
+            return None
+        entry = self.subtypes.get(subtype_code)
+        return entry[0] if entry else subtype_code
+
+    def is_valid(self, type_code, subtype_code=None) -> bool:
+        if type_code not in self.types:
+            return False
+        if subtype_code:
+            entry = self.subtypes.get(subtype_code)
+            return entry is not None and entry[1] == type_code
+        return True
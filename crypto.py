@@ -0,0 +1,193 @@
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+
+_worker_keys = None
+_worker_fernets = None
+
+def _fernets(keys: tuple):
+    """(primary Fernet, MultiFernet over all keys), cached per worker."""
+    global _worker_keys, _worker_fernets
+    if keys != _worker_keys:
+        fernets = [Fernet(key) for key in keys]
+        _worker_fernets = (fernets[0], MultiFernet(fernets))
+        _worker_keys = keys
+    return _worker_fernets
+
+def run_batch(keys: tuple, op: str, values: list) -> list:
+    """Worker side: apply op to every value; failed items come back as None."""
+    primary, multi = _fernets(keys)
+    results = []
+    for value in values:
+        try:
+            if op == "encrypt":
+                results.append(multi.encrypt(value.encode()).decode())
+            elif op == "decrypt":
+                results.append(multi.decrypt(value.encode()).decode())
+            else:
+                # rotate: tokens already under the primary key are left alone ("")
+                try:
+                    primary.decrypt(value.encode())
+                    results.append("")
+                except InvalidToken:
+                    results.append(multi.rotate(value.encode()).decode())
+        except InvalidToken:
+            results.append(None)
+    return results
+
+class CryptoService:
+    """Fernet encrypt/decrypt/rotate off the event loop, in batches.
+
+    Callers await encrypt()/decrypt(); a dispatcher task groups queued items
+    into batches of up to max_batch and runs them on a thread or process pool,
+    with at most `workers` batches in flight. The queue is bounded, so callers
+    wait (backpressure) instead of piling up work. The first key encrypts;
+    all keys decrypt, so old keys can be kept during a rotation.
+
+    on_batch(op, size, seconds) is called with each batch's time on the pool
+    and on_item(op, seconds) with each item's time from queueing to result.
+    """
+
+    def __init__(self, keys: list, pool: str = "thread", workers: int = 2, max_batch: int = 64,
+                 max_delay: float = 0.001, max_queue: int = 10000, on_batch=None, on_item=None):
+        if pool not in ("thread", "process"):
+            raise ValueError(f"Unknown crypto pool: {pool}")
+        self.keys = tuple(key.encode() if isinstance(key, str) else key for key in keys)
+        self.pool = pool
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.on_batch = on_batch
+        self.on_item = on_item
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.executor = None
+        self.task = None
+        self.in_flight = None
+        self.carry = None
+        self.batches = 0
+        self.items = 0
+        self.failures = 0
+
+    @property
+    def fernet(self) -> MultiFernet:
+        """Synchronous MultiFernet for scripts and code outside the event loop."""
+        return _fernets(self.keys)[1]
+
+    async def start(self):
+        if self.task is None:
+            self.executor = (ProcessPoolExecutor if self.pool == "process" else ThreadPoolExecutor)(self.workers)
+            self.in_flight = asyncio.Semaphore(self.workers)
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Finish queued work, then stop the dispatcher and the pool."""
+        if self.task is None:
+            return
+        await self.queue.join()
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        self.executor.shutdown(wait=True)
+        self.executor = None
+
+    async def _submit(self, op: str, value: str):
+        if self.task is None:
+            await self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queued = loop.time()
+        try:
+            await self.queue.put((op, value, future))
+            return await future
+        finally:
+            if self.on_item is not None:
+                self.on_item(op, loop.time() - queued)
+
+    async def encrypt(self, value: str) -> str:
+        return await self._submit("encrypt", value)
+
+    async def decrypt(self, token: str) -> str:
+        """Raises InvalidToken if no configured key can decrypt token."""
+        return await self._submit("decrypt", token)
+
+    async def rotate(self, token: str):
+        """Re-encrypt token under the primary key; None if it already is."""
+        return await self._submit("rotate", token) or None
+
+    async def map(self, op: str, values: list) -> list:
+        """Run op over many values; failed items come back as None instead of raising."""
+        results = await asyncio.gather(*(self._submit(op, value) for value in values), return_exceptions=True)
+        for r in results:
+            if isinstance(r, BaseException) and not isinstance(r, InvalidToken):
+                raise r
+        return [None if isinstance(r, InvalidToken) else r for r in results]
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        first = self.carry or await self.queue.get()
+        self.carry = None
+        batch = [first]
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                item = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if item[0] != first[0]:
+                # One op per batch; this item starts the next one
+                self.carry = item
+                break
+            batch.append(item)
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            await self.in_flight.acquire()
+            job = loop.run_in_executor(self.executor, run_batch, self.keys, batch[0][0], [value for _, value, _ in batch])
+            job.add_done_callback(lambda job, batch=batch, started=loop.time(): self._finish(batch, job, started))
+
+    def _finish(self, batch: list, job, started: float):
+        self.in_flight.release()
+        if self.on_batch is not None:
+            self.on_batch(batch[0][0], len(batch), asyncio.get_running_loop().time() - started)
+        error = job.exception()
+        if error:
+            logging.error(f"Crypto batch of {len(batch)} items failed: {error!r}")
+        else:
+            self.batches += 1
+            self.items += len(batch)
+        results = [None] * len(batch) if error else job.result()
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                if error:
+                    future.set_exception(error)
+                elif result is None:
+                    self.failures += 1
+                    future.set_exception(InvalidToken())
+                else:
+                    future.set_result(result)
+            self.queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "pool": self.pool,
+            "workers": self.workers,
+            "queued": self.queue.qsize(),
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "invalid_tokens": self.failures,
+            "keys": len(self.keys),
+        }
@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+import zlib
+
+# Streaming encoders for request exports. Each takes an async iterator of row
+# chunks (lists of dicts with FIELDS) and yields bytes as soon as a chunk is
+# encoded, so memory is bounded by one chunk however many rows are exported.
+
+FIELDS = [
+    "request_id", "user_id", "type_code", "type_name", "subtype_code", "subtype_name",
+    "latitude", "longitude", "details", "timestamp",
+]
+
+# format -> (media type, file extension)
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "geojson": ("application/geo+json", "geojson"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+def _csv_safe(value):
+    # Spreadsheets run cells starting with these as formulas
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@"):
+        return "'" + value
+    return value
+
+async def encode_csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    yield buffer.getvalue().encode()
+    async for chunk in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_safe(row[field]) for field in FIELDS] for row in chunk)
+        yield buffer.getvalue().encode()
+
+def _feature(row: dict) -> dict:
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [row["longitude"], row["latitude"]]},
+        "properties": {field: row[field] for field in FIELDS if field not in ("latitude", "longitude")},
+    }
+
+async def encode_geojson(chunks):
+    """One FeatureCollection, written incrementally."""
+    yield b'{"type":"FeatureCollection","features":['
+    separator = ""
+    async for chunk in chunks:
+        if chunk:
+            yield (separator + ",".join(json.dumps(_feature(row)) for row in chunk)).encode()
+            separator = ","
+    yield b"]}\n"
+
+async def encode_ndjson(chunks):
+    async for chunk in chunks:
+        yield "".join(json.dumps(row) + "\n" for row in chunk).encode()
+
+ENCODERS = {"csv": encode_csv, "geojson": encode_geojson, "ndjson": encode_ndjson}
+
+async def gzip_chunks(chunks, level: int = 6):
+    """Compress a byte stream into a single gzip member, chunk by chunk."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,205 @@
+import csv
+import heapq
+import json
+import logging
+import math
+import os
+import time
+
+# Nearest medical facility lookup. Facilities are loaded from a CSV or JSON
+# file into a KD-tree over 3D unit-sphere coordinates: the straight-line
+# (chord) distance between two such points orders them exactly like the
+# haversine distance, so the tree can prune with plain coordinate
+# differences and the result is converted to kilometres at the end.
+
+EARTH_RADIUS_KM = 6371.0088
+LEAF_SIZE = 8
+FIELDS = ("facility_id", "name", "kind", "latitude", "longitude", "capacity")
+
+def to_xyz(latitude: float, longitude: float) -> tuple:
+    lat = math.radians(latitude)
+    lon = math.radians(longitude)
+    cos_lat = math.cos(lat)
+    return (cos_lat * math.cos(lon), cos_lat * math.sin(lon), math.sin(lat))
+
+def chord_to_km(chord: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def read_facilities(path: str) -> list:
+    """Facilities from a CSV (header row) or JSON (list of objects) file with FIELDS."""
+    with open(path, newline="", encoding="utf-8") as f:
+        records = json.load(f) if path.endswith(".json") else list(csv.DictReader(f))
+    facilities = []
+    for i, record in enumerate(records):
+        try:
+            latitude = float(record["latitude"])
+            longitude = float(record["longitude"])
+        except (KeyError, TypeError, ValueError):
+            logging.warning(f"Skipping facility {i} in {path}: missing or invalid latitude/longitude")
+            continue
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            logging.warning(f"Skipping facility {i} in {path}: coordinates out of range")
+            continue
+        capacity = record.get("capacity")
+        facilities.append({
+            "facility_id": str(record.get("facility_id") or i),
+            "name": record.get("name") or "",
+            "kind": record.get("kind") or "",
+            "latitude": latitude,
+            "longitude": longitude,
+            "capacity": int(capacity) if str(capacity or "").strip().isdigit() else None,
+        })
+    return facilities
+
+class FacilityIndex:
+    """Immutable KD-tree over facilities; build a new one to change the data.
+
+    Nodes live in flat lists. Internal nodes split on one axis at a median;
+    leaves hold up to LEAF_SIZE facilities and are scanned directly.
+    """
+
+    def __init__(self, facilities: list):
+        self.facilities = facilities
+        self.points = [to_xyz(f["latitude"], f["longitude"]) for f in facilities]
+        self.columns = tuple(list(column) for column in zip(*self.points)) if facilities else ()
+        self.order = list(range(len(facilities)))
+        # Per node: axis (-1 for a leaf), split value, left/right child or leaf start/end
+        self.axis = []
+        self.split = []
+        self.left = []
+        self.right = []
+        if facilities:
+            self._build(0, len(self.order))
+
+    def __len__(self):
+        return len(self.facilities)
+
+    def _build(self, start: int, end: int) -> int:
+        node = len(self.axis)
+        self.axis.append(-1)
+        self.split.append(0.0)
+        self.left.append(start)
+        self.right.append(end)
+        if end - start <= LEAF_SIZE:
+            return node
+        ids = self.order[start:end]
+        spreads = []
+        for column in self.columns:
+            values = [column[i] for i in ids]
+            spreads.append(max(values) - min(values))
+        axis = spreads.index(max(spreads))
+        column = self.columns[axis]
+        ids.sort(key=column.__getitem__)
+        self.order[start:end] = ids
+        middle = (start + end) // 2
+        self.axis[node] = axis
+        self.split[node] = column[ids[middle - start]]
+        self.left[node] = self._build(start, middle)
+        self.right[node] = self._build(middle, end)
+        return node
+
+    def nearest(self, latitude: float, longitude: float, k: int = 3) -> list:
+        """The k closest facilities as (distance_km, facility), nearest first."""
+        if not self.facilities or k <= 0:
+            return []
+        q = to_xyz(latitude, longitude)
+        qx, qy, qz = q
+        points, order = self.points, self.order
+        axis, split, left, right = self.axis, self.split, self.left, self.right
+        best = []  # max-heap of (-squared chord, index)
+        worst = math.inf
+        stack = [(0, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if bound >= worst:
+                continue
+            a = axis[node]
+            if a < 0:
+                for i in order[left[node]:right[node]]:
+                    x, y, z = points[i]
+                    d = (x - qx) ** 2 + (y - qy) ** 2 + (z - qz) ** 2
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, i))
+                        if len(best) == k:
+                            worst = -best[0][0]
+                    elif d < worst:
+                        heapq.heapreplace(best, (-d, i))
+                        worst = -best[0][0]
+                continue
+            diff = q[a] - split[node]
+            near, far = (left[node], right[node]) if diff < 0 else (right[node], left[node])
+            # Far side first on the stack so the near side is searched first
+            stack.append((far, max(bound, diff * diff)))
+            stack.append((near, bound))
+        return [(chord_to_km(math.sqrt(-d)), self.facilities[i]) for d, i in sorted(best, reverse=True)]
+
+class FacilityDirectory:
+    """The current FacilityIndex for a file, rebuilt when the file changes.
+
+    check() compares the file's mtime and size with the last load; call it
+    periodically (off the event loop, building takes a while for large
+    files). A file that fails to load leaves the previous index in place.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index = FacilityIndex([])
+        self.signature = None
+        self.loaded_at = None
+        self.load_seconds = None
+        self.reloads = 0
+        self.errors = 0
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def check(self) -> bool:
+        """Reload if the file changed since the last load; True if it did."""
+        signature = self._signature()
+        if signature == self.signature:
+            return False
+        if signature is None:
+            logging.warning(f"Facilities file {self.path} is gone; keeping {len(self.index)} facilities")
+            self.signature = None
+            return False
+        started = time.perf_counter()
+        try:
+            facilities = read_facilities(self.path)
+            if not facilities:
+                raise ValueError("no valid facilities in file")
+            index = FacilityIndex(facilities)
+        except Exception as e:
+            self.errors += 1
+            self.signature = signature
+            logging.error(f"Could not load facilities from {self.path}: {e!r}; keeping the previous index")
+            return False
+        self.index = index
+        self.signature = signature
+        self.loaded_at = time.time()
+        self.load_seconds = round(time.perf_counter() - started, 3)
+        self.reloads += 1
+        logging.info(f"Loaded {len(index)} facilities from {self.path} in {self.load_seconds}s")
+        return True
+
+    def nearest(self, latitude: float, longitude: float, k: int = 3) -> list:
+        return self.index.nearest(latitude, longitude, k)
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "facilities": len(self.index),
+            "reloads": self.reloads,
+            "errors": self.errors,
+            "loaded_at": self.loaded_at,
+            "load_seconds": self.load_seconds,
+        }
@@ -0,0 +1,258 @@
+import json
+import logging
+import math
+from collections import deque
+import geohash
+from facilities import haversine_km
+
+# Geofences registered by responders and units, matched against every new
+# report. A geofence is a radius circle or a polygon (GeoJSON, holes allowed)
+# with optional type/subtype filters.
+#
+# The index is a geohash grid over several precisions: each geofence is filed
+# under the few cells (at most MAX_CELLS) that cover its bounding box, at the
+# finest precision where that many suffice, so a small fence sits in small
+# cells and a district-sized one in a couple of large ones. A report looks up
+# its own geohash cut to each precision in use, which is one dict lookup per
+# precision whatever the number of geofences. The candidates are then checked
+# against their bounding box, their filters and finally the exact shape
+# (haversine distance for circles, even-odd ray casting for polygons).
+#
+# Polygons are tested in plain lat/lon, which is exact enough for fences up to
+# a few hundred kilometres; geofences may not cross the antimeridian.
+
+MAX_CELLS = 16
+MAX_RADIUS_M = 100_000
+MAX_VERTICES = 2000
+KM_PER_DEGREE = 111.32
+
+def point_in_polygon(latitude: float, longitude: float, rings) -> bool:
+    """Even-odd rule over all rings, so points in a hole are outside. Rings are [(lon, lat), ...]."""
+    inside = False
+    for ring in rings:
+        x_prev, y_prev = ring[-1]
+        for x, y in ring:
+            if (y > latitude) != (y_prev > latitude) and longitude < (x_prev - x) * (latitude - y) / (y_prev - y) + x:
+                inside = not inside
+            x_prev, y_prev = x, y
+    return inside
+
+class Geofence:
+    __slots__ = ("geofence_id", "name", "subscriber", "kind", "min_lat", "min_lon", "max_lat", "max_lon",
+                 "latitude", "longitude", "radius_km", "rings", "type_codes", "subtype_codes")
+
+    def __init__(self, geofence_id, name, subscriber, geometry: dict, bbox, type_codes=None, subtype_codes=None):
+        self.geofence_id = geofence_id
+        self.name = name
+        self.subscriber = subscriber
+        self.kind = geometry["type"]
+        self.min_lat, self.min_lon, self.max_lat, self.max_lon = bbox
+        if self.kind == "circle":
+            self.latitude = geometry["latitude"]
+            self.longitude = geometry["longitude"]
+            self.radius_km = geometry["radius_m"] / 1000
+            self.rings = None
+        else:
+            self.latitude = self.longitude = self.radius_km = None
+            self.rings = [[(lon, lat) for lon, lat in ring] for ring in geometry["coordinates"]]
+        # None matches every type/subtype
+        self.type_codes = frozenset(type_codes) if type_codes else None
+        self.subtype_codes = frozenset(subtype_codes) if subtype_codes else None
+
+    @classmethod
+    def from_row(cls, row) -> "Geofence":
+        return cls(row.geofence_id, row.name, row.subscriber, json.loads(row.geometry),
+                   (row.min_lat, row.min_lon, row.max_lat, row.max_lon),
+                   row.type_codes.split() if row.type_codes else None,
+                   row.subtype_codes.split() if row.subtype_codes else None)
+
+    def accepts(self, type_code, subtype_code) -> bool:
+        return ((self.type_codes is None or type_code in self.type_codes)
+                and (self.subtype_codes is None or subtype_code in self.subtype_codes))
+
+    def contains(self, latitude: float, longitude: float) -> bool:
+        if not (self.min_lat <= latitude <= self.max_lat and self.min_lon <= longitude <= self.max_lon):
+            return False
+        return self.contains_exact(latitude, longitude)
+
+    def contains_exact(self, latitude: float, longitude: float) -> bool:
+        """contains() for a point already known to be inside the bounding box."""
+        if self.rings is None:
+            return haversine_km(self.latitude, self.longitude, latitude, longitude) <= self.radius_km
+        return point_in_polygon(latitude, longitude, self.rings)
+
+def circle_bbox(latitude: float, longitude: float, radius_m: float) -> tuple:
+    dlat = radius_m / 1000 / KM_PER_DEGREE
+    dlon = dlat / max(math.cos(math.radians(latitude)), 0.01)
+    return (max(latitude - dlat, -90.0), max(longitude - dlon, -180.0),
+            min(latitude + dlat, 90.0), min(longitude + dlon, 180.0))
+
+def covering(bbox) -> list:
+    return geohash.covering_cells(*bbox, max_cells=MAX_CELLS)
+
+def _coordinate(value, low: float, high: float, what: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not low <= value <= high:
+        raise ValueError(f"{what} must be a number between {low:g} and {high:g}.")
+    return float(value)
+
+def _codes(value, what: str):
+    if value is None or value == []:
+        return None
+    if not isinstance(value, list) or not all(isinstance(code, str) and code and " " not in code for code in value):
+        raise ValueError(f"{what} must be a list of codes.")
+    return sorted(set(value))
+
+def parse_geofence(body: dict) -> dict:
+    """Validate a geofence from the API and return the columns to store; raises ValueError.
+
+    Expects name, subscriber, optional type_codes/subtype_codes and either
+    circle {latitude, longitude, radius_m} or a GeoJSON Polygon geometry.
+    """
+    if not isinstance(body, dict):
+        raise ValueError("Expected a JSON object.")
+    name = str(body.get("name") or "").strip()
+    subscriber = str(body.get("subscriber") or "").strip()
+    if not name or not subscriber:
+        raise ValueError("name and subscriber are required.")
+    circle, polygon = body.get("circle"), body.get("geometry")
+    if (circle is None) == (polygon is None):
+        raise ValueError("Give either circle or geometry.")
+    if circle is not None:
+        if not isinstance(circle, dict):
+            raise ValueError("circle must be an object.")
+        latitude = _coordinate(circle.get("latitude"), -90, 90, "circle.latitude")
+        longitude = _coordinate(circle.get("longitude"), -180, 180, "circle.longitude")
+        radius_m = _coordinate(circle.get("radius_m"), 0, MAX_RADIUS_M, "circle.radius_m")
+        if radius_m <= 0:
+            raise ValueError("circle.radius_m must be positive.")
+        geometry = {"type": "circle", "latitude": latitude, "longitude": longitude, "radius_m": radius_m}
+        bbox = circle_bbox(latitude, longitude, radius_m)
+    else:
+        if not isinstance(polygon, dict) or polygon.get("type") != "Polygon" or not isinstance(polygon.get("coordinates"), list):
+            raise ValueError("geometry must be a GeoJSON Polygon.")
+        rings = []
+        for ring in polygon["coordinates"]:
+            if not isinstance(ring, list) or not all(isinstance(point, list) and len(point) >= 2 for point in ring):
+                raise ValueError("Polygon rings must be lists of [longitude, latitude] positions.")
+            ring = [[_coordinate(point[0], -180, 180, "longitude"), _coordinate(point[1], -90, 90, "latitude")]
+                    for point in ring]
+            if len(ring) > 1 and ring[0] == ring[-1]:
+                ring.pop()
+            if len(ring) < 3:
+                raise ValueError("Polygon rings need at least 3 distinct positions.")
+            rings.append(ring)
+        if not rings or sum(len(ring) for ring in rings) > MAX_VERTICES:
+            raise ValueError(f"Polygon must have 1 to {MAX_VERTICES} positions.")
+        lons = [lon for lon, _ in rings[0]]
+        lats = [lat for _, lat in rings[0]]
+        if max(lons) - min(lons) > 180:
+            raise ValueError("Polygons may not cross the antimeridian.")
+        geometry = {"type": "Polygon", "coordinates": rings}
+        bbox = (min(lats), min(lons), max(lats), max(lons))
+    type_codes = _codes(body.get("type_codes"), "type_codes")
+    subtype_codes = _codes(body.get("subtype_codes"), "subtype_codes")
+    return {
+        "name": name,
+        "subscriber": subscriber,
+        "kind": geometry["type"],
+        "geometry": json.dumps(geometry, separators=(",", ":")),
+        "min_lat": bbox[0], "min_lon": bbox[1], "max_lat": bbox[2], "max_lon": bbox[3],
+        "cells": " ".join(covering(bbox)),
+        "type_codes": " ".join(type_codes) if type_codes else None,
+        "subtype_codes": " ".join(subtype_codes) if subtype_codes else None,
+    }
+
+class GeofenceIndex:
+    """Active geofences filed under geohash cells; see the module comment."""
+
+    def __init__(self):
+        self.geofences = {}  # geofence_id -> (Geofence, cells)
+        self.cells = {}  # geohash prefix -> {geofence_id: Geofence}
+        self.precisions = {}  # prefix length -> number of cells of that length
+        self.levels = ()
+        self.matches = 0
+        self.candidates = 0
+
+    def __len__(self) -> int:
+        return len(self.geofences)
+
+    def add(self, geofence: Geofence, cells=None):
+        self.remove(geofence.geofence_id)
+        cells = cells or covering((geofence.min_lat, geofence.min_lon, geofence.max_lat, geofence.max_lon))
+        self.geofences[geofence.geofence_id] = (geofence, cells)
+        for cell in cells:
+            bucket = self.cells.get(cell)
+            if bucket is None:
+                bucket = self.cells[cell] = {}
+                self.precisions[len(cell)] = self.precisions.get(len(cell), 0) + 1
+            bucket[geofence.geofence_id] = geofence
+        self.levels = tuple(sorted(self.precisions))
+
+    def remove(self, geofence_id) -> bool:
+        entry = self.geofences.pop(geofence_id, None)
+        if entry is None:
+            return False
+        for cell in entry[1]:
+            bucket = self.cells[cell]
+            del bucket[geofence_id]
+            if not bucket:
+                del self.cells[cell]
+                self.precisions[len(cell)] -= 1
+                if not self.precisions[len(cell)]:
+                    del self.precisions[len(cell)]
+        self.levels = tuple(sorted(self.precisions))
+        return True
+
+    def match(self, latitude: float, longitude: float, type_code=None, subtype_code=None, point_geohash=None) -> list:
+        """Geofences containing the point whose filters accept the report."""
+        if not self.levels:
+            return []
+        if point_geohash is None or len(point_geohash) < self.levels[-1]:
+            point_geohash = geohash.encode(latitude, longitude, max(self.levels[-1], geohash.STORED_PRECISION))
+        matched = []
+        cells = self.cells
+        for precision in self.levels:
+            bucket = cells.get(point_geohash[:precision])
+            if bucket is None:
+                continue
+            self.candidates += len(bucket)
+            for geofence in bucket.values():
+                # Bounding box inline: most candidates stop here without a call
+                if (geofence.min_lat <= latitude <= geofence.max_lat and geofence.min_lon <= longitude <= geofence.max_lon
+                        and geofence.accepts(type_code, subtype_code) and geofence.contains_exact(latitude, longitude)):
+                    matched.append(geofence)
+        self.matches += len(matched)
+        return matched
+
+    def stats(self) -> dict:
+        return {
+            "geofences": len(self.geofences),
+            "cells": len(self.cells),
+            "precisions": dict(sorted(self.precisions.items())),
+            "candidates": self.candidates,
+            "matches": self.matches,
+        }
+
+class LogDelivery:
+    """Delivery stub: logs each outbox message and keeps the latest ones in memory.
+
+    A real channel (webhook, SMS or push gateway) only needs the same
+    send(messages) coroutine, returning None for each delivered message or
+    an error string for one to retry.
+    """
+
+    def __init__(self, keep: int = 100):
+        self.recent = deque(maxlen=keep)
+        self.sent = 0
+
+    async def send(self, messages: list) -> list:
+        for message in messages:
+            payload = message["payload"]
+            logging.info(f"Geofence alert for {message['subscriber']}: request {payload['request_id']} "
+                         f"in {payload['geofence_name']!r}")
+            self.recent.append(message)
+        self.sent += len(messages)
+        return [None] * len(messages)
+
+    def stats(self) -> dict:
+        return {"channel": "log", "sent": self.sent}
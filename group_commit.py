@@ -0,0 +1,90 @@
+import asyncio
+import logging
+
+
+class GroupCommitWriter:
+    """Collects writes from many callers and commits them in batches.
+
+    Callers await submit(); a single background task drains the queue, hands
+    up to max_batch items (or whatever arrived within max_delay seconds) to
+    flush() in one transaction, and only then resolves each caller's future,
+    so a confirmation always means the batch is durable.
+    """
+
+    def __init__(self, flush, max_batch: int = 256, max_delay: float = 0.02, max_queue: int = 10000):
+        self.flush = flush
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.task = None
+        self.batches = 0
+        self.items = 0
+
+    async def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush whatever is queued and stop the writer task."""
+        if self.task is None:
+            return
+        await self.queue.join()
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        # Blocks when the queue is full, pushing back on callers
+        await self.queue.put((item, future))
+        return await future
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                results = await self.flush([item for item, _ in batch])
+            except Exception as e:
+                logging.exception(f"Group commit of {len(batch)} items failed")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                self.batches += 1
+                self.items += len(batch)
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize(),
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
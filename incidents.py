@@ -0,0 +1,347 @@
+import heapq
+import itertools
+import math
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from facilities import haversine_km
+
+# Incremental incident clustering for ATTACK/INJURY reports.
+#
+# Reports are DBSCAN-clustered with min_samples=1 over space and time: two
+# reports belong to the same incident when they are within radius_m of each
+# other and at most `window` apart, directly or through a chain of such
+# reports. Recent reports sit in a lat/lon grid with cells radius_m high, so
+# placing a new report only looks at the few cells around it and never
+# reclusters history. A report that links two incidents merges them.
+#
+# Open incidents are ranked in a max-priority queue. Each update pushes a new
+# heap entry and older entries for the same incident are skipped when popped
+# (lazy deletion), so updates cost O(log n) and top-k costs O(k log n).
+
+INCIDENT_TYPES = ("ATTACK", "INJURY")
+SUBTYPE_SEVERITY = {
+    "DEATH": 10.0,
+    "LIFE_THREAT": 8.0,
+    "ARTILLERY": 8.0,
+    "BULLETS": 6.0,
+    "DRONES": 5.0,
+    "MINOR": 2.0,
+}
+TYPE_SEVERITY = {"ATTACK": 4.0, "INJURY": 3.0}  # reports without a subtype
+METERS_PER_DEGREE = 111_320
+SWEEP_EVERY = 1024
+
+def severity(type_code, subtype_code) -> float:
+    return SUBTYPE_SEVERITY.get(subtype_code, TYPE_SEVERITY.get(type_code, 1.0))
+
+class Incident:
+    __slots__ = ("incident_id", "type_code", "subtype_code", "latitude", "longitude", "first_seen",
+                 "last_seen", "reports", "severity", "points")
+
+    def __init__(self, incident_id, type_code, subtype_code, latitude, longitude, first_seen, last_seen,
+                 reports=0, severity=0.0):
+        self.incident_id = incident_id
+        self.type_code = type_code
+        self.subtype_code = subtype_code
+        self.latitude = latitude
+        self.longitude = longitude
+        self.first_seen = first_seen
+        self.last_seen = last_seen
+        self.reports = reports
+        self.severity = severity
+        self.points = set()  # this incident's reports still in the grid
+
+    @property
+    def priority(self) -> float:
+        """Severity of the worst report, raised by how many reports back it up."""
+        return round(self.severity * (1 + math.log(max(self.reports, 1))), 3)
+
+    def add_report(self, latitude, longitude, timestamp, type_code, subtype_code, reports=1):
+        total = self.reports + reports
+        self.latitude += (latitude - self.latitude) * reports / total
+        self.longitude += (longitude - self.longitude) * reports / total
+        self.reports = total
+        self.first_seen = min(self.first_seen, timestamp)
+        self.last_seen = max(self.last_seen, timestamp)
+        weight = severity(type_code, subtype_code)
+        if weight > self.severity:
+            self.severity, self.type_code, self.subtype_code = weight, type_code, subtype_code
+
+    def absorb(self, other: "Incident"):
+        self.add_report(other.latitude, other.longitude, other.first_seen, other.type_code, other.subtype_code,
+                        reports=other.reports)
+        self.last_seen = max(self.last_seen, other.last_seen)
+        for point in other.points:
+            point.incident = self
+        self.points |= other.points
+        other.points = set()
+
+    def to_row(self) -> dict:
+        return {
+            "incident_id": self.incident_id,
+            "type_code": self.type_code,
+            "subtype_code": self.subtype_code,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "reports": self.reports,
+            "severity": self.severity,
+            "priority": self.priority,
+        }
+
+class _Point:
+    __slots__ = ("request_id", "latitude", "longitude", "timestamp", "incident")
+
+    def __init__(self, request_id, latitude, longitude, timestamp, incident):
+        self.request_id = request_id
+        self.latitude = latitude
+        self.longitude = longitude
+        self.timestamp = timestamp
+        self.incident = incident
+
+class PriorityQueue:
+    """Max-priority queue of keys with O(log n) update and remove (lazy deletion)."""
+
+    def __init__(self):
+        self.heap = []
+        self.current = {}  # key -> (priority, version) of its live heap entry
+        self.versions = itertools.count()
+
+    def __len__(self):
+        return len(self.current)
+
+    def update(self, key, priority: float):
+        version = next(self.versions)
+        self.current[key] = (priority, version)
+        heapq.heappush(self.heap, (-priority, version, key))
+        if len(self.heap) > 2 * len(self.current) + 1024:
+            self.heap = [(-p, v, k) for k, (p, v) in self.current.items()]
+            heapq.heapify(self.heap)
+
+    def remove(self, key):
+        self.current.pop(key, None)
+
+    def top(self, k: int) -> list:
+        """The k highest-priority keys, highest first; the queue is left unchanged."""
+        live = []
+        while self.heap and len(live) < k:
+            entry = heapq.heappop(self.heap)
+            if self.current.get(entry[2], (None, None))[1] == entry[1]:
+                live.append(entry)
+        for entry in live:
+            heapq.heappush(self.heap, entry)
+        return [key for _, _, key in live]
+
+class IncidentClusterer:
+    """Assigns reports to incidents as they arrive and keeps the triage queue."""
+
+    def __init__(self, radius_m: float = 500.0, window: timedelta = timedelta(minutes=30),
+                 active: timedelta = timedelta(hours=6)):
+        self.radius_m = radius_m
+        self.window = window
+        self.active = active
+        self.cell_deg = radius_m / METERS_PER_DEGREE
+        self.clear()
+
+    def clear(self):
+        self.cells = {}       # (row, col) -> deque of _Point, roughly oldest first
+        self.reports = {}     # request_id -> _Point, for reports still in the grid
+        self.incidents = {}   # incident_id -> Incident, open incidents only
+        self.queue = PriorityQueue()
+        self.latest = None  # newest report timestamp seen
+        self.added = 0
+        self.merges = 0
+
+    def _cell(self, latitude: float, longitude: float) -> tuple:
+        return (math.floor(latitude / self.cell_deg), math.floor(longitude / self.cell_deg))
+
+    def _neighbour_incidents(self, latitude: float, longitude: float, timestamp: datetime) -> list:
+        row, col = self._cell(latitude, longitude)
+        # Cells are radius_m high but narrower than that away from the equator
+        span = math.ceil(1 / max(math.cos(math.radians(latitude)), 0.01))
+        horizon = (self.latest or timestamp) - self.window
+        radius_km = self.radius_m / 1000
+        found = {}
+        for r in range(row - 1, row + 2):
+            for c in range(col - span, col + span + 1):
+                cell = self.cells.get((r, c))
+                if not cell:
+                    continue
+                while cell and cell[0].timestamp < horizon:
+                    self._evict(cell.popleft())
+                for point in cell:
+                    if point.incident.incident_id in found:
+                        continue
+                    if (abs(point.timestamp - timestamp) <= self.window
+                            and haversine_km(latitude, longitude, point.latitude, point.longitude) <= radius_km):
+                        found[point.incident.incident_id] = point.incident
+        return list(found.values())
+
+    def _evict(self, point: _Point):
+        point.incident.points.discard(point)
+        if self.reports.get(point.request_id) is point:
+            del self.reports[point.request_id]
+
+    def _place(self, request_id, latitude, longitude, timestamp, incident: Incident):
+        point = _Point(request_id, latitude, longitude, timestamp, incident)
+        self.cells.setdefault(self._cell(latitude, longitude), deque()).append(point)
+        self.reports[request_id] = point
+        incident.points.add(point)
+        if incident.incident_id not in self.incidents:
+            self.incidents[incident.incident_id] = incident
+        self.latest = timestamp if self.latest is None else max(self.latest, timestamp)
+
+    def assign(self, rows: list) -> tuple:
+        """Set "incident_id" on every row (None for non-incident types).
+
+        rows are request dicts with request_id, latitude, longitude,
+        timestamp, type_code and subtype_code. Returns (incidents to save,
+        [(merged_id, into_id), ...]). Assigning a request_id seen before
+        returns its current incident without counting it again, so a retried
+        insert does not inflate the incident.
+        """
+        changed = {}
+        merges = []
+        for row in rows:
+            row["incident_id"] = None
+            if row["type_code"] not in INCIDENT_TYPES:
+                continue
+            known = self.reports.get(row["request_id"])
+            if known is not None:
+                row["incident_id"] = known.incident.incident_id
+                continue
+            latitude, longitude, timestamp = row["latitude"], row["longitude"], row["timestamp"]
+            neighbours = self._neighbour_incidents(latitude, longitude, timestamp)
+            if neighbours:
+                neighbours.sort(key=lambda i: i.reports, reverse=True)
+                incident = neighbours[0]
+                for other in neighbours[1:]:
+                    incident.absorb(other)
+                    self.incidents.pop(other.incident_id, None)
+                    self.queue.remove(other.incident_id)
+                    changed.pop(other.incident_id, None)
+                    merges.append((other.incident_id, incident.incident_id))
+                    self.merges += 1
+            else:
+                incident = Incident(str(uuid.uuid4()), row["type_code"], row["subtype_code"],
+                                    latitude, longitude, timestamp, timestamp)
+            incident.add_report(latitude, longitude, timestamp, row["type_code"], row["subtype_code"])
+            self._place(row["request_id"], latitude, longitude, timestamp, incident)
+            self.queue.update(incident.incident_id, incident.priority)
+            changed[incident.incident_id] = incident
+            row["incident_id"] = incident.incident_id
+            self.added += 1
+            if self.added % SWEEP_EVERY == 0:
+                self.sweep(self.latest)
+        if merges:
+            # A row assigned early in the batch may belong to an incident merged later on
+            for row in rows:
+                point = self.reports.get(row["request_id"]) if row["incident_id"] else None
+                if point is not None:
+                    row["incident_id"] = point.incident.incident_id
+        return list(changed.values()), merges
+
+    def restore(self, incidents: list, reports: list) -> list:
+        """Reload state after a restart.
+
+        incidents are saved rows (to_row() keys) of open incidents; reports
+        are recent incident-type requests, oldest first, with an incident_id
+        (or None). Reports whose incident is not among `incidents` are
+        returned unplaced so the caller can assign() them.
+        """
+        self.clear()
+        for row in incidents:
+            incident = Incident(row["incident_id"], row["type_code"], row["subtype_code"], row["latitude"],
+                                row["longitude"], row["first_seen"], row["last_seen"], row["reports"], row["severity"])
+            self.incidents[incident.incident_id] = incident
+            self.queue.update(incident.incident_id, incident.priority)
+        unplaced = []
+        for report in reports:
+            incident = self.incidents.get(report["incident_id"])
+            if incident is None:
+                unplaced.append(report)
+            else:
+                self._place(report["request_id"], report["latitude"], report["longitude"], report["timestamp"], incident)
+        return unplaced
+
+    def catch_up(self, reports: list, incidents: dict) -> int:
+        """Apply reports that another process assigned and committed.
+
+        reports are incident-type requests in commit order, with the
+        incident_id they are saved under (after any later merge); incidents
+        maps those ids to their saved rows (to_row() keys). Each report joins
+        its saved incident, and the incidents it links in the grid are merged
+        into that one, as the other process did. Reports already placed are
+        skipped. Returns how many reports were applied.
+        """
+        touched = {}
+        applied = 0
+        for report in reports:
+            row = incidents.get(report["incident_id"])
+            if row is None or report["request_id"] in self.reports:
+                continue
+            if self.latest is not None and report["timestamp"] < self.latest - self.window:
+                # Already out of the grid (e.g. this worker's own report, seen again)
+                continue
+            incident = self.incidents.get(row["incident_id"])
+            if incident is None:
+                incident = Incident(row["incident_id"], row["type_code"], row["subtype_code"], row["latitude"],
+                                    row["longitude"], row["first_seen"], row["last_seen"], row["reports"], row["severity"])
+            latitude, longitude, timestamp = report["latitude"], report["longitude"], report["timestamp"]
+            for other in self._neighbour_incidents(latitude, longitude, timestamp):
+                if other is not incident:
+                    incident.absorb(other)
+                    self.incidents.pop(other.incident_id, None)
+                    self.queue.remove(other.incident_id)
+                    touched.pop(other.incident_id, None)
+                    self.merges += 1
+            self._place(report["request_id"], latitude, longitude, timestamp, incident)
+            touched[incident.incident_id] = incident
+            applied += 1
+        for incident_id, incident in touched.items():
+            # The saved row already counts every report and merge
+            row = incidents[incident_id]
+            incident.type_code, incident.subtype_code = row["type_code"], row["subtype_code"]
+            incident.latitude, incident.longitude = row["latitude"], row["longitude"]
+            incident.first_seen, incident.last_seen = row["first_seen"], row["last_seen"]
+            incident.reports, incident.severity = row["reports"], row["severity"]
+            self.queue.update(incident_id, incident.priority)
+        return applied
+
+    def sweep(self, now: datetime):
+        """Drop reports older than the window and incidents idle for longer than `active`."""
+        horizon = now - self.window
+        for key in list(self.cells):
+            cell = self.cells[key]
+            while cell and cell[0].timestamp < horizon:
+                self._evict(cell.popleft())
+            if not cell:
+                del self.cells[key]
+        closed = now - self.active
+        for incident_id in [i for i, incident in self.incidents.items() if incident.last_seen < closed]:
+            del self.incidents[incident_id]
+            self.queue.remove(incident_id)
+
+    def top(self, k: int, now: datetime) -> list:
+        """The k open incidents with the highest priority."""
+        closed = now - self.active
+        while True:
+            ids = self.queue.top(k)
+            stale = [i for i in ids if self.incidents[i].last_seen < closed]
+            if not stale:
+                return [self.incidents[i] for i in ids]
+            for incident_id in stale:
+                del self.incidents[incident_id]
+                self.queue.remove(incident_id)
+
+    def stats(self) -> dict:
+        return {
+            "open_incidents": len(self.incidents),
+            "grid_reports": len(self.reports),
+            "grid_cells": len(self.cells),
+            "heap_entries": len(self.queue.heap),
+            "assigned": self.added,
+            "merges": self.merges,
+        }
@@ -1,143 +1,288 @@
 import os
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, declarative_base, relationship
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, select
-import asyncio
+import argparse
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 from dotenv import load_dotenv
 from cryptography.fernet import Fernet
-from datetime import datetime, timedelta
-import uuid
-import random
+import numpy as np
+import geohash
+import migrations
+from models import DEFAULT_REQUEST_SUBTYPES
+
+# Seeded synthetic data generator. Coordinates, timestamps and types are drawn
+# in vectorized NumPy batches, names are encrypted in a process pool, and rows
+# go straight into SQLite with executemany. Every run appends new users and
+# requests, so it can be repeated against the same DB.
 
 # Load environment variables
 load_dotenv()
 
 DATA_DIR = os.path.abspath(os.environ.get("DATA_DIR", "../data"))
 DB_PATH = os.path.join(DATA_DIR, "emergency.db")
-DATABASE_URL = f"sqlite+aiosqlite:///{DB_PATH}"
-FERNET_KEY = os.environ.get("FERNET_KEY")
-fernet = Fernet(FERNET_KEY.encode())
-
-engine = create_async_engine(DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-Base = declarative_base()
-
-# --- Normalized Tables ---
-class RequestType(Base):
-    __tablename__ = "request_types"
-    type_code = Column(String, primary_key=True)
-    type_name = Column(String, nullable=False)
-    subtypes = relationship("RequestSubType", back_populates="type")
-
-class RequestSubType(Base):
-    __tablename__ = "request_subtypes"
-    subtype_code = Column(String, primary_key=True)
-    subtype_name = Column(String, nullable=False)
-    type_code = Column(String, ForeignKey("request_types.type_code"), nullable=False)
-    type = relationship("RequestType", back_populates="subtypes")
-
-class User(Base):
-    __tablename__ = "users"
-    user_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    phone = Column(String, unique=True, nullable=False)
-    name = Column(String, nullable=True)
-    surname = Column(String, nullable=True)
-    requests = relationship("EmergencyRequest", back_populates="user")
-
-class EmergencyRequest(Base):
-    __tablename__ = "emergency_requests"
-    request_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, ForeignKey("users.user_id"), nullable=False)
-    name = Column(String, nullable=False)
-    latitude = Column(Float, nullable=False)
-    longitude = Column(Float, nullable=False)
-    details = Column(String, nullable=True)
-    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
-    type_code = Column(String, ForeignKey("request_types.type_code"), nullable=True)
-    subtype_code = Column(String, ForeignKey("request_subtypes.subtype_code"), nullable=True)
-    user = relationship("User", back_populates="requests")
-
-# --- Code name mappings ---
-TYPE_CODES = {
-    "ATTACK": "Report attack",
-    "INJURY": "Report injury/casualty",
-    "MEDICAL": "Find medical services",
-    "HELPLINE": "Call helpline"
-}
-SUBTYPE_CODES = {
-    "BULLETS": ("Bullets", "ATTACK"),
-    "DRONES": ("Enemy drones", "ATTACK"),
-    "ARTILLERY": ("Heavy artillery / Bomblasts / Missiles", "ATTACK"),
-    "LIFE_THREAT": ("Life threatening injury", "INJURY"),
-    "DEATH": ("Death", "INJURY"),
-    "MINOR": ("Minor injuries", "INJURY")
-}
-
-# Dummy users: (name, phone)
-dummy_users = [
-    ("Amit", "9876543210"),
-    ("Priya", "9123456789"),
-    ("Rahul", "9988776655"),
-    ("Sneha", "9876501234"),
+
+# Each request is a (type_code, subtype_code) pair. Background requests follow
+# the first weights; requests inside an incident burst lean towards attacks
+# and injuries.
+REQUEST_KINDS = [(DEFAULT_REQUEST_SUBTYPES[s][1], s) for s in DEFAULT_REQUEST_SUBTYPES] + [
+    ("ATTACK", None), ("INJURY", None), ("MEDICAL", None), ("HELPLINE", None)
+]
+BACKGROUND_WEIGHTS = np.array([8, 4, 6, 6, 2, 10, 2, 2, 35, 25], dtype=float)
+BURST_WEIGHTS = np.array([20, 12, 18, 16, 8, 8, 4, 4, 7, 3], dtype=float)
+
+# Free-text details: condition + place + need, so words range from common to
+# rare combinations, as the admin search sees in practice
+DETAIL_CONDITIONS = ["Severe bleeding", "Gunshot wound", "Sprained ankle", "Unconscious", "Minor injuries", "Burns",
+                     "Broken leg", "Trapped under debris", "Shrapnel wound", "Chest pain", "Not breathing", "Head injury"]
+DETAIL_PLACES = ["", " near the market", " at the bus stand", " inside the school", " on the highway", " near the temple",
+                 " at the railway station", " in the field", " behind the hospital", " at the checkpoint"]
+DETAIL_NEEDS = ["", "", "", ", needs evacuation", ", needs ambulance", ", child involved", ", elderly person",
+                ", multiple casualties", ", road blocked"]
+DETAILS = [None, ""] + [c + p + n for c in DETAIL_CONDITIONS for p in DETAIL_PLACES for n in DETAIL_NEEDS]
+
+FIRST_NAMES = ["Amit", "Priya", "Rahul", "Sneha", "Arjun", "Kavya", "Vikram", "Ananya", "Rohan", "Isha",
+               "Karan", "Meera", "Sanjay", "Pooja", "Aditya", "Neha", "Manish", "Divya", "Suresh", "Lakshmi"]
+SURNAMES = [None, "Sharma", "Verma", "Patel", "Singh", "Reddy", "Iyer", "Das", "Khan", "Nair", "Gupta"]
+
+# India, approximately
+LAT_RANGE = (8.0, 37.0)
+LON_RANGE = (68.0, 97.0)
+# Hotspot candidates: large cities and border districts (lat, lon)
+HOTSPOT_CENTERS = [
+    (28.61, 77.21), (19.08, 72.88), (12.97, 77.59), (22.57, 88.36), (13.08, 80.27), (17.39, 78.49),
+    (23.02, 72.57), (18.52, 73.86), (26.91, 75.79), (26.85, 80.95), (34.08, 74.80), (32.73, 74.86),
+    (31.63, 74.87), (30.73, 76.78), (25.59, 85.14), (26.14, 91.74), (21.17, 72.83), (24.58, 73.71),
+    (33.78, 76.58), (27.33, 88.61),
 ]
 
-async def insert_dummy():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    async with SessionLocal() as session:
-        # Insert request types
-        for tcode, tname in TYPE_CODES.items():
-            exists = await session.get(RequestType, tcode)
-            if not exists:
-                session.add(RequestType(type_code=tcode, type_name=tname))
-        await session.commit()
-        # Insert subtypes
-        for scode, (sname, tcode) in SUBTYPE_CODES.items():
-            exists = await session.get(RequestSubType, scode)
-            if not exists:
-                session.add(RequestSubType(subtype_code=scode, subtype_name=sname, type_code=tcode))
-        await session.commit()
-        # Create users
-        user_objs = []
-        for name, phone in dummy_users:
-            user = User(user_id=str(uuid.uuid4()), phone=phone, name=name)
-            session.add(user)
-            user_objs.append(user)
-        await session.commit()
-        for user in user_objs:
-            await session.refresh(user)
-        # Insert 10,000 random requests
-        all_type_codes = list(TYPE_CODES.keys())
-        all_subtypes_by_type = {t: [scode for scode, (_, tcode) in SUBTYPE_CODES.items() if tcode == t] for t in TYPE_CODES}
-        base_date = datetime.utcnow() - timedelta(days=90)
-        for i in range(10000):
-            user = random.choice(user_objs)
-            type_code = random.choice(all_type_codes)
-            subtypes = all_subtypes_by_type[type_code]
-            subtype_code = random.choice(subtypes) if subtypes and random.random() > 0.2 else None
-            lat = round(random.uniform(8.0, 37.0), 6)  # India approx
-            lon = round(random.uniform(68.0, 97.0), 6)
-            details = random.choice([
-                "", "Severe bleeding", "Gunshot wound", "Sprained ankle", "Needs evacuation", "Minor injuries", "Unconscious", None
-            ]) if type_code in ("INJURY", "ATTACK") else None
-            ts = base_date + timedelta(seconds=random.randint(0, 90*24*3600))
-            encrypted_name = fernet.encrypt(user.name.encode()).decode()
-            req = EmergencyRequest(
-                request_id=str(uuid.uuid4()),
-                user_id=user.user_id,
-                name=encrypted_name,
-                latitude=lat,
-                longitude=lon,
-                type_code=type_code,
-                subtype_code=subtype_code,
-                details=details,
-                timestamp=ts
+# Phones generated here are "6" followed by nine digits, above any already present
+PHONE_PREFIX = "6"
+
+_worker_fernet = None
+
+def encrypt_names(key: bytes, names: list) -> list:
+    """Pool worker: one Fernet token per name, as /submit stores them."""
+    global _worker_fernet
+    if _worker_fernet is None:
+        _worker_fernet = Fernet(key)
+    return [_worker_fernet.encrypt(name.encode()).decode() for name in names]
+
+def encode_geohashes(lat, lon, precision: int = geohash.STORED_PRECISION) -> list:
+    """Vectorized geohash.encode for arrays of coordinates."""
+    lon_bits = (precision * 5 + 1) // 2
+    lat_bits = precision * 5 // 2
+    lon_idx = np.clip(((lon + 180) / 360 * (1 << lon_bits)).astype(np.int64), 0, (1 << lon_bits) - 1)
+    lat_idx = np.clip(((lat + 90) / 180 * (1 << lat_bits)).astype(np.int64), 0, (1 << lat_bits) - 1)
+    # Interleave, longitude first, then cut into 5-bit base32 digits
+    code = np.zeros(len(lat), dtype=np.int64)
+    for bit in range(precision * 5):
+        if bit % 2 == 0:
+            value = (lon_idx >> (lon_bits - 1 - bit // 2)) & 1
+        else:
+            value = (lat_idx >> (lat_bits - 1 - bit // 2)) & 1
+        code = (code << 1) | value
+    shifts = 5 * np.arange(precision - 1, -1, -1)
+    alphabet = np.frombuffer(geohash.BASE32.encode(), dtype=np.uint8)
+    chars = np.ascontiguousarray(alphabet[(code[:, None] >> shifts) & 31])
+    return chars.view(f"S{precision}").ravel().astype(str).tolist()
+
+def make_uuids(rng, n: int) -> list:
+    raw = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    return [str(uuid.UUID(bytes=row.tobytes())) for row in raw]
+
+class Scenario:
+    """Spatial hotspots and temporal bursts shared by every batch of one run."""
+
+    def __init__(self, rng, days: int, hotspots: int, bursts: int, end: datetime):
+        self.end = np.datetime64(end.replace(microsecond=0), "s")
+        self.span = days * 86400
+        centers = [HOTSPOT_CENTERS[i % len(HOTSPOT_CENTERS)] for i in range(hotspots)]
+        self.centers = np.array(centers, dtype=float) + rng.normal(0, 0.05, size=(hotspots, 2))
+        self.spread = rng.uniform(0.03, 0.4, size=hotspots)
+        # A few hotspots take most of the traffic
+        weights = 1 / np.arange(1, hotspots + 1)
+        self.hotspot_p = weights / weights.sum()
+        # Bursts: an incident at one hotspot, decaying over a few hours
+        self.burst_hotspot = rng.choice(hotspots, size=bursts, p=self.hotspot_p)
+        self.burst_start = rng.integers(0, self.span, size=bursts)
+        self.burst_decay = rng.uniform(900, 6 * 3600, size=bursts)
+        # Requests peak in the evening and dip before dawn
+        hours = np.arange(24)
+        diurnal = 1 + 0.8 * np.sin((hours - 13) / 24 * 2 * np.pi)
+        self.hour_p = diurnal / diurnal.sum()
+
+    def sample(self, rng, n: int, hotspot_share: float, burst_share: float):
+        kind = rng.random(n)
+        in_burst = kind < burst_share
+        in_hotspot = ~in_burst & (kind < burst_share + hotspot_share)
+
+        seconds_ago = (rng.integers(0, self.span // 86400, size=n) * 86400
+                       + (23 - rng.choice(24, size=n, p=self.hour_p)) * 3600
+                       + rng.integers(0, 3600, size=n))
+        lat = rng.uniform(*LAT_RANGE, size=n)
+        lon = rng.uniform(*LON_RANGE, size=n)
+
+        hotspot = rng.choice(len(self.centers), size=n, p=self.hotspot_p)
+        burst = rng.integers(0, len(self.burst_start), size=n) if len(self.burst_start) else None
+        if burst is not None:
+            hotspot = np.where(in_burst, self.burst_hotspot[burst], hotspot)
+            offset = self.burst_start[burst] + rng.exponential(self.burst_decay[burst])
+            seconds_ago = np.where(in_burst, np.clip(self.span - offset, 0, self.span), seconds_ago)
+        else:
+            in_burst[:] = False
+        clustered = in_burst | in_hotspot
+        sigma = self.spread[hotspot]
+        lat = np.where(clustered, self.centers[hotspot, 0] + rng.normal(0, 1, n) * sigma, lat)
+        lon = np.where(clustered, self.centers[hotspot, 1] + rng.normal(0, 1, n) * sigma, lon)
+        lat = np.round(np.clip(lat, *LAT_RANGE), 6)
+        lon = np.round(np.clip(lon, *LON_RANGE), 6)
+
+        background = rng.choice(len(REQUEST_KINDS), size=n, p=BACKGROUND_WEIGHTS / BACKGROUND_WEIGHTS.sum())
+        bursty = rng.choice(len(REQUEST_KINDS), size=n, p=BURST_WEIGHTS / BURST_WEIGHTS.sum())
+        kinds = np.where(in_burst, bursty, background)
+
+        timestamps = self.end - seconds_ago.astype("timedelta64[s]")
+        timestamps = timestamps + rng.integers(0, 1_000_000, size=n).astype("timedelta64[us]")
+        # SQLAlchemy's SQLite DateTime format
+        stamps = np.char.replace(np.datetime_as_string(timestamps, unit="us"), "T", " ")
+        return lat, lon, kinds, stamps
+
+def next_phone(conn) -> int:
+    row = conn.execute(
+        "SELECT max(phone) FROM users WHERE phone GLOB ?", (PHONE_PREFIX + "[0-9]" * 9,)
+    ).fetchone()
+    return int(row[0]) + 1 if row[0] else int(PHONE_PREFIX + "0" * 9)
+
+def insert_users(conn, rng, count: int) -> tuple:
+    first_phone = next_phone(conn)
+    if first_phone + count > int(PHONE_PREFIX + "9" * 9):
+        raise SystemExit("Ran out of generated phone numbers.")
+    user_ids = make_uuids(rng, count)
+    names = [FIRST_NAMES[i] for i in rng.integers(0, len(FIRST_NAMES), size=count)]
+    surnames = [SURNAMES[i] for i in rng.integers(0, len(SURNAMES), size=count)]
+    conn.executemany(
+        "INSERT INTO users (user_id, phone, name, surname) VALUES (?, ?, ?, ?)",
+        zip(user_ids, (str(first_phone + i) for i in range(count)), names, surnames)
+    )
+    conn.commit()
+    return user_ids, names
+
+def existing_users(conn, limit: int = 1_000_000) -> tuple:
+    rows = conn.execute("SELECT user_id, name FROM users WHERE name IS NOT NULL LIMIT ?", (limit,)).fetchall()
+    return [r[0] for r in rows], [r[1] for r in rows]
+
+def generate(db_path: str = DB_PATH, rows: int = 10000, users: int = None, seed: int = 42, days: int = 90,
+             hotspots: int = 12, bursts: int = 40, hotspot_share: float = 0.6, burst_share: float = 0.15,
+             batch_size: int = 100_000, workers: int = None, fernet_key: str = None) -> int:
+    """Append `rows` requests (and `users` new users) to db_path; returns the number of requests added.
+
+    The output depends only on the seed and on how many requests the database
+    already held, so appending to the same database never repeats ids.
+    """
+    # Encrypt with the primary key, as the app does
+    fernet_key = fernet_key or os.environ.get("FERNET_KEYS", "").split(",")[0].strip() or os.environ.get("FERNET_KEY")
+    if not fernet_key:
+        raise SystemExit("FERNET_KEY must be set to encrypt generated names.")
+    key = fernet_key.encode()
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    version = migrations.schema_version(conn)
+    if version is not None and version < migrations.LATEST_VERSION:
+        raise SystemExit(f"{db_path} is at schema v{version}; run `python migrations.py` first.")
+    conn.execute("PRAGMA journal_mode=WAL")
+    # Bulk load: a crash just means re-running the generator
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-200000")
+    if version is None:
+        # Indexes, triggers and the search index are built after loading, which
+        # is much faster than maintaining them row by row
+        migrations.apply_schema(conn, indexes=False)
+        conn.commit()
+
+    existing = conn.execute("SELECT max(rowid) FROM emergency_requests").fetchone()[0] or 0
+    rng = np.random.default_rng([seed, existing])
+    users = max(4, rows // 50) if users is None else users
+    user_ids, user_names = insert_users(conn, rng, users) if users else existing_users(conn)
+    if not user_ids:
+        raise SystemExit("No users to attach requests to; pass --users.")
+    # Some users report far more often than others
+    activity = rng.pareto(1.5, size=len(user_ids)) + 1
+    activity /= activity.sum()
+    scenario = Scenario(rng, days, hotspots, bursts, datetime.utcnow())
+    workers = workers or os.cpu_count() or 1
+
+    def next_batch(n):
+        lat, lon, kinds, stamps = scenario.sample(rng, n, hotspot_share, burst_share)
+        owners = rng.choice(len(user_ids), size=n, p=activity)
+        names = [user_names[i] for i in owners]
+        chunk = -(-n // workers)
+        futures = [pool.submit(encrypt_names, key, names[i:i + chunk]) for i in range(0, n, chunk)]
+        details = rng.integers(0, len(DETAILS), size=n)
+        return {
+            "request_id": make_uuids(rng, n),
+            "user_id": [user_ids[i] for i in owners],
+            "latitude": lat.tolist(),
+            "longitude": lon.tolist(),
+            "kinds": kinds.tolist(),
+            "details": details.tolist(),
+            "timestamp": stamps.tolist(),
+            "geohash": encode_geohashes(lat, lon),
+            "futures": futures,
+        }
+
+    started = time.perf_counter()
+    added = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        sizes = [min(batch_size, rows - offset) for offset in range(0, rows, batch_size)]
+        # Generate and encrypt the next batch while the current one is inserted
+        pending = next_batch(sizes[0]) if sizes else None
+        for i, size in enumerate(sizes):
+            batch = pending
+            pending = next_batch(sizes[i + 1]) if i + 1 < len(sizes) else None
+            tokens = [token for future in batch["futures"] for token in future.result()]
+            values = []
+            for j in range(size):
+                type_code, subtype_code = REQUEST_KINDS[batch["kinds"][j]]
+                details = DETAILS[batch["details"][j]] if type_code in ("INJURY", "ATTACK") else None
+                values.append((
+                    batch["request_id"][j], batch["user_id"][j], tokens[j], batch["latitude"][j],
+                    batch["longitude"][j], type_code, subtype_code, details, batch["timestamp"][j], batch["geohash"][j]
+                ))
+            conn.executemany(
+                "INSERT INTO emergency_requests (request_id, user_id, name, latitude, longitude, type_code, "
+                "subtype_code, details, timestamp, geohash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                values
             )
-            session.add(req)
-            if i % 500 == 0:
-                await session.commit()
-        await session.commit()
-    print("Inserted dummy users, request types, subtypes, and 10,000 requests.")
+            conn.commit()
+            added += size
+            elapsed = time.perf_counter() - started
+            print(f"Inserted {added:,}/{rows:,} requests ({added / elapsed:,.0f} rows/s)", flush=True)
+    if version is None:
+        migrations.create_schema(conn)
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    print(f"Inserted {users:,} users and {added:,} requests in {time.perf_counter() - started:.1f}s.")
+    return added
 
 if __name__ == "__main__":
-    asyncio.run(insert_dummy()) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Append seeded synthetic users and emergency requests to the database.")
+    parser.add_argument("--rows", type=int, default=10000, help="requests to add")
+    parser.add_argument("--users", type=int, default=None, help="new users to create (default rows/50; 0 reuses existing users)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--days", type=int, default=90, help="history to spread requests over")
+    parser.add_argument("--hotspots", type=int, default=12, help="number of spatial hotspots")
+    parser.add_argument("--bursts", type=int, default=40, help="number of incident bursts")
+    parser.add_argument("--hotspot-share", type=float, default=0.6, help="fraction of requests near a hotspot")
+    parser.add_argument("--burst-share", type=float, default=0.15, help="fraction of requests inside a burst")
+    parser.add_argument("--batch-size", type=int, default=100_000, help="rows per transaction")
+    parser.add_argument("--workers", type=int, default=None, help="encryption processes (default: CPU count)")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database path")
+    args = parser.parse_args()
+    generate(args.db, args.rows, args.users, args.seed, args.days, args.hotspots, args.bursts,
+             args.hotspot_share, args.burst_share, args.batch_size, args.workers)
+    print("Run `python rebuild_rollups.py` so the stats API includes the new rows.")
@@ -1,11 +1,11 @@
-from fastapi import FastAPI, Request, Form, Query
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi import FastAPI, APIRouter, Request, Form, Query
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, declarative_base, relationship
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
-import uvicorn
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy import event, and_, or_, select, func, literal_column, bindparam, false
 import os
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from starlette.status import HTTP_401_UNAUTHORIZED
@@ -19,16 +19,46 @@ from starlette.middleware.httpsredirect import HTTPSRedirectMiddleware
 from fastapi import status
 from starlette.requests import Request as StarletteRequest
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import re
 from fastapi.responses import JSONResponse
 from fastapi import Cookie
 from typing import Optional, List
 from starlette.middleware.sessions import SessionMiddleware
 import uuid
+import json
+import asyncio
+from collections import deque
+import base64
 from fastapi import Body
+from cache import LRUCache
+import geohash
+from group_commit import GroupCommitWriter
+from crypto import CryptoService
+from broadcast import Broadcaster
+from catalog import ReferenceCatalog
+from facilities import FacilityDirectory
+from incidents import IncidentClusterer, INCIDENT_TYPES
+from ratelimit import RateLimiter, make_backend
+import archive
+import search
+import export
+import metrics
+from profiling import SlowRequestProfiler, collapsed_stacks
+import readpool
+import responses
+from types import SimpleNamespace
+from operator import attrgetter, itemgetter
+from sqlalchemy.engine import Row
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from starlette.background import BackgroundTask
+import migrations
+import geofences
+from models import (User, RequestType, RequestSubType, EmergencyRequest, RequestRollup, ArchivePart, IdempotencyKey,
+                    TableVersion, Incident, Geofence, GeofenceOutbox, REQUEST_ROWID, ROLLUP_CELL_PRECISION)
 
-app = FastAPI()
+router = APIRouter()
 
 # Load environment variables from .env file
 load_dotenv()
@@ -38,38 +68,208 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(mess
 
 # --- Advanced Security Features ---
 
-# 1. Enforce HTTPS in production (uncomment in production)
-# app.add_middleware(HTTPSRedirectMiddleware)
+# 1. Enforce HTTPS in production (uncomment the middleware in create_app)
 
 # 2. Store database outside web root
 DATA_DIR = os.path.abspath(os.environ.get("DATA_DIR", "../data"))
-os.makedirs(DATA_DIR, exist_ok=True)
 DB_PATH = os.path.join(DATA_DIR, "emergency.db")
 DATABASE_URL = f"sqlite+aiosqlite:///{DB_PATH}"
-engine = create_async_engine(DATABASE_URL, echo=True)
+# SQL_ECHO=1 logs every statement; too slow for production traffic
+SQL_ECHO = os.environ.get("SQL_ECHO", "0") == "1"
+engine = create_async_engine(DATABASE_URL, echo=SQL_ECHO)
+
+# WAL lets readers run alongside the single writer and makes commits cheaper.
+# synchronous=FULL keeps every acknowledged SOS durable across power loss;
+# NORMAL is faster but may lose the last commits on an OS crash.
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "FULL")
+
+@event.listens_for(engine.sync_engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-20000")
+    cursor.close()
+
+# Metrics: latency histograms per route and per SQL query shape, in-flight
+# requests, session connection waits and Fernet timings, served in Prometheus
+# text format on /admin/metrics. METRICS=0 turns the recording off.
+METRICS_ENABLED = os.environ.get("METRICS", "1") == "1"
+metrics_registry = metrics.Registry(prefix="sos_")
+if METRICS_ENABLED:
+    metrics.instrument_engine(engine.sync_engine, metrics_registry)
+metrics_registry.gauge("db_connections_checked_out", "Database connections currently in use.",
+                       function=lambda: engine.sync_engine.pool.checkedout())
+fernet_batch_seconds = metrics_registry.histogram("fernet_batch_seconds", "Time to run one Fernet batch on the pool.", ("op",))
+fernet_item_seconds = metrics_registry.histogram("fernet_item_seconds", "Time from queueing a Fernet item to its result.", ("op",))
+
+def observe_fernet_batch(op: str, size: int, seconds: float):
+    fernet_batch_seconds.observe(seconds, op)
+
+def observe_fernet_item(op: str, seconds: float):
+    fernet_item_seconds.observe(seconds, op)
+
+# PROFILING=1 allows admins to capture stack profiles of slow requests on
+# demand (POST /admin/api/profile). Off by default; costs nothing until armed.
+PROFILING = os.environ.get("PROFILING", "0") == "1"
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+profiler = SlowRequestProfiler(interval=PROFILE_INTERVAL_MS / 1000) if PROFILING else None
+
+# Read/write split: the admin dashboard and its APIs read through a separate
+# pool of read-only connections, so large historical queries never hold the
+# connections that /submit, /login and /profile write with. At most
+# READ_CONCURRENCY admin reads and READ_BULK_CONCURRENCY bulk streams
+# (exports, NDJSON) run at once, since each also takes event loop time from
+# the submit path; the rest wait up to READ_QUEUE_TIMEOUT seconds and then
+# get a 503. Read statements are interrupted after READ_QUERY_TIMEOUT seconds
+# (bulk streams are exempt).
+READ_CONCURRENCY = int(os.environ.get("READ_CONCURRENCY", 4))
+READ_BULK_CONCURRENCY = int(os.environ.get("READ_BULK_CONCURRENCY", 1))
+READ_QUEUE_TIMEOUT = float(os.environ.get("READ_QUEUE_TIMEOUT", 5))
+READ_QUERY_TIMEOUT = float(os.environ.get("READ_QUERY_TIMEOUT", 10))
+# Two connections more than the slots, for the readers that take no slot: the
+# live feed poll and the incident refresh, each holding one at a time. Archive
+# part lookups run inside the slot of the request that makes them.
+READ_BACKGROUND_CONNECTIONS = 2
+read_engine = create_async_engine(DATABASE_URL, echo=SQL_ECHO, max_overflow=0,
+                                  pool_size=READ_CONCURRENCY + READ_BULK_CONCURRENCY + READ_BACKGROUND_CONNECTIONS)
+event.listen(read_engine.sync_engine, "connect", set_sqlite_pragmas)
+readpool.make_read_only(read_engine.sync_engine, READ_QUERY_TIMEOUT)
+read_gate = readpool.ReadGate(READ_CONCURRENCY, READ_QUEUE_TIMEOUT)
+bulk_gate = readpool.ReadGate(READ_BULK_CONCURRENCY, READ_QUEUE_TIMEOUT)
+if METRICS_ENABLED:
+    metrics.instrument_engine(read_engine.sync_engine, metrics_registry)
+metrics_registry.gauge("db_read_connections_checked_out", "Read-only connections currently in use.",
+                       function=lambda: read_engine.sync_engine.pool.checkedout())
+metrics_registry.gauge("read_queries_waiting", "Admin reads queued for a read slot.", function=lambda: read_gate.waiting)
+metrics_registry.gauge("bulk_reads_waiting", "Exports and NDJSON streams queued for a bulk slot.", function=lambda: bulk_gate.waiting)
 
 # 3. Encrypt sensitive fields (name) using Fernet
-FERNET_KEY = os.environ.get("FERNET_KEY")
-if not FERNET_KEY:
-    FERNET_KEY = Fernet.generate_key().decode()
-    print(f"[SECURITY] Generated new FERNET_KEY: {FERNET_KEY}")
-fernet = Fernet(FERNET_KEY.encode())
+# FERNET_KEYS is a comma-separated list: the first key encrypts, all of them
+# decrypt. To rotate, put a new key first, re-encrypt (see /admin/api/rotate-keys)
+# and then drop the old key.
+FERNET_KEYS = [k.strip() for k in os.environ.get("FERNET_KEYS", os.environ.get("FERNET_KEY", "")).split(",") if k.strip()]
+if not FERNET_KEYS:
+    FERNET_KEYS = [Fernet.generate_key().decode()]
+    print(f"[SECURITY] Generated new FERNET_KEY: {FERNET_KEYS[0]}")
+FERNET_KEY = FERNET_KEYS[0]
+
+# Encryption runs on a worker pool so it never blocks the event loop
+CRYPTO_POOL = os.environ.get("CRYPTO_POOL", "thread")  # thread | process
+CRYPTO_WORKERS = int(os.environ.get("CRYPTO_WORKERS", 2))
+CRYPTO_BATCH_SIZE = int(os.environ.get("CRYPTO_BATCH_SIZE", 64))
+CRYPTO_QUEUE_SIZE = int(os.environ.get("CRYPTO_QUEUE_SIZE", 10000))
+crypto = CryptoService(FERNET_KEYS, pool=CRYPTO_POOL, workers=CRYPTO_WORKERS,
+                       max_batch=CRYPTO_BATCH_SIZE, max_queue=CRYPTO_QUEUE_SIZE,
+                       on_batch=observe_fernet_batch if METRICS_ENABLED else None,
+                       on_item=observe_fernet_item if METRICS_ENABLED else None)
+metrics_registry.gauge("crypto_queue_depth", "Fernet items waiting for a worker.", function=lambda: crypto.queue.qsize())
+# Synchronous MultiFernet for scripts and benchmarks
+fernet = crypto.fernet
 
 # 4. Rate limiting for admin route
 RATE_LIMIT = int(os.environ.get("ADMIN_RATE_LIMIT", 5))  # requests
 RATE_PERIOD = int(os.environ.get("ADMIN_RATE_PERIOD", 60))  # seconds
-rate_limit_cache = {}
+# "memory" keeps limiter state per process; "sqlite" shares it between
+# workers through a small database next to emergency.db
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+rate_limit_backend = make_backend(RATE_LIMIT_BACKEND, os.path.join(DATA_DIR, "ratelimit.db"))
+admin_limiter = RateLimiter(RATE_LIMIT, RATE_PERIOD, rate_limit_backend)
 
 def check_rate_limit(ip: str):
-    now = time.time()
-    window = rate_limit_cache.get(ip, [])
-    window = [t for t in window if now - t < RATE_PERIOD]
-    if len(window) >= RATE_LIMIT:
+    if not admin_limiter.hit(f"admin:{ip}"):
         raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many requests. Try again later.")
-    window.append(now)
-    rate_limit_cache[ip] = window
 
-# 5. IP Whitelisting for admin route
+# 5. Per-user SOS submit throttle (3 requests/hour except for 'MEDICAL')
+SUBMIT_LIMIT = int(os.environ.get("SUBMIT_LIMIT", 3))  # requests
+SUBMIT_PERIOD = int(os.environ.get("SUBMIT_PERIOD", 3600))  # seconds
+# "memory" answers from an in-process sliding window, "db" runs a COUNT per submit,
+# "limiter" uses the GCRA limiter on RATE_LIMIT_BACKEND (use "db", or "limiter"
+# with the sqlite backend, when several workers share the database)
+SUBMIT_THROTTLE = os.environ.get("SUBMIT_THROTTLE", "memory")
+
+class SubmitThrottle:
+    """Sliding window of each user's most recent submission times.
+
+    Only the last SUBMIT_LIMIT timestamps per user are kept, so checks are O(1)
+    and never touch the database. Rebuilt from the DB on startup.
+    """
+
+    def __init__(self, limit: int, period: int):
+        self.limit = limit
+        self.period = timedelta(seconds=period)
+        self.windows = {}
+        self._acquires = 0
+
+    def _window(self, user_id: str, now: datetime):
+        window = self.windows.get(user_id)
+        if window is None:
+            window = self.windows[user_id] = deque(maxlen=self.limit)
+        while window and now - window[0] >= self.period:
+            window.popleft()
+        return window
+
+    def acquire(self, user_id: str, enforce: bool = True, now: Optional[datetime] = None) -> bool:
+        """Record a submission; returns False (and records nothing) if over the limit."""
+        now = now or datetime.utcnow()
+        self._acquires += 1
+        if self._acquires % 1000 == 0:
+            self.evict_idle(now)
+        window = self._window(user_id, now)
+        if enforce and len(window) >= self.limit:
+            return False
+        window.append(now)
+        return True
+
+    def release(self, user_id: str, now: datetime):
+        window = self.windows.get(user_id)
+        if window and now in window:
+            window.remove(now)
+
+    def evict_idle(self, now: Optional[datetime] = None):
+        now = now or datetime.utcnow()
+        for user_id in [u for u, w in self.windows.items() if not w or now - w[-1] >= self.period]:
+            del self.windows[user_id]
+
+    async def rebuild(self, session):
+        self.windows.clear()
+        since = datetime.utcnow() - self.period
+        result = await session.execute(
+            select(EmergencyRequest.user_id, EmergencyRequest.timestamp)
+            .where(EmergencyRequest.timestamp >= since)
+            .order_by(EmergencyRequest.timestamp)
+        )
+        for user_id, ts in result:
+            self._window(user_id, ts).append(ts)
+
+submit_throttle = SubmitThrottle(SUBMIT_LIMIT, SUBMIT_PERIOD)
+submit_limiter = RateLimiter(SUBMIT_LIMIT, SUBMIT_PERIOD, rate_limit_backend)
+
+async def count_recent_requests(session, user_id: str, since: datetime) -> int:
+    result = await session.execute(
+        select(func.count())
+        .select_from(EmergencyRequest.__table__)
+        .where(EmergencyRequest.user_id == user_id)
+        .where(EmergencyRequest.timestamp >= since)
+    )
+    return result.scalar_one()
+
+async def throttle_allows(user_id: str, type_code: str, now: datetime, pending: int = 0) -> bool:
+    """Apply the submit throttle to one new request; pending counts accepted but uncommitted ones."""
+    enforce = type_code != "MEDICAL"
+    if SUBMIT_THROTTLE == "memory":
+        return submit_throttle.acquire(user_id, enforce=enforce, now=now)
+    if SUBMIT_THROTTLE == "limiter":
+        return submit_limiter.hit(f"submit:{user_id}", enforce=enforce)
+    if not enforce:
+        return True
+    async with SessionLocal() as session:
+        recent = await count_recent_requests(session, user_id, now - timedelta(seconds=SUBMIT_PERIOD))
+    return recent + pending < SUBMIT_LIMIT
+
+# 6. IP Whitelisting for admin route
 ADMIN_ALLOWED_IPS = os.environ.get("ADMIN_ALLOWED_IPS", "127.0.0.1").split(",")
 
 def check_ip_whitelist(request: StarletteRequest):
@@ -81,68 +281,651 @@ def check_ip_whitelist(request: StarletteRequest):
 
 # Database setup
 SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-Base = declarative_base()
-
-class User(Base):
-    __tablename__ = "users"
-    user_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    phone = Column(String, unique=True, nullable=False)
-    name = Column(String, nullable=True)
-    surname = Column(String, nullable=True)
-    requests = relationship("EmergencyRequest", back_populates="user")
-
-class RequestType(Base):
-    __tablename__ = "request_types"
-    type_code = Column(String, primary_key=True)
-    type_name = Column(String, nullable=False)
-    subtypes = relationship("RequestSubType", back_populates="type")
-
-class RequestSubType(Base):
-    __tablename__ = "request_subtypes"
-    subtype_code = Column(String, primary_key=True)
-    subtype_name = Column(String, nullable=False)
-    type_code = Column(String, ForeignKey("request_types.type_code"), nullable=False)
-    type = relationship("RequestType", back_populates="subtypes")
-
-class EmergencyRequest(Base):
-    __tablename__ = "emergency_requests"
-    request_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, ForeignKey("users.user_id"), nullable=False)
-    name = Column(String, nullable=False)  # Encrypted
-    latitude = Column(Float, nullable=False)
-    longitude = Column(Float, nullable=False)
-    details = Column(String, nullable=True)
-    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
-    type_code = Column(String, ForeignKey("request_types.type_code"), nullable=True)
-    subtype_code = Column(String, ForeignKey("request_subtypes.subtype_code"), nullable=True)
-    user = relationship("User", back_populates="requests")
-
-# Create DB tables
-@app.on_event("startup")
-async def startup():
+ReadSessionLocal = sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+if METRICS_ENABLED:
+    metrics.instrument_sessions(AsyncSession.sync_session_class, metrics_registry)
+# Reference data: request types and subtypes, served from memory
+catalog = ReferenceCatalog()
+
+async def reload_catalog():
+    """Reload the catalog; call after changing request_types or request_subtypes."""
+    async with SessionLocal() as session:
+        types = (await session.execute(select(RequestType.type_code, RequestType.type_name))).fetchall()
+        subtypes = (await session.execute(
+            select(RequestSubType.subtype_code, RequestSubType.subtype_name, RequestSubType.type_code)
+        )).fetchall()
+    catalog.load(types, subtypes)
+    logging.info(f"Loaded reference catalog v{catalog.version}: {len(catalog.types)} types, {len(catalog.subtypes)} subtypes")
+
+# Nearest medical facilities for MEDICAL requests, from a CSV or JSON file of
+# facilities. The file is checked every FACILITIES_RELOAD_SECONDS and the index
+# is rebuilt off the event loop when it changes, so no restart is needed.
+FACILITIES_PATH = os.environ.get("FACILITIES_PATH", os.path.join(DATA_DIR, "facilities.csv"))
+FACILITIES_RELOAD_SECONDS = float(os.environ.get("FACILITIES_RELOAD_SECONDS", 10))
+NEAREST_FACILITIES = int(os.environ.get("NEAREST_FACILITIES", 3))
+facility_directory = FacilityDirectory(FACILITIES_PATH)
+facility_watch_task = None
+
+async def watch_facilities():
+    while True:
+        await asyncio.sleep(FACILITIES_RELOAD_SECONDS)
+        await asyncio.to_thread(facility_directory.check)
+
+def nearest_facilities(latitude: float, longitude: float) -> list:
+    return [
+        dict(facility, distance_km=round(distance, 2))
+        for distance, facility in facility_directory.nearest(latitude, longitude, NEAREST_FACILITIES)
+    ]
+
+# User profiles are read on every /submit, /auth-status and /profile call but
+# almost never change, so they are cached by user_id. /login and /profile
+# refresh the entry whenever they write.
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 300))  # seconds
+user_cache = LRUCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+def user_profile(row) -> dict:
+    return {"user_id": row.user_id, "phone": row.phone, "name": row.name, "surname": row.surname}
+
+async def get_user_profile(user_id: str) -> Optional[dict]:
+    profile = user_cache.get(user_id)
+    if profile is None:
+        async with SessionLocal() as session:
+            result = await session.execute(User.__table__.select().where(User.user_id == user_id))
+            user = result.fetchone()
+        if not user:
+            return None
+        profile = user_profile(user)
+        user_cache.set(user_id, profile)
+    return profile
+
+# Per-hour x type x subtype x grid-cell request counts, kept up to date on every
+# insert so analytics never have to scan emergency_requests. The grid precision
+# is ROLLUP_CELL_PRECISION, imported from models.
+
+# Cold tier: requests moved out by archive_requests.py into Parquet parts. The
+# rollups above keep counting archived requests, so stats need no cold reads.
+ARCHIVE_DIR = os.path.abspath(os.environ.get("ARCHIVE_DIR", os.path.join(DATA_DIR, "archive")))
+
+def rollup_key(timestamp: datetime, type_code, subtype_code, request_geohash) -> tuple:
+    return (
+        timestamp.replace(minute=0, second=0, microsecond=0),
+        type_code or "",
+        subtype_code or "",
+        (request_geohash or "")[:ROLLUP_CELL_PRECISION]
+    )
+
+async def increment_rollups(session, keys):
+    """Add one to the rollup bucket of each key (as returned by rollup_key)."""
+    counts = {}
+    for key in keys:
+        counts[key] = counts.get(key, 0) + 1
+    stmt = sqlite_insert(RequestRollup.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["hour", "type_code", "subtype_code", "cell"],
+        set_={"count": RequestRollup.__table__.c.count + stmt.excluded.count}
+    )
+    await session.execute(stmt, [
+        {"hour": hour, "type_code": t, "subtype_code": s, "cell": cell, "count": n}
+        for (hour, t, s, cell), n in counts.items()
+    ])
+
+# Incident clustering: ATTACK/INJURY reports within INCIDENT_RADIUS_M and
+# INCIDENT_WINDOW_MINUTES of each other (directly or in a chain) are one
+# incident. Each report is assigned just before it is inserted; open incidents
+# are ranked for triage by /admin/api/incidents.
+#
+# Every worker keeps the clusterer in memory, and assignment is serialized
+# through the database: a transaction that inserts ATTACK/INJURY reports first
+# bumps the "incidents" row of table_versions, which takes SQLite's write lock
+# until it commits. If the version it finds is not the one this worker last
+# wrote or read, other workers have clustered reports since, and the clusterer
+# replays their reports (rowid above the last one seen) before assigning. A
+# transaction that rolls back leaves the clusterer to be rebuilt from the
+# database on its next use, as at startup.
+INCIDENT_RADIUS_M = float(os.environ.get("INCIDENT_RADIUS_M", 500))
+INCIDENT_WINDOW_MINUTES = int(os.environ.get("INCIDENT_WINDOW_MINUTES", 30))
+INCIDENT_ACTIVE_HOURS = float(os.environ.get("INCIDENT_ACTIVE_HOURS", 6))  # idle time before an incident closes
+INCIDENT_REFRESH_SECONDS = float(os.environ.get("INCIDENT_REFRESH_SECONDS", 1))  # /admin/api/incidents staleness
+incident_clusterer = IncidentClusterer(
+    radius_m=INCIDENT_RADIUS_M,
+    window=timedelta(minutes=INCIDENT_WINDOW_MINUTES),
+    active=timedelta(hours=INCIDENT_ACTIVE_HOURS)
+)
+incident_version = None  # incidents version the clusterer reflects; None until (re)loaded
+incident_rowid = 0  # reports up to this rowid are in the clusterer
+incident_writers = 0  # sessions whose assignments have not committed or rolled back yet
+incident_checked = 0.0  # time.monotonic() of the last refresh_incidents() version check
+INCIDENTS_VERSION = select(TableVersion.version).where(TableVersion.table_name == "incidents")
+INCIDENTS_VERSION_BUMP = (
+    sqlite_insert(TableVersion.__table__).values(table_name="incidents", version=1)
+    .on_conflict_do_update(index_elements=["table_name"], set_={"version": TableVersion.version + 1})
+    .returning(TableVersion.version)
+)
+INCIDENT_REPORT_COLUMNS = (REQUEST_ROWID.label("rowid"), EmergencyRequest.request_id, EmergencyRequest.latitude,
+                           EmergencyRequest.longitude, EmergencyRequest.timestamp, EmergencyRequest.type_code,
+                           EmergencyRequest.subtype_code, EmergencyRequest.incident_id)
+
+async def fetch_incident_state(session) -> tuple:
+    """(last rowid, open incidents, recent reports with merges resolved) as saved in the database."""
+    now = datetime.utcnow()
+    last_rowid = (await session.execute(
+        select(func.max(REQUEST_ROWID)).select_from(EmergencyRequest.__table__)
+    )).scalar() or 0
+    saved = (await session.execute(
+        Incident.__table__.select().where(Incident.last_seen >= now - incident_clusterer.active)
+    )).mappings().fetchall()
+    reports = (await session.execute(
+        select(*INCIDENT_REPORT_COLUMNS)
+        .where(EmergencyRequest.type_code.in_(INCIDENT_TYPES),
+               EmergencyRequest.timestamp >= now - incident_clusterer.window)
+        .order_by(EmergencyRequest.timestamp)
+    )).mappings().fetchall()
+    merged_into = {row["incident_id"]: row["merged_into"] for row in saved if row["merged_into"]}
+
+    def resolve(incident_id):
+        while incident_id in merged_into:
+            incident_id = merged_into[incident_id]
+        return incident_id
+
+    return (last_rowid, [row for row in saved if not row["merged_into"]],
+            [dict(row, incident_id=resolve(row["incident_id"])) for row in reports])
+
+async def fetch_incident_changes(session, after_rowid: int) -> tuple:
+    """(last rowid, reports, {incident_id: saved row}) for incident reports committed after after_rowid."""
+    reports = (await session.execute(
+        select(*INCIDENT_REPORT_COLUMNS)
+        .where(REQUEST_ROWID > after_rowid, EmergencyRequest.type_code.in_(INCIDENT_TYPES))
+        .order_by(REQUEST_ROWID)
+    )).mappings().fetchall()
+    if not reports:
+        return after_rowid, [], {}
+    ids = list({row["incident_id"] for row in reports if row["incident_id"]})
+    saved = {}
+    for start in range(0, len(ids), 500):
+        for row in (await session.execute(
+            Incident.__table__.select().where(Incident.incident_id.in_(ids[start:start + 500]))
+        )).mappings():
+            saved[row["incident_id"]] = row
+    return reports[-1]["rowid"], reports, saved
+
+async def save_incidents(session, changed: list, merges: list):
+    if changed:
+        stmt = sqlite_insert(Incident.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["incident_id"],
+            set_={name: stmt.excluded[name] for name in changed[0].to_row() if name != "incident_id"}
+        )
+        await session.execute(stmt, [incident.to_row() for incident in changed])
+    for merged, into in merges:
+        await session.execute(Incident.__table__.update().where(Incident.incident_id == merged).values(merged_into=into))
+        await session.execute(
+            EmergencyRequest.__table__.update().where(EmergencyRequest.incident_id == merged).values(incident_id=into)
+        )
+
+async def load_incidents(session):
+    """Rebuild the clusterer from the database; the caller holds the write lock."""
+    global incident_rowid
+    incident_rowid, saved, reports = await fetch_incident_state(session)
+    unplaced = incident_clusterer.restore(saved, reports)
+    if unplaced:
+        # e.g. requests inserted before incident clustering existed
+        await save_incidents(session, *incident_clusterer.assign(unplaced))
+        await session.execute(
+            EmergencyRequest.__table__.update().where(REQUEST_ROWID == bindparam("rid")).values(incident_id=bindparam("iid")),
+            [{"rid": row["rowid"], "iid": row["incident_id"]} for row in unplaced if row["incident_id"]]
+        )
+
+async def lock_incidents(session):
+    """Take the write lock for clustering and bring the clusterer up to date with the database."""
+    global incident_version, incident_rowid, incident_writers
+    version = (await session.execute(INCIDENTS_VERSION_BUMP)).scalar()
+    if not session.info.get("incidents"):
+        if incident_writers or incident_version is None:
+            # Another session of this worker may have assigned reports it then rolled back
+            await load_incidents(session)
+        elif version != incident_version + 1:
+            incident_rowid, reports, saved = await fetch_incident_changes(session, incident_rowid)
+            incident_clusterer.catch_up(reports, saved)
+        incident_writers += 1
+        session.info["incidents"] = True
+    incident_version = version
+
+async def record_incidents(session, rows: list):
+    """Assign requests about to be inserted to incidents (sets row["incident_id"]) and save the incidents
+    they touch."""
+    if any(row["type_code"] in INCIDENT_TYPES for row in rows):
+        await lock_incidents(session)
+    await save_incidents(session, *incident_clusterer.assign(rows))
+
+@event.listens_for(AsyncSession.sync_session_class, "after_commit")
+def incidents_committed(session):
+    if session.info.get("incidents"):
+        session.info["incidents"] = "committed"
+
+@event.listens_for(AsyncSession.sync_session_class, "after_transaction_end")
+def incidents_released(session, transaction):
+    global incident_version, incident_writers
+    if transaction.parent is None and "incidents" in session.info:
+        incident_writers -= 1
+        if session.info.pop("incidents") != "committed":
+            # The clusterer still holds the rolled back assignments
+            incident_version = None
+
+async def restore_incidents():
+    """Rebuild the clusterer from the database."""
+    global incident_version
+    incident_version = None
+    async with SessionLocal() as session:
+        await lock_incidents(session)
+        await session.commit()
+    logging.info(f"Restored incident clustering: {incident_clusterer.stats()}")
+
+async def refresh_incidents():
+    """Catch up with incidents other workers committed, checking at most every INCIDENT_REFRESH_SECONDS."""
+    global incident_version, incident_rowid, incident_checked
+    seen = incident_version
+    if incident_writers or (seen is not None and time.monotonic() - incident_checked < INCIDENT_REFRESH_SECONDS):
+        # A transaction of this worker holding the write lock catches up itself
+        return
+    incident_checked = time.monotonic()
+    async with ReadSessionLocal() as session:
+        version = (await session.execute(INCIDENTS_VERSION)).scalar()
+        if seen is not None and version == seen:
+            return
+        if seen is None:
+            last_rowid, saved, reports = await fetch_incident_state(session)
+        else:
+            last_rowid, reports, saved = await fetch_incident_changes(session, incident_rowid)
+    if incident_writers or incident_version != seen:
+        # A write got in first; the next read catches up
+        return
+    if seen is None:
+        incident_clusterer.restore(saved, reports)
+    else:
+        incident_clusterer.catch_up(reports, saved)
+    incident_version, incident_rowid = version, last_rowid
+
+# Geofences: responders and units register circles or polygons, optionally
+# limited to some types/subtypes, through /admin/api/geofences. Every inserted
+# request is matched against the in-memory index (geofences.py) and each match
+# is queued in geofence_outbox in the same transaction, so an alert exists
+# exactly when its request does. A task in each worker claims due outbox rows,
+# hands them to the delivery channel (a logging stub) and retries failures
+# with doubling delays up to OUTBOX_MAX_ATTEMPTS. Geofence changes made through
+# another worker are picked up within GEOFENCE_RELOAD_SECONDS.
+GEOFENCE_RELOAD_SECONDS = float(os.environ.get("GEOFENCE_RELOAD_SECONDS", 5))
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", 500))
+OUTBOX_POLL_SECONDS = float(os.environ.get("OUTBOX_POLL_SECONDS", 2))
+# Matches committed within this long of each other are claimed together,
+# which keeps the outbox's own commits from competing with every submit
+OUTBOX_BATCH_DELAY_MS = int(os.environ.get("OUTBOX_BATCH_DELAY_MS", 50))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 5))
+OUTBOX_RETRY_SECONDS = float(os.environ.get("OUTBOX_RETRY_SECONDS", 10))
+OUTBOX_CLAIM_SECONDS = float(os.environ.get("OUTBOX_CLAIM_SECONDS", 60))  # before an unfinished delivery is retried
+GEOFENCES_VERSION = select(TableVersion.version).where(TableVersion.table_name == "geofences")
+GEOFENCE_COLUMNS = (Geofence.geofence_id, Geofence.name, Geofence.subscriber, Geofence.geometry, Geofence.min_lat,
+                    Geofence.min_lon, Geofence.max_lat, Geofence.max_lon, Geofence.cells, Geofence.type_codes,
+                    Geofence.subtype_codes)
+geofence_index = geofences.GeofenceIndex()
+geofence_version = None
+geofence_delivery = geofences.LogDelivery()
+geofence_watch_task = None
+outbox_task = None
+outbox_wakeup = None
+geofence_matches_total = metrics_registry.counter("geofence_matches_total", "Outbox messages queued for geofence matches.")
+outbox_deliveries_total = metrics_registry.counter("outbox_deliveries_total", "Outbox delivery attempts, by outcome.",
+                                                   ("outcome",))
+
+def build_geofence_index(kept: list, rows) -> geofences.GeofenceIndex:
+    """A new index with the kept (geofence, cells) entries and the geofences in rows."""
+    index = geofences.GeofenceIndex()
+    for geofence, cells in kept:
+        index.add(geofence, cells)
+    for row in rows:
+        index.add(geofences.Geofence.from_row(row), row.cells.split())
+    return index
+
+async def load_geofences():
+    """Bring the geofence index up to date if any geofence changed since it was last loaded.
+
+    Geofences are only ever added or deactivated, so this compares the active
+    ids with the index and parses only the new geofences. Larger changes are
+    built into a new index off the event loop and swapped in.
+    """
+    global geofence_index, geofence_version
+    loaded = geofence_index.geofences
+    async with SessionLocal() as session:
+        # Version first: a change committed in between only causes one more reload
+        version = (await session.execute(GEOFENCES_VERSION)).scalar()
+        if version == geofence_version:
+            return
+        active = set((await session.execute(select(Geofence.geofence_id).where(Geofence.active == 1))).scalars())
+        new_ids = [geofence_id for geofence_id in active if geofence_id not in loaded]
+        if len(new_ids) > 5000:
+            # e.g. at startup: one scan beats many IN lists
+            rows = [row for row in (await session.execute(select(*GEOFENCE_COLUMNS).where(Geofence.active == 1)))
+                    if row.geofence_id not in loaded]
+        else:
+            rows = []
+            for i in range(0, len(new_ids), 500):
+                rows += (await session.execute(
+                    select(*GEOFENCE_COLUMNS).where(Geofence.geofence_id.in_(new_ids[i:i + 500]))
+                )).fetchall()
+    removed = [geofence_id for geofence_id in loaded if geofence_id not in active]
+    started = time.perf_counter()
+    if len(rows) + len(removed) <= 100:
+        # A few changes: apply them in place, which takes well under a millisecond each
+        for geofence_id in removed:
+            geofence_index.remove(geofence_id)
+        for row in rows:
+            geofence_index.add(geofences.Geofence.from_row(row), row.cells.split())
+    else:
+        kept = [entry for geofence_id, entry in loaded.items() if geofence_id in active]
+        index = await asyncio.to_thread(build_geofence_index, kept, rows)
+        index.candidates, index.matches = geofence_index.candidates, geofence_index.matches
+        geofence_index = index
+    geofence_version = version
+    logging.info(f"Loaded {len(geofence_index)} geofences ({len(rows)} new, {len(removed)} removed) "
+                 f"in {time.perf_counter() - started:.2f}s")
+
+async def watch_geofences():
+    while True:
+        await asyncio.sleep(GEOFENCE_RELOAD_SECONDS)
+        try:
+            await load_geofences()
+        except Exception:
+            logging.exception("Reloading geofences failed")
+
+def geofence_payload(row: dict, geofence) -> dict:
+    return {
+        "request_id": row["request_id"],
+        "geofence_id": geofence.geofence_id,
+        "geofence_name": geofence.name,
+        "type_code": row["type_code"],
+        "subtype_code": row["subtype_code"],
+        "latitude": row["latitude"],
+        "longitude": row["longitude"],
+        "details": row["details"],
+        "timestamp": row["timestamp"].isoformat()
+    }
+
+async def record_geofence_matches(session, rows: list):
+    """Queue an outbox message for every active geofence each new request falls in."""
+    index = geofence_index
+    if not len(index):
+        return
+    now = datetime.utcnow()
+    messages = [{
+        "geofence_id": geofence.geofence_id,
+        "subscriber": geofence.subscriber,
+        "request_id": row["request_id"],
+        "payload": json.dumps(geofence_payload(row, geofence)),
+        "status": "pending",
+        "attempts": 0,
+        "available_at": now,
+        "created_at": now
+    } for row in rows for geofence in index.match(row["latitude"], row["longitude"], row["type_code"],
+                                                  row["subtype_code"], row["geohash"])]
+    if messages:
+        await session.execute(GeofenceOutbox.__table__.insert(), messages)
+        geofence_matches_total.inc(amount=len(messages))
+        session.info["outbox"] = True
+
+@event.listens_for(AsyncSession.sync_session_class, "after_commit")
+def wake_outbox(session):
+    # Deliver as soon as the matches are committed rather than at the next poll
+    if session.info.pop("outbox", False) and outbox_wakeup is not None:
+        outbox_wakeup.set()
+
+def outbox_due(now: datetime):
+    return and_(GeofenceOutbox.status.in_(("pending", "sending")), GeofenceOutbox.available_at <= now)
+
+async def settle_and_claim_outbox(outcomes: Optional[dict], limit: int) -> list:
+    """Record how the last batch went and claim up to limit due outbox rows, in one write transaction.
+
+    A worker that stops in between leaves its claimed rows to be retried
+    after OUTBOX_CLAIM_SECONDS, so delivery is at least once.
+    """
+    now = datetime.utcnow()
+    table = GeofenceOutbox.__table__
+    async with SessionLocal() as session:
+        if outcomes and outcomes["delivered"]:
+            await session.execute(
+                table.update().where(table.c.outbox_id == bindparam("oid")).values(status="delivered", delivered_at=now),
+                outcomes["delivered"]
+            )
+        if outcomes and outcomes["retries"]:
+            await session.execute(
+                table.update().where(table.c.outbox_id == bindparam("oid"))
+                .values(status=bindparam("outcome"), available_at=bindparam("retry_at"), last_error=bindparam("error")),
+                outcomes["retries"]
+            )
+        claimed = []
+        # A plain read first, so idle polls never take the write lock
+        if (await session.execute(select(table.c.outbox_id).where(outbox_due(now)).limit(1))).first() is not None:
+            due = select(table.c.outbox_id).where(outbox_due(now)).order_by(table.c.outbox_id).limit(limit)
+            result = await session.execute(
+                table.update().where(table.c.outbox_id.in_(due))
+                .values(status="sending", attempts=table.c.attempts + 1,
+                        available_at=now + timedelta(seconds=OUTBOX_CLAIM_SECONDS))
+                .returning(table.c.outbox_id, table.c.subscriber, table.c.payload, table.c.attempts)
+            )
+            claimed = result.fetchall()
+        await session.commit()
+    return claimed
+
+async def deliver_outbox_batch(claimed: list) -> dict:
+    """Hand claimed rows to the delivery channel; returns their outcomes for settle_and_claim_outbox."""
+    messages = [{"outbox_id": row.outbox_id, "subscriber": row.subscriber, "payload": json.loads(row.payload)}
+                for row in claimed]
+    try:
+        errors = await geofence_delivery.send(messages)
+    except Exception as e:
+        logging.exception("Geofence delivery failed")
+        errors = [f"{type(e).__name__}: {e}"] * len(messages)
+    now = datetime.utcnow()
+    outcomes = {"delivered": [], "retries": []}
+    for row, error in zip(claimed, errors):
+        if error is None:
+            outcomes["delivered"].append({"oid": row.outbox_id})
+            continue
+        outcome = "failed" if row.attempts >= OUTBOX_MAX_ATTEMPTS else "pending"
+        outcomes["retries"].append({
+            "oid": row.outbox_id,
+            "outcome": outcome,
+            "retry_at": now + timedelta(seconds=OUTBOX_RETRY_SECONDS * 2 ** (row.attempts - 1)),
+            "error": str(error)[:500]
+        })
+        outbox_deliveries_total.inc("failed" if outcome == "failed" else "retry")
+    if outcomes["delivered"]:
+        outbox_deliveries_total.inc("delivered", amount=len(outcomes["delivered"]))
+    return outcomes
+
+async def deliver_outbox():
+    outcomes = None
+    while True:
+        if outcomes is None:
+            try:
+                await asyncio.wait_for(outbox_wakeup.wait(), OUTBOX_POLL_SECONDS)
+                await asyncio.sleep(OUTBOX_BATCH_DELAY_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            outbox_wakeup.clear()
+        try:
+            claimed = await settle_and_claim_outbox(outcomes, OUTBOX_BATCH_SIZE)
+            outcomes = await deliver_outbox_batch(claimed) if claimed else None
+        except Exception:
+            logging.exception("Geofence outbox delivery failed")
+            outcomes = None
+
+async def insert_requests(session, rows: list) -> list:
+    """Insert emergency requests (dicts of column values), cluster them into incidents, queue geofence
+    alerts and bump their rollups.
+
+    Returns the new rowids, which order requests by commit and back the
+    live feed's delta cursors.
+    """
+    await record_incidents(session, rows)
+    result = await session.execute(
+        EmergencyRequest.__table__.insert().returning(literal_column("rowid"), sort_by_parameter_order=True),
+        rows
+    )
+    rowids = result.scalars().all()
+    await record_geofence_matches(session, rows)
+    await increment_rollups(session, [
+        rollup_key(r["timestamp"], r["type_code"], r["subtype_code"], r["geohash"]) for r in rows
+    ])
+    return rowids
+
+# Live feed of committed requests for connected admin dashboards. Requests
+# this worker commits are published as soon as they commit. Those committed
+# by the other workers (serve.py --workers) are picked up by a poll every
+# FEED_POLL_SECONDS: one rowid range query while a dashboard is connected,
+# and a max(rowid) lookup otherwise, so the poll knows where to start.
+FEED_QUEUE_SIZE = int(os.environ.get("FEED_QUEUE_SIZE", 1000))
+FEED_POLL_SECONDS = float(os.environ.get("FEED_POLL_SECONDS", 1))
+FEED_POLL_LIMIT = int(os.environ.get("FEED_POLL_LIMIT", 1000))
+request_feed = Broadcaster(max_queue=FEED_QUEUE_SIZE)
+feed_rowid = None  # every request up to this rowid has been published (or had no subscriber)
+feed_published = set()  # rowids above feed_rowid this worker already published itself
+feed_watch_task = None
+
+def feed_event(item: dict, rowid: int) -> dict:
+    return {"rowid": rowid, "type_code": item["type_code"], "subtype_code": item["subtype_code"], "data": json.dumps(item)}
+
+def publish_requests(rows: list, rowids: list):
+    """Push committed requests to live subscribers, serialized once for all of them."""
+    if not request_feed.subscribers:
+        return
+    events = []
+    for row, rowid in zip(rows, rowids):
+        # The poll may have seen the commit first
+        if feed_rowid is not None and rowid <= feed_rowid:
+            continue
+        feed_published.add(rowid)
+        events.append(feed_event(dict(request_to_dict(SimpleNamespace(**row)), cursor=encode_cursor(rowid)), rowid))
+    request_feed.publish(events)
+
+async def poll_feed():
+    """Publish requests committed by other workers since the last poll."""
+    global feed_rowid
+    async with ReadSessionLocal() as session:
+        if feed_rowid is None or not request_feed.subscribers:
+            feed_rowid = (await session.execute(select(func.max(REQUEST_ROWID)).select_from(EmergencyRequest.__table__))).scalar() or 0
+            feed_published.clear()
+            return
+        rows = (await session.execute(
+            EmergencyRequest.__table__.select().add_columns(REQUEST_ROWID.label("rowid"))
+            .where(REQUEST_ROWID > feed_rowid).order_by(REQUEST_ROWID).limit(FEED_POLL_LIMIT)
+        )).fetchall()
+    if not rows:
+        return
+    request_feed.publish([feed_event(item, row.rowid) for item, row in zip(delta_dicts(rows), rows)
+                          if row.rowid not in feed_published])
+    feed_rowid = rows[-1].rowid
+    feed_published.difference_update([rowid for rowid in feed_published if rowid <= feed_rowid])
+
+async def watch_feed():
+    while True:
+        try:
+            await poll_feed()
+        except Exception:
+            logging.exception("Polling the live feed failed")
+        await asyncio.sleep(FEED_POLL_SECONDS)
+
+# Write-behind mode: /submit requests are queued and committed in batches by a
+# single writer task, trading up to SUBMIT_BATCH_DELAY_MS of latency for one
+# fsync per batch instead of one per SOS.
+WRITE_BEHIND = os.environ.get("WRITE_BEHIND", "0") == "1"
+SUBMIT_BATCH_SIZE = int(os.environ.get("SUBMIT_BATCH_SIZE", 256))
+SUBMIT_BATCH_DELAY_MS = int(os.environ.get("SUBMIT_BATCH_DELAY_MS", 20))
+
+async def flush_requests(rows: list) -> list:
+    async with SessionLocal() as session:
+        rowids = await insert_requests(session, rows)
+        await session.commit()
+    publish_requests(rows, rowids)
+    return [r["request_id"] for r in rows]
+
+submit_writer = GroupCommitWriter(
+    flush_requests,
+    max_batch=SUBMIT_BATCH_SIZE,
+    max_delay=SUBMIT_BATCH_DELAY_MS / 1000
+) if WRITE_BEHIND else None
+
+async def prepare_database():
+    """Create the schema on a fresh database, or check that an existing one is fully migrated."""
+    os.makedirs(DATA_DIR, exist_ok=True)
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        version = await conn.run_sync(migrations.schema_version)
+        if version is None:
+            logging.info(f"Creating the schema (v{migrations.LATEST_VERSION}) in {DB_PATH}")
+            await conn.run_sync(migrations.create_schema)
+        elif version < migrations.LATEST_VERSION:
+            raise RuntimeError(f"{DB_PATH} is at schema v{version} but this code needs "
+                               f"v{migrations.LATEST_VERSION}; run `python migrations.py` first.")
 
-# Static and templates
-if not os.path.exists("static"):
-    os.mkdir("static")
-if not os.path.exists("templates"):
-    os.mkdir("templates")
-app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
+async def startup():
+    global facility_watch_task, geofence_watch_task, outbox_task, outbox_wakeup, feed_watch_task, feed_rowid
+    await prepare_database()
+    await reload_catalog()
+    await restore_incidents()
+    await load_geofences()
+    if SUBMIT_THROTTLE == "memory":
+        async with SessionLocal() as session:
+            await submit_throttle.rebuild(session)
+    await crypto.start()
+    if submit_writer:
+        await submit_writer.start()
+    await asyncio.to_thread(facility_directory.check)
+    facility_watch_task = asyncio.create_task(watch_facilities())
+    geofence_watch_task = asyncio.create_task(watch_geofences())
+    # Set, so anything left pending by the last run is delivered right away
+    outbox_wakeup = asyncio.Event()
+    outbox_wakeup.set()
+    outbox_task = asyncio.create_task(deliver_outbox())
+    feed_rowid = None
+    feed_watch_task = asyncio.create_task(watch_feed())
+
+async def shutdown():
+    if key_rotation_task and not key_rotation_task.done():
+        key_rotation_task.cancel()
+    for task in (facility_watch_task, geofence_watch_task, outbox_task, feed_watch_task):
+        if task:
+            task.cancel()
+    if submit_writer:
+        await submit_writer.stop()
+    await crypto.stop()
+
+@asynccontextmanager
+async def lifespan(app):
+    await startup()
+    yield
+    await shutdown()
+
+# Static files and templates live next to this file, whatever the working directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
+
+@lru_cache(maxsize=None)
+def templates():
+    # Jinja is only needed by the two HTML pages, so it is imported on first use
+    from fastapi.templating import Jinja2Templates
+    return Jinja2Templates(directory=TEMPLATES_DIR)
 
 security = HTTPBasic()
 ADMIN_USERNAME = os.environ.get("ADMIN_USERNAME", "admin")
 ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "changeme123")
+SESSION_SECRET_KEY = os.environ.get("SESSION_SECRET_KEY", "supersecret")
 
-app.add_middleware(SessionMiddleware, secret_key=os.environ.get("SESSION_SECRET_KEY", "supersecret"))
-
-@app.get("/", response_class=HTMLResponse)
+@router.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     phone = request.session.get("phone")
-    return templates.TemplateResponse("index.html", {"request": request, "authenticated": bool(phone), "phone": phone})
+    return templates().TemplateResponse("index.html", {"request": request, "authenticated": bool(phone), "phone": phone})
 
-@app.post("/submit", response_class=HTMLResponse)
+@router.post("/submit", response_class=HTMLResponse)
 async def submit(request: Request,
     type_code: str = Form(...),
     subtype_code: str = Form(None),
@@ -153,50 +936,58 @@ async def submit(request: Request,
     user_id = request.session.get("user_id")
     if not phone or not user_id:
         return JSONResponse({"success": False, "message": "Not authenticated."}, status_code=401)
+    # Call helpline and Find medical services carry no subtype
+    if type_code in ("HELPLINE", "MEDICAL"):
+        subtype_code = None
+    if not catalog.is_valid(type_code, subtype_code):
+        return JSONResponse({"success": False, "message": "Unknown request type or subtype."}, status_code=400)
     # Find user and get name
-    async with SessionLocal() as session:
-        result = await session.execute(User.__table__.select().where(User.user_id == user_id))
-        user = result.fetchone()
-        if not user or not user.name:
-            return JSONResponse({"success": False, "message": "Profile incomplete."}, status_code=400)
-        # Rate limit: 3 requests/hour except for 'MEDICAL'
-        if type_code != "MEDICAL":
-            now = datetime.utcnow()
-            one_hour_ago = now - timedelta(hours=1)
-            count_result = await session.execute(
-                EmergencyRequest.__table__.select()
-                .where(EmergencyRequest.user_id == user_id)
-                .where(EmergencyRequest.timestamp >= one_hour_ago)
-            )
-            recent_requests = count_result.fetchall()
-            if len(recent_requests) >= 3:
-                return JSONResponse({"success": False, "message": "Request limit reached: Only 3 requests allowed per hour."}, status_code=429)
-        encrypted_name = fernet.encrypt(user.name.encode()).decode()
-        # For Call helpline, log minimal entry
-        if type_code == "HELPLINE":
-            emergency = EmergencyRequest(user_id=user_id, name=encrypted_name, latitude=latitude, longitude=longitude, type_code=type_code, subtype_code=None, details=None)
-            session.add(emergency)
-            await session.commit()
-            return JSONResponse({"success": True, "message": "Your request to call the helpline has been logged."})
-        # For Find medical services
-        if type_code == "MEDICAL":
-            emergency = EmergencyRequest(user_id=user_id, name=encrypted_name, latitude=latitude, longitude=longitude, type_code=type_code, subtype_code=None, details=None)
-            session.add(emergency)
-            await session.commit()
-            return JSONResponse({"success": True, "message": "We are connecting you to the nearest medical services. (This is a mock confirmation.)"})
-        # For Report attack or Report injury/casualty
-        emergency = EmergencyRequest(
-            user_id=user_id,
-            name=encrypted_name,
-            latitude=latitude,
-            longitude=longitude,
-            type_code=type_code,
-            subtype_code=subtype_code,
-            details=details
-        )
-        session.add(emergency)
-        await session.commit()
-        return JSONResponse({"success": True, "message": "Your request has been received."})
+    user = await get_user_profile(user_id)
+    if not user or not user["name"]:
+        return JSONResponse({"success": False, "message": "Profile incomplete."}, status_code=400)
+    # Rate limit: 3 requests/hour except for 'MEDICAL'
+    now = datetime.utcnow()
+    if not await throttle_allows(user_id, type_code, now):
+        return JSONResponse({"success": False, "message": "Request limit reached: Only 3 requests allowed per hour."}, status_code=429)
+    # For Call helpline and Find medical services, log minimal entry
+    if type_code in ("HELPLINE", "MEDICAL"):
+        details = None
+    # Anything failing from here on hands the throttle slot back
+    try:
+        values = {
+            "request_id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "name": await crypto.encrypt(user["name"]),
+            "latitude": latitude,
+            "longitude": longitude,
+            "type_code": type_code,
+            "subtype_code": subtype_code,
+            "details": details,
+            "timestamp": now,
+            "geohash": geohash.encode(latitude, longitude)
+        }
+        if submit_writer:
+            # Resolves once the batch holding this request is committed
+            await submit_writer.submit(values)
+        else:
+            async with SessionLocal() as session:
+                rowids = await insert_requests(session, [values])
+                await session.commit()
+            publish_requests([values], rowids)
+    except Exception:
+        if SUBMIT_THROTTLE == "memory":
+            submit_throttle.release(user_id, now)
+        raise
+    if type_code == "HELPLINE":
+        return JSONResponse({"success": True, "message": "Your request to call the helpline has been logged."})
+    # For Find medical services
+    if type_code == "MEDICAL":
+        facilities = nearest_facilities(latitude, longitude)
+        if facilities:
+            return JSONResponse({"success": True, "message": "Your request has been logged. These are the nearest medical services.", "facilities": facilities})
+        return JSONResponse({"success": True, "message": "We are connecting you to the nearest medical services. (This is a mock confirmation.)"})
+    # For Report attack or Report injury/casualty
+    return JSONResponse({"success": True, "message": "Your request has been received."})
 
 def verify_admin(credentials: HTTPBasicCredentials = Depends(security)):
     correct_username = secrets.compare_digest(credentials.username, ADMIN_USERNAME)
@@ -210,56 +1001,19 @@ def verify_admin(credentials: HTTPBasicCredentials = Depends(security)):
         )
     return True
 
-@app.get("/supersecretadmin", response_class=HTMLResponse)
+@router.get("/supersecretadmin", response_class=HTMLResponse)
 async def admin_view(request: Request, authorized: bool = Depends(verify_admin)):
     check_rate_limit(request.client.host)
     check_ip_whitelist(request)
-    async with SessionLocal() as session:
-        result = await session.execute(
-            EmergencyRequest.__table__.select().order_by(EmergencyRequest.timestamp.desc())
-        )
-        requests = result.fetchall()
-        decrypted_requests = []
-        # Mapping dicts for display
-        TYPE_CODES = {
-            "ATTACK": "Report attack",
-            "INJURY": "Report injury/casualty",
-            "MEDICAL": "Find medical services",
-            "HELPLINE": "Call helpline"
-        }
-        SUBTYPE_CODES = {
-            "BULLETS": "Bullets",
-            "DRONES": "Enemy drones",
-            "ARTILLERY": "Heavy artillery / Bomblasts / Missiles",
-            "LIFE_THREAT": "Life threatening injury",
-            "DEATH": "Death",
-            "MINOR": "Minor injuries"
-        }
-        for row in requests:
-            decrypted_name = fernet.decrypt(row.name.encode()).decode()
-            formatted_ts = row.timestamp.strftime('%d %b %Y, %I:%M %p') if row.timestamp else ''
-            decrypted_requests.append({
-                "id": row.request_id,
-                "name": decrypted_name,
-                "latitude": row.latitude,
-                "longitude": row.longitude,
-                "type_code": row.type_code,
-                "type_name": TYPE_CODES.get(row.type_code, row.type_code),
-                "subtype_code": row.subtype_code,
-                "subtype_name": SUBTYPE_CODES.get(row.subtype_code, row.subtype_code) if row.subtype_code else None,
-                "details": row.details,
-                "timestamp": formatted_ts
-            })
+    # Only the page shell: its tables, map and feed load through the admin APIs,
+    # so the page costs the same however many requests are stored
     maptiler_key = os.environ.get("MAPTILER_API_KEY", "")
-    return templates.TemplateResponse(
-        "admin.html",
-        {"request": request, "requests": decrypted_requests, "maptiler_key": maptiler_key}
-    )
+    return templates().TemplateResponse("admin.html", {"request": request, "maptiler_key": maptiler_key})
 
 def is_valid_indian_mobile(number: str) -> bool:
     return re.fullmatch(r"[6-9]\d{9}", number) is not None
 
-@app.post("/login")
+@router.post("/login")
 async def login(request: Request, phone: str = Form(...), name: str = Form(None), surname: str = Form(None)):
     if not is_valid_indian_mobile(phone):
         return JSONResponse({"success": False, "message": "Invalid Indian mobile number."}, status_code=400)
@@ -273,6 +1027,9 @@ async def login(request: Request, phone: str = Form(...), name: str = Form(None)
             if name and (not user.name or user.name != name or (surname and user.surname != surname)):
                 await session.execute(User.__table__.update().where(User.user_id == user_id).values(name=name, surname=surname))
                 await session.commit()
+                user_cache.set(user_id, {"user_id": user_id, "phone": phone, "name": name, "surname": surname})
+            else:
+                user_cache.set(user_id, user_profile(user))
         else:
             if not name:
                 return JSONResponse({"success": False, "message": "Name is required for new users."}, status_code=400)
@@ -281,107 +1038,759 @@ async def login(request: Request, phone: str = Form(...), name: str = Form(None)
             await session.commit()
             await session.refresh(new_user)
             user_id = new_user.user_id
+            user_cache.set(user_id, user_profile(new_user))
     request.session["phone"] = phone
     request.session["user_id"] = user_id
     return JSONResponse({"success": True, "message": "Authenticated."})
 
-@app.post("/logout")
+@router.post("/logout")
 async def logout(request: Request):
     request.session.pop("phone", None)
     return JSONResponse({"success": True, "message": "Logged out."})
 
-@app.get("/auth-status")
+@router.get("/auth-status")
 async def auth_status(request: Request):
     phone = request.session.get("phone")
     user_id = request.session.get("user_id")
     name = None
     surname = None
     if user_id:
-        async with SessionLocal() as session:
-            result = await session.execute(User.__table__.select().where(User.user_id == user_id))
-            user = result.fetchone()
-            if user:
-                name = user.name
-                surname = user.surname
+        user = await get_user_profile(user_id)
+        if user:
+            name = user["name"]
+            surname = user["surname"]
     return JSONResponse({"authenticated": bool(phone), "phone": phone, "name": name, "surname": surname})
 
-@app.get("/admin/api/requests")
+API_PAGE_SIZE = int(os.environ.get("API_PAGE_SIZE", 1000))
+API_MAX_PAGE_SIZE = int(os.environ.get("API_MAX_PAGE_SIZE", 5000))
+NDJSON_CHUNK_ROWS = 500
+
+# Admin API responses carry a weak ETag built from the version of the data
+# behind them (rowid high-water mark, table_versions, catalog version), so a
+# dashboard poll that finds nothing new costs one tiny query and a 304.
+# Bodies of at least RESPONSE_COMPRESS_MIN_BYTES are sent brotli- or
+# gzip-compressed, as the client prefers.
+RESPONSE_COMPRESS_MIN_BYTES = int(os.environ.get("RESPONSE_COMPRESS_MIN_BYTES", 1024))
+RESPONSE_GZIP_LEVEL = int(os.environ.get("RESPONSE_GZIP_LEVEL", 4))
+API_CACHE_HEADERS = {"Cache-Control": "private, no-cache"}
+api_responses = responses.ConditionalJSON(min_size=RESPONSE_COMPRESS_MIN_BYTES, gzip_level=RESPONSE_GZIP_LEVEL)
+
+def parse_dt(val):
+    if not val:
+        return None
+    try:
+        return datetime.strptime(val, "%Y-%m-%dT%H:%M")
+    except Exception as e:
+        logging.warning(f"Invalid date filter value: {val} ({e})")
+        return None
+
+def encode_cursor(*parts) -> str:
+    raw = "|".join(p.isoformat() if isinstance(p, datetime) else str(p) for p in parts)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> Optional[list]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    parts = raw.split("|", size - 1)
+    if len(parts) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    return parts
+
+def filter_requests(q, type_code=None, subtype_code=None, start_dt=None, end_dt=None, search_text=None):
+    if type_code:
+        q = q.where(EmergencyRequest.type_code == type_code)
+    if subtype_code:
+        q = q.where(EmergencyRequest.subtype_code == subtype_code)
+    if start_dt:
+        q = q.where(EmergencyRequest.timestamp >= start_dt)
+    if end_dt:
+        q = q.where(EmergencyRequest.timestamp <= end_dt)
+    if search_text:
+        # Full-text match on details through the FTS5 index (live requests only).
+        # Text without any searchable word (e.g. "!!!") matches nothing.
+        rowids = search.matching_rowids(search_text)
+        q = q.where(REQUEST_ROWID.in_(rowids)) if rowids is not None else q.where(false())
+    return q
+
+def requests_page_query(q, cursor: Optional[str]):
+    """Newest first, keyset-paginated on (timestamp, request_id)."""
+    if cursor:
+        ts, request_id = cursor_position(cursor)
+        q = q.where(or_(
+            EmergencyRequest.timestamp < ts,
+            and_(EmergencyRequest.timestamp == ts, EmergencyRequest.request_id < request_id)
+        ))
+    return q.order_by(EmergencyRequest.timestamp.desc(), EmergencyRequest.request_id.desc())
+
+def cursor_position(cursor: Optional[str]) -> Optional[tuple]:
+    if not cursor:
+        return None
+    ts, request_id = decode_cursor(cursor, 2)
+    try:
+        return datetime.fromisoformat(ts), request_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+async def archive_parts_for(start_dt=None, end_dt=None, before=None) -> list:
+    """Archived parts whose time range can hold matching requests (partition pruning)."""
+    q = select(ArchivePart.path, ArchivePart.min_timestamp, ArchivePart.max_timestamp)
+    if start_dt:
+        q = q.where(ArchivePart.max_timestamp >= start_dt)
+    if end_dt:
+        q = q.where(ArchivePart.min_timestamp <= end_dt)
+    if before:
+        q = q.where(ArchivePart.min_timestamp <= before[0])
+    async with ReadSessionLocal() as session:
+        rows = (await session.execute(q)).fetchall()
+    return [(os.path.join(ARCHIVE_DIR, path), min_ts, max_ts) for path, min_ts, max_ts in rows]
+
+async def requests_page(type_code, subtype_code, start_dt, end_dt, cursor: Optional[str], limit: int,
+                        search_text: Optional[str] = None) -> list:
+    """One newest-first page across the live table and the archive (live only when searching)."""
+    q = filter_requests(EmergencyRequest.__table__.select(), type_code, subtype_code, start_dt, end_dt, search_text)
+    async with ReadSessionLocal() as session:
+        rows = (await session.execute(requests_page_query(q, cursor).limit(limit))).fetchall()
+    if search_text:
+        return rows
+    before = cursor_position(cursor)
+    parts = await archive_parts_for(start_dt, end_dt, before)
+    if len(rows) == limit:
+        # Parts entirely older than a full live page cannot contribute
+        parts = [part for part in parts if part[2] >= rows[-1].timestamp]
+    if not parts:
+        return rows
+    cold = await asyncio.to_thread(
+        archive.read_requests, parts, type_code, subtype_code, start_dt, end_dt, before, limit
+    )
+    merged = list(rows) + [SimpleNamespace(**row) for row in cold]
+    merged.sort(key=lambda row: (row.timestamp, row.request_id), reverse=True)
+    return merged[:limit]
+
+def page_limit(limit: Optional[int]) -> int:
+    return min(limit or API_PAGE_SIZE, API_MAX_PAGE_SIZE)
+
+# Versions of the data behind the admin APIs, for their ETags. Archiving
+# deletes live rows but always adds archive parts; a VACUUM renumbering the
+# rowids changes the lowest one.
+REQUESTS_VERSION = select(
+    select(func.min(REQUEST_ROWID)).select_from(EmergencyRequest.__table__).scalar_subquery(),
+    select(func.max(REQUEST_ROWID)).select_from(EmergencyRequest.__table__).scalar_subquery(),
+    select(func.count()).select_from(ArchivePart.__table__).scalar_subquery()
+)
+USERS_VERSION = select(TableVersion.version).where(TableVersion.table_name == "users")
+
+async def data_version(q) -> tuple:
+    async with ReadSessionLocal() as session:
+        return tuple((await session.execute(q)).one())
+
+REQUEST_FIELDS = ("request_id", "user_id", "latitude", "longitude", "type_code", "subtype_code", "details", "timestamp")
+USER_FIELDS = ("user_id", "phone", "name")
+
+def row_values(rows, fields: tuple):
+    """Each row's values for fields, as a tuple.
+
+    Attribute access on a SQLAlchemy Row costs about a microsecond per field,
+    so Rows are read by position, looked up once per batch. Other rows
+    (archived requests, freshly inserted ones) are read by attribute.
+    """
+    by_attribute = attrgetter(*fields)
+    by_position = None
+    for row in rows:
+        if isinstance(row, Row):
+            if by_position is None:
+                by_position = itemgetter(*map(row._fields.index, fields))
+            yield by_position(row)
+        else:
+            yield by_attribute(row)
+
+def request_dicts(rows, cursors: bool = False) -> list:
+    """Requests as API dicts, with delta cursors if cursors is set (rows then need a rowid column).
+
+    Timestamps are ISO 8601 (UTC); the dashboard formats them for display.
+    """
+    type_name, subtype_name = catalog.type_name, catalog.subtype_name
+    fields = REQUEST_FIELDS + ("rowid",) if cursors else REQUEST_FIELDS
+    data = []
+    for request_id, user_id, latitude, longitude, type_code, subtype_code, details, timestamp, *rowid in row_values(rows, fields):
+        item = {
+            "request_id": request_id,
+            "user_id": user_id,
+            "latitude": latitude,
+            "longitude": longitude,
+            "type_code": type_code,
+            "type_name": type_name(type_code),
+            "subtype_code": subtype_code,
+            "subtype_name": subtype_name(subtype_code),
+            "details": details,
+            "timestamp": timestamp.isoformat() if timestamp else None
+        }
+        if cursors:
+            item["cursor"] = encode_cursor(rowid[0])
+        data.append(item)
+    return data
+
+def request_to_dict(row) -> dict:
+    return request_dicts([row])[0]
+
+def delta_dicts(rows) -> list:
+    return request_dicts(rows, cursors=True)
+
+def user_dicts(rows) -> list:
+    return [{"user_id": user_id, "phone": phone, "name": name} for user_id, phone, name in row_values(rows, USER_FIELDS)]
+
+async def read_lease(gate: readpool.ReadGate = None) -> readpool.ReadLease:
+    """A slot from gate (the admin read slots by default); 503 if none frees up in time."""
+    lease = await (gate or read_gate).lease()
+    if lease is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Too many reports are being run; try again shortly.", headers={"Retry-After": "5"})
+    return lease
+
+@asynccontextmanager
+async def read_slot():
+    """Hold a read slot for the block; statements past READ_QUERY_TIMEOUT become a 504."""
+    lease = await read_lease()
+    try:
+        yield
+    except OperationalError as e:
+        if not readpool.is_interrupted(e):
+            raise
+        read_gate.interrupted += 1
+        logging.warning(f"Read query interrupted after {READ_QUERY_TIMEOUT}s")
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                            detail="The query took too long; narrow the filters and try again.")
+    finally:
+        lease.release()
+
+def streaming_read(body, lease: readpool.ReadLease, **kwargs) -> StreamingResponse:
+    """Stream body while holding lease, released when the stream ends or the client goes away."""
+    async def guarded():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            lease.release()
+    return StreamingResponse(guarded(), background=BackgroundTask(lease.release), **kwargs)
+
+def ndjson_response(q, to_dicts, lease: readpool.ReadLease):
+    """Stream rows as NDJSON straight off the DB cursor."""
+    async def rows():
+        async with ReadSessionLocal() as session:
+            result = await session.stream(q.execution_options(read_timeout=None))
+            async for partition in result.partitions(NDJSON_CHUNK_ROWS):
+                yield b"".join(responses.dumps(item) + b"\n" for item in to_dicts(partition))
+    return streaming_read(rows(), lease, media_type="application/x-ndjson")
+
+def archived_ndjson_response(type_code, subtype_code, start_dt, end_dt, cursor, limit, lease: readpool.ReadLease):
+    """NDJSON over live and archived requests, merged page by page in order."""
+    async def rows():
+        page_cursor, sent = cursor, 0
+        while limit is None or sent < limit:
+            size = NDJSON_CHUNK_ROWS if limit is None else min(NDJSON_CHUNK_ROWS, limit - sent)
+            page = await requests_page(type_code, subtype_code, start_dt, end_dt, page_cursor, size)
+            if not page:
+                break
+            yield b"".join(responses.dumps(item) + b"\n" for item in request_dicts(page))
+            sent += len(page)
+            if len(page) < size:
+                break
+            page_cursor = encode_cursor(page[-1].timestamp, page[-1].request_id)
+    return streaming_read(rows(), lease, media_type="application/x-ndjson")
+
+def requests_since_query(q, since: str):
+    """Requests committed after a delta cursor, oldest first."""
+    (rowid,) = decode_cursor(since, 1)
+    if not rowid.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    return q.add_columns(REQUEST_ROWID.label("rowid")).where(REQUEST_ROWID > int(rowid)).order_by(REQUEST_ROWID)
+
+@router.get("/admin/api/requests")
 async def api_requests(
+    request: Request,
     type_code: str = Query(None),
     subtype_code: str = Query(None),
     start: str = Query(None),
-    end: str = Query(None)
+    end: str = Query(None),
+    limit: int = Query(None, ge=1),
+    cursor: str = Query(None),
+    since: str = Query(None),
+    search_text: str = Query(None, alias="search", max_length=200),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    authorized: bool = Depends(verify_admin)
 ):
-    import logging
-    def parse_dt(val):
-        if not val:
-            return None
+    check_ip_whitelist(request)
+    start_dt = parse_dt(start)
+    end_dt = parse_dt(end)
+    logging.info(f"/admin/api/requests filters: type_code={type_code}, subtype_code={subtype_code}, start={start}, end={end}, start_dt={start_dt}, end_dt={end_dt}, search={search_text}, limit={limit}, cursor={cursor}, since={since}, format={format}")
+    if cursor and since:
+        return JSONResponse({"success": False, "message": "Use either cursor or since, not both."}, status_code=400)
+    q = filter_requests(EmergencyRequest.__table__.select(), type_code, subtype_code, start_dt, end_dt, search_text)
+    if since:
+        # Delta sync: only what was committed after the client's last cursor
+        q = requests_since_query(q, since)
+        to_dicts = delta_dicts
+    else:
+        q = requests_page_query(q, cursor)
+        to_dicts = request_dicts
+    if format == "ndjson":
+        # Streams the whole filtered set unless a limit is given
+        archived = False
+        if not since and not search_text:
+            async with read_slot():
+                archived = bool(await archive_parts_for(start_dt, end_dt, cursor_position(cursor)))
+        lease = await read_lease(bulk_gate)
+        if archived:
+            return archived_ndjson_response(type_code, subtype_code, start_dt, end_dt, cursor, limit and page_limit(limit), lease)
+        if limit:
+            q = q.limit(page_limit(limit))
+        return ndjson_response(q, to_dicts, lease)
+    limit = page_limit(limit)
+    async with read_slot():
+        etag = api_responses.etag("requests", await data_version(REQUESTS_VERSION), catalog.version, request.url.query)
+        not_modified = api_responses.not_modified_response(request, etag, API_CACHE_HEADERS)
+        if not_modified:
+            return not_modified
+        if since:
+            async with ReadSessionLocal() as session:
+                result = await session.execute(q.limit(limit))
+                requests = result.fetchall()
+        else:
+            requests = await requests_page(type_code, subtype_code, start_dt, end_dt, cursor, limit, search_text)
+    data = to_dicts(requests)
+    headers = dict(API_CACHE_HEADERS)
+    if since:
+        headers["X-Next-Cursor"] = encode_cursor(requests[-1].rowid) if requests else since
+    elif len(requests) == limit:
+        last = requests[-1]
+        headers["X-Next-Cursor"] = encode_cursor(last.timestamp, last.request_id)
+    return await api_responses.response(request, data, etag=etag, headers=headers)
+
+# Bulk export: rows go from a DB cursor through the encoder (and gzip) to the
+# client one chunk at a time, so memory stays flat for any export size
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", 1000))
+
+def export_row(row) -> dict:
+    return {
+        "request_id": row.request_id,
+        "user_id": row.user_id,
+        "type_code": row.type_code,
+        "type_name": catalog.type_name(row.type_code),
+        "subtype_code": row.subtype_code,
+        "subtype_name": catalog.subtype_name(row.subtype_code),
+        "latitude": row.latitude,
+        "longitude": row.longitude,
+        "details": row.details,
+        "timestamp": row.timestamp.isoformat() if row.timestamp else None
+    }
+
+async def export_chunks(type_code, subtype_code, start_dt, end_dt, search_text=None):
+    """Matching requests in chunks: live ones newest first, then the archive part by part."""
+    q = filter_requests(EmergencyRequest.__table__.select(), type_code, subtype_code, start_dt, end_dt, search_text)
+    q = q.order_by(EmergencyRequest.timestamp.desc(), EmergencyRequest.request_id.desc())
+    async with ReadSessionLocal() as session:
+        result = await session.stream(q.execution_options(read_timeout=None))
+        async for partition in result.partitions(EXPORT_CHUNK_ROWS):
+            yield [export_row(row) for row in partition]
+    # Archived requests are not in the search index
+    parts = [] if search_text else await archive_parts_for(start_dt, end_dt)
+    if parts:
+        batches = archive.iter_requests(parts, type_code, subtype_code, start_dt, end_dt, EXPORT_CHUNK_ROWS)
+        while True:
+            batch = await asyncio.to_thread(next, batches, None)
+            if batch is None:
+                break
+            yield [export_row(SimpleNamespace(**row)) for row in batch]
+
+@router.get("/admin/api/requests/export")
+async def api_requests_export(
+    request: Request,
+    type_code: str = Query(None),
+    subtype_code: str = Query(None),
+    start: str = Query(None),
+    end: str = Query(None),
+    search_text: str = Query(None, alias="search", max_length=200),
+    format: str = Query("csv", pattern="^(csv|geojson|ndjson)$"),
+    gzip: bool = Query(False),
+    authorized: bool = Depends(verify_admin)
+):
+    """Download every matching request as CSV, GeoJSON or NDJSON, optionally gzipped."""
+    check_ip_whitelist(request)
+    start_dt = parse_dt(start)
+    end_dt = parse_dt(end)
+    logging.info(f"Export requested from {request.client.host}: format={format}, gzip={gzip}, type_code={type_code}, subtype_code={subtype_code}, start_dt={start_dt}, end_dt={end_dt}, search={search_text}")
+    media_type, extension = export.FORMATS[format]
+    lease = await read_lease(bulk_gate)
+    body = export.ENCODERS[format](export_chunks(type_code, subtype_code, start_dt, end_dt, search_text))
+    filename = f"emergency-requests-{datetime.utcnow():%Y%m%dT%H%M%S}.{extension}"
+    if gzip:
+        body = export.gzip_chunks(body)
+        media_type = "application/gzip"
+        filename += ".gz"
+    return streaming_read(body, lease, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+FEED_KEEPALIVE_SECONDS = 15
+FEED_CATCHUP_LIMIT = int(os.environ.get("FEED_CATCHUP_LIMIT", 5000))
+
+@router.get("/admin/api/requests/stream")
+async def api_requests_stream(
+    request: Request,
+    type_code: str = Query(None),
+    subtype_code: str = Query(None),
+    since: str = Query(None),
+    authorized: bool = Depends(verify_admin)
+):
+    """Server-sent events for newly committed requests.
+
+    Each event id is a delta cursor, so a reconnecting EventSource (which
+    sends Last-Event-ID) first receives what it missed from the DB and then
+    continues live. If more than FEED_CATCHUP_LIMIT requests were missed a
+    "reset" event tells the client to reload instead.
+    """
+    check_ip_whitelist(request)
+    since = request.headers.get("last-event-id") or since
+    catchup = None
+    if since:
+        catchup = filter_requests(EmergencyRequest.__table__.select(), type_code, subtype_code)
+        catchup = requests_since_query(catchup, since).limit(FEED_CATCHUP_LIMIT + 1)
+    # Subscribe before catching up so nothing committed in between is lost
+    subscription = request_feed.subscribe(type_code=type_code, subtype_code=subtype_code)
+
+    async def events():
         try:
-            return datetime.strptime(val, "%Y-%m-%dT%H:%M")
-        except Exception as e:
-            logging.warning(f"Invalid date filter value: {val} ({e})")
-            return None
+            last_rowid = 0
+            if catchup is not None:
+                # Reconnects queue for a read slot rather than fail
+                lease = await read_gate.lease(wait=True)
+                try:
+                    async with ReadSessionLocal() as session:
+                        rows = (await session.execute(catchup)).fetchall()
+                finally:
+                    lease.release()
+                if len(rows) > FEED_CATCHUP_LIMIT:
+                    yield "event: reset\ndata: {}\n\n"
+                    return
+                if rows:
+                    last_rowid = rows[-1].rowid
+                for item in delta_dicts(rows):
+                    yield f"id: {item['cursor']}\nevent: request\ndata: {json.dumps(item)}\n\n"
+            while not (subscription.overflowed and subscription.queue.empty()):
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), FEED_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                if event["rowid"] <= last_rowid:
+                    continue
+                yield f"id: {encode_cursor(event['rowid'])}\nevent: request\ndata: {event['data']}\n\n"
+        finally:
+            request_feed.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/admin/api/users")
+async def api_users(
+    request: Request,
+    limit: int = Query(None, ge=1),
+    cursor: str = Query(None),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    authorized: bool = Depends(verify_admin)
+):
+    check_ip_whitelist(request)
+    q = User.__table__.select()
+    if cursor:
+        (after_user_id,) = decode_cursor(cursor, 1)
+        q = q.where(User.user_id > after_user_id)
+    q = q.order_by(User.user_id)
+    if format == "ndjson":
+        if limit:
+            q = q.limit(page_limit(limit))
+        return ndjson_response(q, user_dicts, await read_lease(bulk_gate))
+    limit = page_limit(limit)
+    async with read_slot():
+        etag = api_responses.etag("users", await data_version(USERS_VERSION), request.url.query)
+        not_modified = api_responses.not_modified_response(request, etag, API_CACHE_HEADERS)
+        if not_modified:
+            return not_modified
+        async with ReadSessionLocal() as session:
+            result = await session.execute(q.limit(limit))
+            users = result.fetchall()
+    data = user_dicts(users)
+    headers = dict(API_CACHE_HEADERS)
+    if len(users) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(users[-1].user_id)
+    return await api_responses.response(request, data, etag=etag, headers=headers)
+
+# Map clustering: zoom level -> geohash precision used for aggregation
+CLUSTER_PRECISION_BY_ZOOM = [2, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6, 7]
+CLUSTER_POINT_ZOOM = int(os.environ.get("CLUSTER_POINT_ZOOM", len(CLUSTER_PRECISION_BY_ZOOM)))
+CLUSTER_MAX_POINTS = int(os.environ.get("CLUSTER_MAX_POINTS", 2000))
+
+def geohash_prefix_filter(min_lat, min_lon, max_lat, max_lon):
+    """Index range scans on the stored geohash covering the bounding box."""
+    ranges = [
+        and_(EmergencyRequest.geohash >= prefix, EmergencyRequest.geohash < geohash.prefix_upper_bound(prefix))
+        for prefix in geohash.covering_cells(min_lat, min_lon, max_lat, max_lon)
+    ]
+    return and_(
+        or_(*ranges),
+        EmergencyRequest.latitude.between(min_lat, max_lat),
+        EmergencyRequest.longitude.between(min_lon, max_lon)
+    )
+
+@router.get("/admin/api/clusters")
+async def api_clusters(
+    request: Request,
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    zoom: float = Query(..., ge=0),
+    type_code: str = Query(None),
+    subtype_code: str = Query(None),
+    start: str = Query(None),
+    end: str = Query(None),
+    authorized: bool = Depends(verify_admin)
+):
+    check_ip_whitelist(request)
+    if min_lat > max_lat or min_lon > max_lon:
+        return JSONResponse({"success": False, "message": "Invalid bounding box."}, status_code=400)
+    viewport = geohash_prefix_filter(min_lat, min_lon, max_lat, max_lon)
     start_dt = parse_dt(start)
     end_dt = parse_dt(end)
-    logging.info(f"/admin/api/requests filters: type_code={type_code}, subtype_code={subtype_code}, start={start}, end={end}, start_dt={start_dt}, end_dt={end_dt}")
-    async with SessionLocal() as session:
-        q = EmergencyRequest.__table__.select()
-        if type_code:
-            q = q.where(EmergencyRequest.type_code == type_code)
-        if subtype_code:
-            q = q.where(EmergencyRequest.subtype_code == subtype_code)
-        if start_dt:
-            q = q.where(EmergencyRequest.timestamp >= start_dt)
-        if end_dt:
-            q = q.where(EmergencyRequest.timestamp <= end_dt)
-        q = q.order_by(EmergencyRequest.timestamp.desc())
-        result = await session.execute(q)
-        requests = result.fetchall()
-        TYPE_CODES = {
-            "ATTACK": "Report attack",
-            "INJURY": "Report injury/casualty",
-            "MEDICAL": "Find medical services",
-            "HELPLINE": "Call helpline"
-        }
-        SUBTYPE_CODES = {
-            "BULLETS": "Bullets",
-            "DRONES": "Enemy drones",
-            "ARTILLERY": "Heavy artillery / Bomblasts / Missiles",
-            "LIFE_THREAT": "Life threatening injury",
-            "DEATH": "Death",
-            "MINOR": "Minor injuries"
-        }
-        data = []
-        for row in requests:
-            data.append({
-                "request_id": row.request_id,
-                "user_id": row.user_id,
-                "latitude": row.latitude,
-                "longitude": row.longitude,
-                "type_code": row.type_code,
-                "type_name": TYPE_CODES.get(row.type_code, row.type_code),
-                "subtype_code": row.subtype_code,
-                "subtype_name": SUBTYPE_CODES.get(row.subtype_code, row.subtype_code) if row.subtype_code else None,
-                "details": row.details,
-                "timestamp": row.timestamp.strftime('%d %b %Y, %I:%M %p') if row.timestamp else ''
+    async with read_slot(), ReadSessionLocal() as session:
+        if zoom >= CLUSTER_POINT_ZOOM:
+            q = filter_requests(EmergencyRequest.__table__.select().where(viewport), type_code, subtype_code, start_dt, end_dt)
+            q = q.order_by(EmergencyRequest.timestamp.desc()).limit(CLUSTER_MAX_POINTS + 1)
+            rows = (await session.execute(q)).fetchall()
+            return JSONResponse({
+                "mode": "points",
+                "points": request_dicts(rows[:CLUSTER_MAX_POINTS]),
+                "truncated": len(rows) > CLUSTER_MAX_POINTS
             })
-    return JSONResponse(data)
+        precision = CLUSTER_PRECISION_BY_ZOOM[min(int(zoom), len(CLUSTER_PRECISION_BY_ZOOM) - 1)]
+        cell = func.substr(EmergencyRequest.geohash, 1, precision).label("cell")
+        q = filter_requests(
+            select(
+                cell,
+                EmergencyRequest.type_code,
+                func.count().label("count"),
+                func.sum(EmergencyRequest.latitude).label("lat_sum"),
+                func.sum(EmergencyRequest.longitude).label("lon_sum")
+            ).where(viewport),
+            type_code, subtype_code, start_dt, end_dt
+        ).group_by(cell, EmergencyRequest.type_code)
+        rows = (await session.execute(q)).fetchall()
+    cells = {}
+    for row in rows:
+        c = cells.setdefault(row.cell, {"geohash": row.cell, "count": 0, "lat_sum": 0.0, "lon_sum": 0.0, "types": {}})
+        c["count"] += row.count
+        c["lat_sum"] += row.lat_sum
+        c["lon_sum"] += row.lon_sum
+        c["types"][row.type_code or ""] = row.count
+    data = [{
+        "geohash": c["geohash"],
+        "latitude": c["lat_sum"] / c["count"],
+        "longitude": c["lon_sum"] / c["count"],
+        "count": c["count"],
+        "types": c["types"]
+    } for c in cells.values()]
+    return JSONResponse({"mode": "clusters", "precision": precision, "clusters": data})
 
-@app.get("/admin/api/users")
-async def api_users():
+STATS_GROUPS = {
+    "hour": RequestRollup.hour,
+    "day": func.strftime("%Y-%m-%d", RequestRollup.hour),
+    "type_code": RequestRollup.type_code,
+    "subtype_code": RequestRollup.subtype_code,
+    "cell": RequestRollup.cell,
+}
+
+@router.get("/admin/api/stats")
+async def api_stats(
+    request: Request,
+    group_by: str = Query("day"),
+    type_code: str = Query(None),
+    subtype_code: str = Query(None),
+    cell: str = Query(None),
+    start: str = Query(None),
+    end: str = Query(None),
+    authorized: bool = Depends(verify_admin)
+):
+    """Trend and breakdown counts served from the hourly rollups."""
+    check_ip_whitelist(request)
+    groups = [g.strip() for g in group_by.split(",") if g.strip()]
+    unknown = [g for g in groups if g not in STATS_GROUPS]
+    if unknown:
+        return JSONResponse({"success": False, "message": f"Unknown group_by: {', '.join(unknown)}"}, status_code=400)
+    columns = [STATS_GROUPS[g].label(g) for g in groups]
+    q = select(*columns, func.sum(RequestRollup.count).label("count"))
+    if type_code:
+        q = q.where(RequestRollup.type_code == type_code)
+    if subtype_code:
+        q = q.where(RequestRollup.subtype_code == subtype_code)
+    if cell:
+        q = q.where(RequestRollup.cell.startswith(cell[:ROLLUP_CELL_PRECISION]))
+    start_dt = parse_dt(start)
+    end_dt = parse_dt(end)
+    # Rollups are hourly, so filters apply at hour granularity
+    if start_dt:
+        q = q.where(RequestRollup.hour >= start_dt.replace(minute=0))
+    if end_dt:
+        q = q.where(RequestRollup.hour <= end_dt)
+    if columns:
+        q = q.group_by(*columns).order_by(*columns)
+    async with read_slot(), ReadSessionLocal() as session:
+        rows = (await session.execute(q)).fetchall()
+    data = []
+    for row in rows:
+        item = {}
+        for g in groups:
+            value = getattr(row, g)
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            item[g] = value if value != "" else None
+        item["count"] = row.count or 0
+        data.append(item)
+    return JSONResponse({"group_by": groups, "total": sum(d["count"] for d in data), "data": data})
+
+def incident_to_dict(incident) -> dict:
+    return {
+        "incident_id": incident.incident_id,
+        "type_code": incident.type_code,
+        "type_name": catalog.type_name(incident.type_code),
+        "subtype_code": incident.subtype_code,
+        "subtype_name": catalog.subtype_name(incident.subtype_code),
+        "latitude": incident.latitude,
+        "longitude": incident.longitude,
+        "reports": incident.reports,
+        "severity": incident.severity,
+        "priority": incident.priority,
+        "first_seen": incident.first_seen.isoformat(),
+        "last_seen": incident.last_seen.isoformat()
+    }
+
+@router.get("/admin/api/incidents")
+async def api_incidents(request: Request, limit: int = Query(20, ge=1, le=1000),
+                        authorized: bool = Depends(verify_admin)):
+    """Open incidents, highest triage priority first, served from memory."""
+    check_ip_whitelist(request)
+    await refresh_incidents()
+    incidents = incident_clusterer.top(limit, datetime.utcnow())
+    return JSONResponse([incident_to_dict(incident) for incident in incidents])
+
+def geofence_to_dict(row) -> dict:
+    return {
+        "geofence_id": row.geofence_id,
+        "name": row.name,
+        "subscriber": row.subscriber,
+        "geometry": json.loads(row.geometry),
+        "type_codes": row.type_codes.split() if row.type_codes else None,
+        "subtype_codes": row.subtype_codes.split() if row.subtype_codes else None,
+        "active": bool(row.active),
+        "created_at": row.created_at.isoformat()
+    }
+
+@router.post("/admin/api/geofences")
+async def api_create_geofence(request: Request, data: dict = Body(...), authorized: bool = Depends(verify_admin)):
+    """Register a geofence: new requests inside it are queued in the outbox for its subscriber."""
+    check_ip_whitelist(request)
+    try:
+        values = geofences.parse_geofence(data)
+    except ValueError as e:
+        return JSONResponse({"success": False, "message": str(e)}, status_code=400)
+    unknown = [code for code in (values["type_codes"] or "").split() if code not in catalog.types]
+    unknown += [code for code in (values["subtype_codes"] or "").split() if code not in catalog.subtypes]
+    if unknown:
+        return JSONResponse({"success": False, "message": f"Unknown type or subtype codes: {', '.join(unknown)}."},
+                            status_code=400)
+    values.update(geofence_id=str(uuid.uuid4()), active=1, created_at=datetime.utcnow())
     async with SessionLocal() as session:
-        result = await session.execute(User.__table__.select())
-        users = result.fetchall()
-        data = []
-        for row in users:
-            data.append({
-                "user_id": row.user_id,
-                "phone": row.phone,
-                "name": row.name
-            })
-    return JSONResponse(data)
+        await session.execute(Geofence.__table__.insert(), values)
+        await session.commit()
+    # This worker matches against it right away; the others on their next reload
+    row = SimpleNamespace(**values)
+    geofence_index.add(geofences.Geofence.from_row(row), values["cells"].split())
+    return JSONResponse({"success": True, "message": "Geofence created.", "geofence": geofence_to_dict(row)})
 
-@app.post("/profile")
+@router.get("/admin/api/geofences")
+async def api_geofences(
+    request: Request,
+    subscriber: str = Query(None),
+    include_inactive: bool = Query(False),
+    limit: int = Query(None, ge=1),
+    cursor: str = Query(None),
+    authorized: bool = Depends(verify_admin)
+):
+    check_ip_whitelist(request)
+    q = Geofence.__table__.select()
+    if subscriber:
+        q = q.where(Geofence.subscriber == subscriber)
+    if not include_inactive:
+        q = q.where(Geofence.active == 1)
+    if cursor:
+        (after_geofence_id,) = decode_cursor(cursor, 1)
+        q = q.where(Geofence.geofence_id > after_geofence_id)
+    limit = page_limit(limit)
+    async with read_slot():
+        async with ReadSessionLocal() as session:
+            rows = (await session.execute(q.order_by(Geofence.geofence_id).limit(limit))).fetchall()
+    headers = dict(API_CACHE_HEADERS)
+    if len(rows) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1].geofence_id)
+    return await api_responses.response(request, [geofence_to_dict(row) for row in rows], headers=headers)
+
+@router.delete("/admin/api/geofences/{geofence_id}")
+async def api_delete_geofence(request: Request, geofence_id: str, authorized: bool = Depends(verify_admin)):
+    """Deactivate a geofence; its queued messages are still delivered."""
+    check_ip_whitelist(request)
+    async with SessionLocal() as session:
+        result = await session.execute(
+            Geofence.__table__.update().where(Geofence.geofence_id == geofence_id, Geofence.active == 1).values(active=0)
+        )
+        await session.commit()
+    geofence_index.remove(geofence_id)
+    if not result.rowcount:
+        return JSONResponse({"success": False, "message": "Geofence not found."}, status_code=404)
+    return JSONResponse({"success": True, "message": "Geofence deactivated."})
+
+@router.get("/admin/api/outbox")
+async def api_outbox(
+    request: Request,
+    status_filter: str = Query(None, alias="status", pattern="^(pending|sending|delivered|failed)$"),
+    subscriber: str = Query(None),
+    request_id: str = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    authorized: bool = Depends(verify_admin)
+):
+    """Most recent outbox messages, newest first."""
+    check_ip_whitelist(request)
+    q = GeofenceOutbox.__table__.select()
+    if status_filter:
+        q = q.where(GeofenceOutbox.status == status_filter)
+    if subscriber:
+        q = q.where(GeofenceOutbox.subscriber == subscriber)
+    if request_id:
+        q = q.where(GeofenceOutbox.request_id == request_id)
+    async with read_slot():
+        async with ReadSessionLocal() as session:
+            rows = (await session.execute(q.order_by(GeofenceOutbox.outbox_id.desc()).limit(limit))).fetchall()
+    return await api_responses.response(request, [{
+        "outbox_id": row.outbox_id,
+        "geofence_id": row.geofence_id,
+        "subscriber": row.subscriber,
+        "request_id": row.request_id,
+        "payload": json.loads(row.payload),
+        "status": row.status,
+        "attempts": row.attempts,
+        "created_at": row.created_at.isoformat(),
+        "delivered_at": row.delivered_at.isoformat() if row.delivered_at else None,
+        "last_error": row.last_error
+    } for row in rows], headers=API_CACHE_HEADERS)
+
+@router.post("/profile")
 async def update_profile(request: Request, data: dict = Body(...)):
     phone = request.session.get("phone")
     user_id = request.session.get("user_id")
@@ -391,29 +1800,363 @@ async def update_profile(request: Request, data: dict = Body(...)):
     surname = data.get("surname", "").strip() or None
     if not name:
         return JSONResponse({"success": False, "message": "Name is required."}, status_code=400)
+    user = await get_user_profile(user_id)
+    if not user:
+        return JSONResponse({"success": False, "message": "User not found."}, status_code=404)
     async with SessionLocal() as session:
-        result = await session.execute(User.__table__.select().where(User.user_id == user_id))
-        user = result.fetchone()
-        if not user:
-            return JSONResponse({"success": False, "message": "User not found."}, status_code=404)
         await session.execute(User.__table__.update().where(User.user_id == user_id).values(name=name, surname=surname))
         await session.commit()
+    user_cache.set(user_id, dict(user, name=name, surname=surname))
     return JSONResponse({"success": True, "message": "Profile updated."})
 
-@app.get("/admin/api/types")
-async def api_types():
+# Bulk ingest for SMS gateways and offline-sync clients
+INGEST_API_KEY = os.environ.get("INGEST_API_KEY")
+INGEST_CHUNK_SIZE = int(os.environ.get("INGEST_CHUNK_SIZE", 500))
+INGEST_MAX_ITEMS = int(os.environ.get("INGEST_MAX_ITEMS", 10000))
+INGEST_MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+def parse_report(report) -> dict:
+    """Validate one ingested report; raises ValueError with a client-facing message."""
+    if not isinstance(report, dict):
+        raise ValueError("Report must be a JSON object.")
+    for field in ("type_code", "subtype_code", "details", "name", "idempotency_key"):
+        if not isinstance(report.get(field), (str, type(None))):
+            raise ValueError(f"{field} must be a string.")
+    phone = str(report.get("phone") or "")
+    if not is_valid_indian_mobile(phone):
+        raise ValueError("Invalid Indian mobile number.")
+    type_code = report.get("type_code")
+    subtype_code = report.get("subtype_code") or None
+    if type_code in ("HELPLINE", "MEDICAL"):
+        subtype_code = None
+    if not catalog.is_valid(type_code, subtype_code):
+        raise ValueError("Unknown request type or subtype.")
+    try:
+        latitude = float(report["latitude"])
+        longitude = float(report["longitude"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("latitude and longitude are required numbers.")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("latitude/longitude out of range.")
+    now = datetime.utcnow()
+    timestamp = now
+    if report.get("timestamp"):
+        try:
+            timestamp = datetime.fromisoformat(str(report["timestamp"]).replace("Z", "+00:00"))
+        except ValueError:
+            raise ValueError("timestamp must be ISO 8601.")
+        if timestamp.tzinfo:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        if timestamp > now + INGEST_MAX_CLOCK_SKEW:
+            raise ValueError("timestamp is in the future.")
+    key = report.get("idempotency_key")
+    return {
+        "idempotency_key": key or None,
+        "phone": phone,
+        "name": (report.get("name") or "").strip() or None,
+        "type_code": type_code,
+        "subtype_code": subtype_code,
+        "details": None if type_code in ("HELPLINE", "MEDICAL") else report.get("details"),
+        "latitude": latitude,
+        "longitude": longitude,
+        "timestamp": timestamp
+    }
+
+async def iter_ingest_reports(request: Request):
+    """Yield reports from a JSON array body or, line by line, from an NDJSON stream."""
+    if "ndjson" in request.headers.get("content-type", ""):
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+    else:
+        try:
+            reports = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON.")
+        if not isinstance(reports, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON.")
+        for report in reports:
+            yield report
+
+async def ingest_chunk(items: list, throttled_counts: dict) -> list:
+    """Insert one chunk of (index, report) pairs; returns a result per item."""
+    results = {}
     async with SessionLocal() as session:
-        result = await session.execute(RequestType.__table__.select())
-        types = result.fetchall()
-        data = []
-        for t in types:
-            sub_result = await session.execute(RequestSubType.__table__.select().where(RequestSubType.type_code == t.type_code))
-            subtypes = sub_result.fetchall()
-            data.append({
-                "type_code": t.type_code,
-                "type_name": t.type_name,
-                "subtypes": [
-                    {"subtype_code": s.subtype_code, "subtype_name": s.subtype_name} for s in subtypes
-                ]
+        # Retries are answered from idempotency_keys (never archived) without touching the throttle
+        keys = [r["idempotency_key"] for _, r in items if r["idempotency_key"]]
+        existing = {}
+        if keys:
+            rows = await session.execute(
+                select(IdempotencyKey.idempotency_key, IdempotencyKey.request_id)
+                .where(IdempotencyKey.idempotency_key.in_(keys))
+            )
+            existing = dict(rows.fetchall())
+        phones = {r["phone"] for _, r in items}
+        users = {row.phone: row for row in (await session.execute(
+            User.__table__.select().where(User.phone.in_(phones))
+        )).fetchall()}
+        new_users = []
+        for _, r in items:
+            if r["phone"] not in users and r["name"] and r["phone"] not in {u["phone"] for u in new_users}:
+                new_users.append({"user_id": str(uuid.uuid4()), "phone": r["phone"], "name": r["name"], "surname": None})
+        if new_users:
+            await session.execute(User.__table__.insert(), new_users)
+            users.update({u["phone"]: SimpleNamespace(**u) for u in new_users})
+
+        rows = []
+        seen_keys = {}
+        now = datetime.utcnow()
+        for index, r in items:
+            key = r["idempotency_key"]
+            if key and key in existing:
+                results[index] = {"status": "duplicate", "request_id": existing[key]}
+                continue
+            if key and key in seen_keys:
+                results[index] = {"status": "duplicate", "request_id": seen_keys[key]}
+                continue
+            user = users.get(r["phone"])
+            if not user or not user.name:
+                results[index] = {"status": "invalid", "message": "Unknown user; include a name to register."}
+                continue
+            pending = throttled_counts.get(user.user_id, 0)
+            if not await throttle_allows(user.user_id, r["type_code"], now, pending=pending):
+                results[index] = {"status": "throttled", "message": "Request limit reached: Only 3 requests allowed per hour."}
+                continue
+            throttled_counts[user.user_id] = pending + 1
+            request_id = str(uuid.uuid4())
+            if key:
+                seen_keys[key] = request_id
+            rows.append({
+                "request_id": request_id,
+                "user_id": user.user_id,
+                "name": user.name,
+                "latitude": r["latitude"],
+                "longitude": r["longitude"],
+                "type_code": r["type_code"],
+                "subtype_code": r["subtype_code"],
+                "details": r["details"],
+                "timestamp": r["timestamp"],
+                "geohash": geohash.encode(r["latitude"], r["longitude"]),
+                "idempotency_key": key
             })
-    return JSONResponse(data) 
\ No newline at end of file
+            results[index] = {"status": "created", "request_id": request_id}
+        rowids = []
+        if rows:
+            try:
+                for row, token in zip(rows, await crypto.map("encrypt", [row["name"] for row in rows])):
+                    row["name"] = token
+                # One multi-row INSERT for the whole chunk
+                rowids = await insert_requests(session, rows)
+                keyed = [{"idempotency_key": row["idempotency_key"], "request_id": row["request_id"], "created_at": now}
+                         for row in rows if row["idempotency_key"]]
+                if keyed:
+                    await session.execute(IdempotencyKey.__table__.insert(), keyed)
+                await session.commit()
+            except Exception:
+                if SUBMIT_THROTTLE == "memory":
+                    for row in rows:
+                        submit_throttle.release(row["user_id"], now)
+                raise
+        elif new_users:
+            await session.commit()
+    publish_requests(rows, rowids)
+    return [dict(index=index, idempotency_key=r["idempotency_key"], **results[index]) for index, r in items]
+
+async def ingest_chunk_with_retry(items: list, throttled_counts: dict) -> list:
+    counts = dict(throttled_counts)
+    try:
+        results = await ingest_chunk(items, counts)
+    except IntegrityError:
+        # A concurrent ingest committed the same idempotency key or phone first;
+        # the retry sees it and reports those items as duplicates
+        counts = dict(throttled_counts)
+        results = await ingest_chunk(items, counts)
+    throttled_counts.update(counts)
+    return results
+
+@router.post("/api/ingest")
+async def ingest(request: Request):
+    """Batch SOS ingest: a JSON array or NDJSON stream of reports, one status per report.
+
+    Each report has phone, type_code, latitude, longitude and optionally
+    subtype_code, details, timestamp (ISO 8601, UTC if naive), name (to
+    register a new phone number) and idempotency_key. Re-sending a report
+    with the same idempotency_key returns its original request_id.
+    """
+    if not INGEST_API_KEY:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(request.headers.get("x-ingest-key", ""), INGEST_API_KEY):
+        logging.warning(f"Rejected ingest from {request.client.host}: bad API key")
+        raise HTTPException(status_code=HTTP_401_UNAUTHORIZED, detail="Invalid ingest key.")
+    results = []
+    chunk = []
+    throttled_counts = {}
+    index = 0
+    async for raw in iter_ingest_reports(request):
+        if index >= INGEST_MAX_ITEMS:
+            raise HTTPException(status_code=413, detail=f"At most {INGEST_MAX_ITEMS} reports per request.")
+        try:
+            report = json.loads(raw) if isinstance(raw, bytes) else raw
+            chunk.append((index, parse_report(report)))
+        except ValueError as e:
+            results.append({"index": index, "status": "invalid", "message": str(e)})
+        index += 1
+        if len(chunk) >= INGEST_CHUNK_SIZE:
+            results.extend(await ingest_chunk_with_retry(chunk, throttled_counts))
+            chunk = []
+    if chunk:
+        results.extend(await ingest_chunk_with_retry(chunk, throttled_counts))
+    results.sort(key=lambda r: r["index"])
+    summary = {}
+    for r in results:
+        summary[r["status"]] = summary.get(r["status"], 0) + 1
+    logging.info(f"Ingested {index} reports from {request.client.host}: {summary}")
+    return JSONResponse({"summary": summary, "results": results})
+
+@router.get("/admin/api/cache-stats")
+async def api_cache_stats(request: Request, authorized: bool = Depends(verify_admin)):
+    check_ip_whitelist(request)
+    return JSONResponse({
+        "user_profiles": user_cache.stats(),
+        "submit_writer": submit_writer.stats() if submit_writer else None,
+        "crypto": crypto.stats(),
+        "facilities": facility_directory.stats(),
+        "incidents": incident_clusterer.stats(),
+        "geofences": dict(geofence_index.stats(), version=geofence_version, delivery=geofence_delivery.stats()),
+        "reads": read_gate.stats(),
+        "bulk_reads": bulk_gate.stats(),
+        "responses": api_responses.stats(),
+        "key_rotation": key_rotation
+    })
+
+@router.get("/admin/metrics")
+async def admin_metrics(request: Request, authorized: bool = Depends(verify_admin)):
+    check_ip_whitelist(request)
+    return Response(metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.post("/admin/api/profile")
+async def api_profile(
+    request: Request,
+    path: str = Query("/", description="profile requests whose path starts with this"),
+    min_ms: float = Query(500, ge=0, description="keep profiles of requests at least this slow"),
+    count: int = Query(1, ge=1, le=20),
+    authorized: bool = Depends(verify_admin)
+):
+    check_ip_whitelist(request)
+    if profiler is None:
+        return JSONResponse({"success": False, "message": "Profiling is disabled; set PROFILING=1."}, status_code=404)
+    profiler.arm(path, min_ms / 1000, count)
+    logging.info(f"Profiler armed by {request.client.host}: path={path}, min_ms={min_ms}, count={count}")
+    return JSONResponse({"success": True, "message": f"Profiling the next {count} request(s) under {path} slower than {min_ms} ms."})
+
+@router.get("/admin/api/profiles")
+async def api_profiles(request: Request, authorized: bool = Depends(verify_admin)):
+    check_ip_whitelist(request)
+    if profiler is None:
+        return JSONResponse({"success": False, "message": "Profiling is disabled; set PROFILING=1."}, status_code=404)
+    return JSONResponse(profiler.stats())
+
+@router.get("/admin/api/profiles/{profile_id}")
+async def api_profile_stacks(request: Request, profile_id: int, authorized: bool = Depends(verify_admin)):
+    """One captured profile as collapsed stacks (flamegraph.pl / speedscope input)."""
+    check_ip_whitelist(request)
+    profile = profiler.get(profile_id) if profiler else None
+    if profile is None:
+        return JSONResponse({"success": False, "message": "Profile not found."}, status_code=404)
+    return Response(collapsed_stacks(profile["stacks"]), media_type="text/plain; charset=utf-8")
+
+# Key rotation: re-encrypt stored names under the primary key, one short
+# transaction per chunk so /submit keeps writing while it runs
+KEY_ROTATION_BATCH = int(os.environ.get("KEY_ROTATION_BATCH", 1000))
+KEY_ROTATION_PAUSE = float(os.environ.get("KEY_ROTATION_PAUSE", 0.05))  # seconds between chunks
+key_rotation = {"running": False, "last_rowid": 0, "scanned": 0, "rotated": 0, "undecryptable": 0,
+                "started_at": None, "finished_at": None}
+key_rotation_task = None
+
+async def rotate_names():
+    key_rotation.update(running=True, last_rowid=0, scanned=0, rotated=0, undecryptable=0,
+                        started_at=datetime.utcnow().isoformat(), finished_at=None)
+    update_name = (
+        EmergencyRequest.__table__.update()
+        .where(REQUEST_ROWID == bindparam("rid"), EmergencyRequest.name == bindparam("old"))
+        .values(name=bindparam("new"))
+    )
+    try:
+        while True:
+            async with SessionLocal() as session:
+                rows = (await session.execute(
+                    select(REQUEST_ROWID, EmergencyRequest.name)
+                    .where(REQUEST_ROWID > key_rotation["last_rowid"])
+                    .order_by(REQUEST_ROWID)
+                    .limit(KEY_ROTATION_BATCH)
+                )).fetchall()
+            if not rows:
+                break
+            tokens = await crypto.map("rotate", [name for _, name in rows])
+            # Skips rows whose name changed since it was read
+            updates = [{"rid": rowid, "old": name, "new": token} for (rowid, name), token in zip(rows, tokens) if token]
+            if updates:
+                async with SessionLocal() as session:
+                    await session.execute(update_name, updates)
+                    await session.commit()
+            key_rotation["last_rowid"] = rows[-1][0]
+            key_rotation["scanned"] += len(rows)
+            key_rotation["rotated"] += len(updates)
+            key_rotation["undecryptable"] += sum(1 for token in tokens if token is None)
+            await asyncio.sleep(KEY_ROTATION_PAUSE)
+        logging.info(f"Key rotation finished: {key_rotation}")
+    except Exception:
+        logging.exception("Key rotation failed")
+    finally:
+        key_rotation.update(running=False, finished_at=datetime.utcnow().isoformat())
+
+@router.post("/admin/api/rotate-keys")
+async def api_rotate_keys(request: Request, authorized: bool = Depends(verify_admin)):
+    """Start re-encrypting stored names under the first key in FERNET_KEYS."""
+    global key_rotation_task
+    check_ip_whitelist(request)
+    if not key_rotation["running"]:
+        key_rotation_task = asyncio.create_task(rotate_names())
+        await asyncio.sleep(0)
+    return JSONResponse({"success": True, "message": "Key rotation running.", "progress": key_rotation})
+
+@router.get("/admin/api/types")
+async def api_types(request: Request):
+    # Served from the in-memory catalog; unchanged catalogs cost a 304
+    etag = "W/" + catalog.etag
+    headers = {"Cache-Control": "no-cache"}
+    not_modified = api_responses.not_modified_response(request, etag, headers)
+    if not_modified:
+        return not_modified
+    return await api_responses.response(request, body=catalog.payload, etag=etag, headers=headers)
+
+@router.post("/admin/api/types/reload")
+async def api_types_reload(request: Request, authorized: bool = Depends(verify_admin)):
+    check_ip_whitelist(request)
+    await reload_catalog()
+    return JSONResponse({"success": True, "message": "Reference data reloaded.", "version": catalog.version})
+
+def create_app() -> FastAPI:
+    """The ASGI app. Importing this module configures everything once; this only assembles it.
+
+    `uvicorn main:app` serves the module-level instance; `uvicorn main:create_app
+    --factory` builds a fresh one. See serve.py for preloading before workers fork.
+    """
+    app = FastAPI(lifespan=lifespan)
+    # app.add_middleware(HTTPSRedirectMiddleware)
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+    app.include_router(router)
+    app.add_middleware(SessionMiddleware, secret_key=SESSION_SECRET_KEY)
+    # Outermost, so the timings include the other middleware
+    if METRICS_ENABLED:
+        app.add_middleware(metrics.MetricsMiddleware, registry=metrics_registry, profiler=profiler)
+    return app
+
+app = create_app()
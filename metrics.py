@@ -0,0 +1,246 @@
+import re
+import time
+from bisect import bisect_left
+from sqlalchemy import event
+
+# In-process metrics in the Prometheus text exposition format, without a
+# client library. Histograms have fixed buckets, so observing a value is a
+# bisect and two additions, and scraping renders whatever has accumulated.
+# Everything is recorded on the event loop thread (SQLAlchemy's async
+# adapter fires its events there), so no locking is needed.
+#
+# Label values must stay few: each metric keeps at most max_series label
+# combinations and counts anything beyond that under "other".
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0)
+MAX_SERIES = 500
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), max_series: int = MAX_SERIES):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.max_series = max_series
+        self.series = {}
+
+    def _key(self, labels: tuple) -> tuple:
+        if labels in self.series or len(self.series) < self.max_series:
+            return labels
+        return ("other",) * len(self.label_names)
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        key = self._key(labels)
+        self.series[key] = self.series.get(key, 0) + amount
+
+    def samples(self) -> list:
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}" for key, value in self.series.items()]
+
+class Gauge(_Metric):
+    """A value that is set directly, or read from `function` at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), function=None):
+        super().__init__(name, help, labels)
+        self.function = function
+
+    def set(self, value: float, *labels):
+        self.series[self._key(labels)] = value
+
+    def inc(self, *labels, amount: float = 1):
+        key = self._key(labels)
+        self.series[key] = self.series.get(key, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def samples(self) -> list:
+        if self.function is not None:
+            return [f"{self.name} {_number(self.function())}"]
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}" for key, value in self.series.items()]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS,
+                 max_series: int = MAX_SERIES):
+        super().__init__(name, help, labels, max_series)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        key = self._key(labels)
+        series = self.series.get(key)
+        if series is None:
+            # Per-bucket counts (the last one is +Inf), then the sum
+            series = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self) -> list:
+        lines = []
+        for key, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = 'le="' + str(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {series[-1]!r}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self.metrics = {}
+
+    def _add(self, metric):
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self._add(Counter(self.prefix + name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: tuple = (), function=None) -> Gauge:
+        return self._add(Gauge(self.prefix + name, help, labels, function))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(self.prefix + name, help, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# SQL statements reduced to their shape: literals and parameter lists are
+# collapsed so "IN (?, ?, ?)" and "IN (?, ?)" count as the same query
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])\d+(?:\.\d+)?\b")
+_PARAMETER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_REPEATED_LISTS = re.compile(r"\(\?\.\.\.\)(?:\s*,\s*\(\?\.\.\.\))+")
+_SPACE = re.compile(r"\s+")
+_shapes = {}
+
+def query_shape(statement: str, max_length: int = 160) -> str:
+    shape = _shapes.get(statement)
+    if shape is None:
+        shape = _SPACE.sub(" ", statement).strip()
+        shape = _NUMBER.sub("?", _STRING.sub("?", shape))
+        shape = _REPEATED_LISTS.sub("(?...), ...", _PARAMETER_LIST.sub("(?...)", shape))
+        if len(shape) > max_length:
+            shape = shape[:max_length - 3] + "..."
+        if len(_shapes) >= 4096:
+            _shapes.clear()
+        _shapes[statement] = shape
+    return shape
+
+def instrument_engine(engine, registry: Registry):
+    """Time every statement run through engine (its sync_engine for async engines), per query shape."""
+    duration = registry.histogram("db_query_duration_seconds", "Time to execute a SQL statement, by query shape.",
+                                  ("query",), QUERY_BUCKETS)
+    errors = registry.counter("db_query_errors_total", "SQL statements that raised, by query shape.", ("query",))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def started(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def finished(conn, cursor, statement, parameters, context, executemany):
+        duration.observe(time.perf_counter() - conn.info["query_started"].pop(), query_shape(statement))
+
+    @event.listens_for(engine, "handle_error")
+    def failed(context):
+        stack = context.connection.info.get("query_started") if context.connection is not None else None
+        if stack:
+            stack.pop()
+            errors.inc(query_shape(context.statement or ""))
+
+def instrument_sessions(session_class, registry: Registry):
+    """Time how long ORM sessions wait for a connection when they begin.
+
+    Sessions begin lazily on first use; the time from beginning to having a
+    connection is the pool checkout (queueing when the pool is exhausted).
+    session_class is the sync Session class (AsyncSession.sync_session_class).
+    """
+    acquire = registry.histogram("db_session_acquire_seconds", "Time for a session to get a database connection.")
+
+    @event.listens_for(session_class, "after_transaction_create")
+    def beginning(session, transaction):
+        if transaction.parent is None:
+            session.info["acquire_started"] = time.perf_counter()
+
+    @event.listens_for(session_class, "after_begin")
+    def begun(session, transaction, connection):
+        started = session.info.pop("acquire_started", None)
+        if started is not None:
+            acquire.observe(time.perf_counter() - started)
+
+def route_name(scope) -> str:
+    """The route template ("/admin/api/incidents") rather than the raw path, to bound label values."""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if scope.get("endpoint") is not None:
+        return scope.get("root_path") or "/"  # a mounted app such as /static
+    return "unmatched"
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, status codes and in-flight requests.
+
+    Latency runs until the response body is fully sent, so streamed
+    responses (exports, the live feed) count their whole duration.
+    """
+
+    def __init__(self, app, registry: Registry, profiler=None):
+        self.app = app
+        self.profiler = profiler
+        self.in_flight = registry.gauge("http_requests_in_flight", "HTTP requests being handled.")
+        self.duration = registry.histogram("http_request_duration_seconds", "HTTP request latency, by route.",
+                                           ("method", "route"))
+        self.responses = registry.counter("http_responses_total", "HTTP responses, by route and status.",
+                                          ("method", "route", "status"))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        sampler = self.profiler.begin(scope["path"]) if self.profiler else None
+        self.in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.in_flight.dec()
+            route = route_name(scope)
+            self.duration.observe(elapsed, scope["method"], route)
+            self.responses.inc(scope["method"], route, str(status))
+            if sampler is not None:
+                self.profiler.finish(sampler, scope["method"], route, elapsed, status)
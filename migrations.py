@@ -0,0 +1,552 @@
+import os
+import argparse
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateTable, CreateIndex
+import geohash
+import models
+import search
+
+# Versioned schema migrations for emergency.db.
+#
+#   python migrations.py              apply all pending migrations
+#   python migrations.py --status     list applied and pending migrations
+#   python migrations.py --dry-run    estimate row counts and runtime, change nothing
+#
+# DDL steps are idempotent. Data backfills run in keyset-paged chunks over
+# rowid; each chunk commits together with its checkpoint, so an interrupted
+# migration resumes from the last committed chunk when run again. Applied
+# versions are recorded in schema_migrations.
+#
+# A fresh database gets the current schema from models.py in one go and is
+# stamped with every version (create_schema); the app only reads the version
+# at startup and refuses to run against a database that is behind.
+
+# Load environment variables
+load_dotenv()
+DATA_DIR = os.path.abspath(os.environ.get("DATA_DIR", "../data"))
+DB_PATH = os.path.join(DATA_DIR, "emergency.db")
+
+BATCH_SIZE = 5000
+
+BOOKKEEPING = [
+    """CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR NOT NULL,
+        applied_at DATETIME NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS migration_checkpoints (
+        version INTEGER NOT NULL,
+        step VARCHAR NOT NULL,
+        last_rowid INTEGER NOT NULL,
+        rows_done INTEGER NOT NULL,
+        updated_at DATETIME NOT NULL,
+        PRIMARY KEY (version, step)
+    )""",
+]
+
+def table_columns(conn, table: str) -> list:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+class Execute:
+    """A statement that is safe to repeat (CREATE ... IF NOT EXISTS, INSERT OR IGNORE, ANALYZE)."""
+
+    def __init__(self, description: str, sql: str, params=()):
+        self.description = description
+        self.sql = sql
+        self.params = params
+
+    def apply(self, conn, runner):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(self.sql, self.params) if self.params else conn.execute(self.sql)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def estimate(self, conn, runner):
+        started = time.perf_counter()
+        conn.executemany(self.sql, self.params) if self.params else conn.execute(self.sql)
+        return None, time.perf_counter() - started
+
+class AddColumn:
+    def __init__(self, table: str, column: str, column_type: str):
+        self.table = table
+        self.column = column
+        self.column_type = column_type
+        self.description = f"add column {table}.{column}"
+
+    def apply(self, conn, runner):
+        if self.column not in table_columns(conn, self.table):
+            conn.execute(f"ALTER TABLE {self.table} ADD COLUMN {self.column} {self.column_type}")
+
+    def estimate(self, conn, runner):
+        # Adding a nullable column only rewrites the schema, not the rows
+        self.apply(conn, runner)
+        return None, 0.0
+
+class Backfill:
+    """Set-based UPDATE (set_sql) or per-row Python (compute) over rowid-ordered chunks.
+
+    Only rows matching `where` are touched. The step is skipped when the
+    table lacks any of the `requires` columns.
+    """
+
+    def __init__(self, name: str, table: str, where: str, set_sql: str = None, compute=None,
+                 columns: tuple = (), targets: tuple = (), requires: tuple = ()):
+        self.name = name
+        self.table = table
+        self.where = where
+        self.set_sql = set_sql
+        self.compute = compute
+        self.columns = columns
+        self.targets = targets
+        self.requires = requires
+        self.description = f"backfill {name}"
+
+    def applicable(self, conn) -> bool:
+        present = table_columns(conn, self.table)
+        return all(column in present for column in self.requires)
+
+    def chunk_end(self, conn, after: int, batch_size: int):
+        return conn.execute(
+            f"SELECT max(rowid) FROM (SELECT rowid FROM {self.table} WHERE rowid > ? ORDER BY rowid LIMIT ?)",
+            (after, batch_size)
+        ).fetchone()[0]
+
+    def update_chunk(self, conn, after: int, until: int) -> int:
+        if self.set_sql:
+            return conn.execute(
+                f"UPDATE {self.table} SET {self.set_sql} WHERE rowid > ? AND rowid <= ? AND ({self.where})",
+                (after, until)
+            ).rowcount
+        rows = conn.execute(
+            f"SELECT rowid, {', '.join(self.columns)} FROM {self.table} "
+            f"WHERE rowid > ? AND rowid <= ? AND ({self.where})",
+            (after, until)
+        ).fetchall()
+        updates = [(*self.compute(*row[1:]), row[0]) for row in rows]
+        if updates:
+            targets = ", ".join(f"{column} = ?" for column in self.targets)
+            conn.executemany(f"UPDATE {self.table} SET {targets} WHERE rowid = ?", updates)
+        return len(updates)
+
+    def remaining(self, conn, after: int) -> int:
+        return conn.execute(
+            f"SELECT count(*) FROM {self.table} WHERE rowid > ? AND ({self.where})", (after,)
+        ).fetchone()[0]
+
+    def apply(self, conn, runner):
+        if not self.applicable(conn):
+            print(f"  skipped: {self.table} has no {', '.join(self.requires)} column")
+            return
+        after, done = runner.checkpoint(conn, self.name)
+        if after:
+            print(f"  resuming after rowid {after} ({done} rows already updated)")
+        started = time.perf_counter()
+        while True:
+            until = self.chunk_end(conn, after, runner.batch_size)
+            if until is None:
+                break
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                done += self.update_chunk(conn, after, until)
+                runner.save_checkpoint(conn, self.name, until, done)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            after = until
+            elapsed = time.perf_counter() - started
+            print(f"  {self.name}: {done} rows updated, at rowid {after} ({elapsed:.1f}s)", flush=True)
+
+    def estimate(self, conn, runner):
+        if not self.applicable(conn):
+            return 0, 0.0
+        after, _ = runner.checkpoint(conn, self.name)
+        rows = self.remaining(conn, after)
+        until = self.chunk_end(conn, after, runner.batch_size)
+        if not rows or until is None:
+            return rows, 0.0
+        # Time one chunk (rolled back with the rest of the dry run) and scale by the chunk count
+        started = time.perf_counter()
+        self.update_chunk(conn, after, until)
+        elapsed = time.perf_counter() - started
+        scanned = conn.execute(f"SELECT count(*) FROM {self.table} WHERE rowid > ?", (after,)).fetchone()[0]
+        return rows, elapsed * -(-scanned // runner.batch_size)
+
+class RollupBackfill:
+    """Recompute request_rollups_hourly from emergency_requests, `hours` of history per transaction.
+
+    Uses the same slice statements as rebuild_rollups.py. Hours already moved
+    to the archive are left alone. The checkpoint records the end of the last
+    committed slice, in hours since the epoch.
+    """
+    description = "backfill request_rollups_hourly"
+    name = "request_rollups_hourly"
+    EPOCH = datetime(1970, 1, 1)
+
+    def __init__(self, hours: int = 24):
+        self.hours = hours
+
+    def slices(self, conn, runner) -> list:
+        first, last = conn.execute("SELECT min(timestamp), max(timestamp) FROM emergency_requests").fetchone()
+        if first is None:
+            return []
+        first = datetime.fromisoformat(first).replace(minute=0, second=0, microsecond=0)
+        archived_until = conn.execute("SELECT max(max_timestamp) FROM archive_parts").fetchone()[0]
+        if archived_until:
+            first = max(first, datetime.fromisoformat(archived_until).replace(minute=0, second=0, microsecond=0)
+                        + timedelta(hours=1))
+        after, _ = runner.checkpoint(conn, self.name)
+        if after:
+            first = max(first, self.EPOCH + timedelta(hours=after))
+        last = datetime.fromisoformat(last)
+        step = timedelta(hours=self.hours)
+        slices = []
+        while first <= last:
+            slices.append((first, first + step))
+            first += step
+        return slices
+
+    def rebuild_slice(self, conn, start: datetime, end: datetime) -> int:
+        params = {"start": start.isoformat(" "), "end": end.isoformat(" ")}
+        conn.execute(models.ROLLUP_DELETE_SLICE, params)
+        return conn.execute(models.ROLLUP_INSERT_SLICE, params).rowcount
+
+    def apply(self, conn, runner):
+        _, done = runner.checkpoint(conn, self.name)
+        started = time.perf_counter()
+        for start, end in self.slices(conn, runner):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                done += self.rebuild_slice(conn, start, end)
+                runner.save_checkpoint(conn, self.name, (end - self.EPOCH) // timedelta(hours=1), done)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            elapsed = time.perf_counter() - started
+            print(f"  {self.name}: {done} rollup rows, up to {end:%Y-%m-%d %H:%M} ({elapsed:.1f}s)", flush=True)
+
+    def estimate(self, conn, runner):
+        slices = self.slices(conn, runner)
+        if not slices:
+            return 0, 0.0
+        rows = conn.execute("SELECT count(*) FROM emergency_requests WHERE timestamp >= ?",
+                            (slices[0][0].isoformat(" "),)).fetchone()[0]
+        # Time one slice (rolled back with the rest of the dry run) and scale by the slice count
+        started = time.perf_counter()
+        self.rebuild_slice(conn, *slices[len(slices) // 2])
+        return rows, (time.perf_counter() - started) * len(slices)
+
+class CreateSchema:
+    """Create whatever is missing of the current schema (tables, indexes, triggers, search index)."""
+    description = "create missing tables, indexes and triggers"
+
+    def apply(self, conn, runner):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            apply_schema(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def estimate(self, conn, runner):
+        started = time.perf_counter()
+        apply_schema(conn)
+        return None, time.perf_counter() - started
+
+class Migration:
+    def __init__(self, version: int, name: str, steps: list):
+        self.version = version
+        self.name = name
+        self.steps = steps
+
+# --- v2: request types/subtypes as codes (replaces migrate_v2.py) ---
+TYPE_CODES = {
+    "Report attack": "ATTACK",
+    "Report injury/casualty": "INJURY",
+    "Find medical services": "MEDICAL",
+    "Call helpline": "HELPLINE"
+}
+SUBTYPE_CODES = {
+    "Bullets": ("BULLETS", "ATTACK"),
+    "Enemy drones": ("DRONES", "ATTACK"),
+    "Heavy artillery / Bomblasts / Missiles": ("ARTILLERY", "ATTACK"),
+    "Life threatening injury": ("LIFE_THREAT", "INJURY"),
+    "Death": ("DEATH", "INJURY"),
+    "Minor injuries": ("MINOR", "INJURY")
+}
+
+def case_sql(column: str, mapping: dict) -> str:
+    whens = " ".join(f"WHEN '{old}' THEN '{new}'" for old, new in mapping.items())
+    return f"CASE {column} {whens} END"
+
+def compute_geohash(latitude, longitude):
+    return (geohash.encode(latitude, longitude),)
+
+MIGRATIONS = [
+    Migration(2, "normalize_request_types", [
+        Execute("create request_types", """CREATE TABLE IF NOT EXISTS request_types (
+            type_code VARCHAR PRIMARY KEY,
+            type_name VARCHAR NOT NULL
+        )"""),
+        Execute("create request_subtypes", """CREATE TABLE IF NOT EXISTS request_subtypes (
+            subtype_code VARCHAR PRIMARY KEY,
+            subtype_name VARCHAR NOT NULL,
+            type_code VARCHAR NOT NULL REFERENCES request_types (type_code)
+        )"""),
+        Execute("seed request_types", "INSERT OR IGNORE INTO request_types (type_code, type_name) VALUES (?, ?)",
+                [(code, name) for name, code in TYPE_CODES.items()]),
+        Execute("seed request_subtypes",
+                "INSERT OR IGNORE INTO request_subtypes (subtype_code, subtype_name, type_code) VALUES (?, ?, ?)",
+                [(code, name, type_code) for name, (code, type_code) in SUBTYPE_CODES.items()]),
+        AddColumn("emergency_requests", "type_code", "VARCHAR"),
+        AddColumn("emergency_requests", "subtype_code", "VARCHAR"),
+        Backfill(
+            "type_code/subtype_code", "emergency_requests",
+            where="type_code IS NULL AND request_type IS NOT NULL",
+            set_sql=f"type_code = {case_sql('request_type', TYPE_CODES)}, "
+                    f"subtype_code = {case_sql('sub_type', {name: code for name, (code, _) in SUBTYPE_CODES.items()})}",
+            requires=("request_type", "sub_type")
+        ),
+    ]),
+    # --- v3: indexes for the submit throttle, admin filters and keyset pagination ---
+    Migration(3, "request_indexes", [
+        Execute("index user_id/timestamp",
+                "CREATE INDEX IF NOT EXISTS ix_emergency_requests_user_id_timestamp ON emergency_requests (user_id, timestamp)"),
+        Execute("index type/subtype/timestamp",
+                "CREATE INDEX IF NOT EXISTS ix_emergency_requests_type_subtype_timestamp "
+                "ON emergency_requests (type_code, subtype_code, timestamp)"),
+        Execute("index timestamp/request_id",
+                "CREATE INDEX IF NOT EXISTS ix_emergency_requests_timestamp_request_id ON emergency_requests (timestamp, request_id)"),
+        Execute("analyze", "ANALYZE emergency_requests"),
+    ]),
+    # --- v4: geohash column for map clustering ---
+    Migration(4, "geohash", [
+        AddColumn("emergency_requests", "geohash", "VARCHAR"),
+        Backfill("geohash", "emergency_requests", where="geohash IS NULL",
+                 compute=compute_geohash, columns=("latitude", "longitude"), targets=("geohash",)),
+        Execute("index geohash/type",
+                "CREATE INDEX IF NOT EXISTS ix_emergency_requests_geohash_type ON emergency_requests (geohash, type_code)"),
+    ]),
+    # --- v5: idempotency keys for batch ingest ---
+    Migration(5, "idempotency_key", [
+        AddColumn("emergency_requests", "idempotency_key", "VARCHAR"),
+        Execute("unique index idempotency_key",
+                "CREATE UNIQUE INDEX IF NOT EXISTS ux_emergency_requests_idempotency_key "
+                "ON emergency_requests (idempotency_key)"),
+    ]),
+    # --- v6: incident clustering (the incidents table itself is created by v7) ---
+    Migration(6, "incident_id", [
+        AddColumn("emergency_requests", "incident_id", "VARCHAR"),
+        Execute("index incident_id",
+                "CREATE INDEX IF NOT EXISTS ix_emergency_requests_incident_id ON emergency_requests (incident_id)"),
+    ]),
+    # --- v7: the app no longer runs create_all at startup; add what it used to create,
+    # and fill the hourly rollups the stats API reads ---
+    Migration(7, "app_schema", [CreateSchema(), RollupBackfill()]),
+    # --- v8: geofences and their delivery outbox ---
+    Migration(8, "geofences", [CreateSchema()]),
+    # --- v9: search triggers that index requests without details too ---
+    Migration(9, "search_every_request", [
+        *[Execute(f"drop trigger {name}", f"DROP TRIGGER IF EXISTS {name}") for name in search.TRIGGERS],
+        CreateSchema(),
+        Execute("rebuild search index", search.REBUILD),
+    ]),
+    # --- v10: idempotency keys in their own table, which archiving leaves alone ---
+    Migration(10, "idempotency_keys", [
+        CreateSchema(),
+        Execute("copy idempotency keys",
+                "INSERT OR IGNORE INTO idempotency_keys (idempotency_key, request_id, created_at) "
+                "SELECT idempotency_key, request_id, timestamp FROM emergency_requests WHERE idempotency_key IS NOT NULL"),
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+def _executor(conn):
+    # DB-API connections (sqlite3) and SQLAlchemy connections (via run_sync) alike
+    return conn.exec_driver_sql if hasattr(conn, "exec_driver_sql") else conn.execute
+
+def schema_version(conn):
+    """The latest applied migration, 0 if none is recorded, or None for a database without the schema."""
+    execute = _executor(conn)
+    tables = {row[0] for row in execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if "emergency_requests" not in tables:
+        return None
+    if "schema_migrations" not in tables:
+        return 0
+    return execute("SELECT coalesce(max(version), 0) FROM schema_migrations").fetchone()[0]
+
+def schema_statements(indexes: bool = True) -> list:
+    """CREATE ... IF NOT EXISTS statements for every table in models.py, and optionally their indexes."""
+    dialect = sqlite.dialect()
+    statements = BOOKKEEPING + [
+        str(CreateTable(table, if_not_exists=True).compile(dialect=dialect)) for table in models.Base.metadata.sorted_tables
+    ]
+    if indexes:
+        statements += [
+            str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect))
+            for table in models.Base.metadata.sorted_tables for index in table.indexes
+        ]
+    return statements
+
+def apply_schema(conn, indexes: bool = True):
+    """Create what is missing of the schema; without indexes, only the tables (for bulk loading).
+
+    With indexes this also adds the triggers and the search index, which is
+    filled from existing rows if it was just created.
+    """
+    execute = _executor(conn)
+    for statement in schema_statements(indexes):
+        execute(statement)
+    if not indexes:
+        return
+    for statement in models.TABLE_VERSION_DDL:
+        execute(statement)
+    if search.create_index(conn):
+        execute(search.REBUILD)
+
+def create_schema(conn):
+    """Set up a fresh database: the full schema, reference data, and every migration marked applied."""
+    execute = _executor(conn)
+    apply_schema(conn)
+    for code, name in models.DEFAULT_REQUEST_TYPES.items():
+        execute("INSERT OR IGNORE INTO request_types (type_code, type_name) VALUES (?, ?)", (code, name))
+    for code, (name, type_code) in models.DEFAULT_REQUEST_SUBTYPES.items():
+        execute("INSERT OR IGNORE INTO request_subtypes (subtype_code, subtype_name, type_code) VALUES (?, ?, ?)",
+                (code, name, type_code))
+    applied_at = datetime.utcnow().isoformat(" ")
+    for migration in MIGRATIONS:
+        execute("INSERT OR IGNORE INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)",
+                (migration.version, migration.name, applied_at))
+
+class MigrationRunner:
+    def __init__(self, db_path: str = DB_PATH, batch_size: int = BATCH_SIZE):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.version = None
+
+    def connect(self):
+        if not os.path.exists(self.db_path):
+            raise SystemExit(f"{self.db_path} does not exist; start the app once to create the schema.")
+        # Autocommit mode: every transaction below is explicit
+        conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=30)
+        conn.execute("PRAGMA busy_timeout=30000")
+        if "emergency_requests" not in {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}:
+            raise SystemExit("emergency_requests does not exist; start the app once to create the schema.")
+        for statement in BOOKKEEPING:
+            conn.execute(statement)
+        return conn
+
+    def applied(self, conn) -> dict:
+        return dict(conn.execute("SELECT version, applied_at FROM schema_migrations"))
+
+    def pending(self, conn, target: int = None) -> list:
+        applied = self.applied(conn)
+        return [m for m in MIGRATIONS if m.version not in applied and (target is None or m.version <= target)]
+
+    def checkpoint(self, conn, step: str) -> tuple:
+        row = conn.execute(
+            "SELECT last_rowid, rows_done FROM migration_checkpoints WHERE version = ? AND step = ?",
+            (self.version, step)
+        ).fetchone()
+        return tuple(row) if row else (0, 0)
+
+    def save_checkpoint(self, conn, step: str, last_rowid: int, rows_done: int):
+        conn.execute(
+            "INSERT INTO migration_checkpoints (version, step, last_rowid, rows_done, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(version, step) DO UPDATE SET last_rowid = excluded.last_rowid, "
+            "rows_done = excluded.rows_done, updated_at = excluded.updated_at",
+            (self.version, step, last_rowid, rows_done, datetime.utcnow().isoformat(" "))
+        )
+
+    def migrate(self, target: int = None):
+        conn = self.connect()
+        try:
+            pending = self.pending(conn, target)
+            if not pending:
+                print("Database is up to date.")
+            for migration in pending:
+                self.version = migration.version
+                print(f"Applying v{migration.version} {migration.name}")
+                started = time.perf_counter()
+                for step in migration.steps:
+                    print(f"  {step.description}")
+                    step.apply(conn, self)
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)",
+                             (migration.version, migration.name, datetime.utcnow().isoformat(" ")))
+                conn.execute("DELETE FROM migration_checkpoints WHERE version = ?", (migration.version,))
+                conn.execute("COMMIT")
+                print(f"Applied v{migration.version} in {time.perf_counter() - started:.1f}s")
+        except KeyboardInterrupt:
+            print("Interrupted; run again to resume from the last checkpoint.")
+        finally:
+            conn.close()
+
+    def dry_run(self, target: int = None):
+        """Run every pending step inside one transaction that is rolled back.
+
+        DDL and index builds are timed in full; backfills are timed on one
+        chunk and extrapolated to the rows that still need updating.
+        """
+        conn = self.connect()
+        total = 0.0
+        try:
+            pending = self.pending(conn, target)
+            if not pending:
+                print("Database is up to date.")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for migration in pending:
+                    self.version = migration.version
+                    print(f"v{migration.version} {migration.name}")
+                    for step in migration.steps:
+                        rows, seconds = step.estimate(conn, self)
+                        total += seconds
+                        count = f"{rows} rows, " if rows is not None else ""
+                        print(f"  {step.description:<48} {count}~{seconds:.2f}s")
+            finally:
+                conn.execute("ROLLBACK")
+            if pending:
+                print(f"Estimated total: ~{total:.1f}s (nothing was changed)")
+        finally:
+            conn.close()
+
+    def status(self):
+        conn = self.connect()
+        try:
+            applied = self.applied(conn)
+            for migration in MIGRATIONS:
+                state = f"applied {applied[migration.version]}" if migration.version in applied else "pending"
+                print(f"v{migration.version} {migration.name:<28} {state}")
+                for step, last_rowid, rows_done in conn.execute(
+                    "SELECT step, last_rowid, rows_done FROM migration_checkpoints WHERE version = ?", (migration.version,)
+                ):
+                    print(f"    checkpoint {step}: {rows_done} rows, at rowid {last_rowid}")
+        finally:
+            conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations to emergency.db.")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database path")
+    parser.add_argument("--target", type=int, help="stop after this version")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per backfill transaction")
+    parser.add_argument("--dry-run", action="store_true", help="estimate row counts and runtime without changing anything")
+    parser.add_argument("--status", action="store_true", help="show applied and pending migrations")
+    args = parser.parse_args()
+    runner = MigrationRunner(args.db, args.batch_size)
+    if args.status:
+        runner.status()
+    elif args.dry_run:
+        runner.dry_run(args.target)
+    else:
+        runner.migrate(args.target)
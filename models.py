@@ -0,0 +1,199 @@
+import uuid
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index, literal_column
+from sqlalchemy.orm import declarative_base, relationship
+
+# The database schema, shared by the app, the migrations and the scripts. It
+# imports nothing but SQLAlchemy's ORM, so scripts that only need the tables
+# do not pay for FastAPI or the async engine. The schema is created and
+# versioned by migrations.py, not by create_all at startup.
+
+Base = declarative_base()
+
+class User(Base):
+    __tablename__ = "users"
+    user_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    phone = Column(String, unique=True, nullable=False)
+    name = Column(String, nullable=True)
+    surname = Column(String, nullable=True)
+    requests = relationship("EmergencyRequest", back_populates="user")
+
+class RequestType(Base):
+    __tablename__ = "request_types"
+    type_code = Column(String, primary_key=True)
+    type_name = Column(String, nullable=False)
+    subtypes = relationship("RequestSubType", back_populates="type")
+
+class RequestSubType(Base):
+    __tablename__ = "request_subtypes"
+    subtype_code = Column(String, primary_key=True)
+    subtype_name = Column(String, nullable=False)
+    type_code = Column(String, ForeignKey("request_types.type_code"), nullable=False)
+    type = relationship("RequestType", back_populates="subtypes")
+
+class EmergencyRequest(Base):
+    __tablename__ = "emergency_requests"
+    request_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.user_id"), nullable=False)
+    name = Column(String, nullable=False)  # Encrypted
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    details = Column(String, nullable=True)
+    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
+    type_code = Column(String, ForeignKey("request_types.type_code"), nullable=True)
+    subtype_code = Column(String, ForeignKey("request_subtypes.subtype_code"), nullable=True)
+    geohash = Column(String, nullable=True)
+    idempotency_key = Column(String, nullable=True)
+    incident_id = Column(String, nullable=True)
+    user = relationship("User", back_populates="requests")
+    __table_args__ = (
+        Index("ix_emergency_requests_user_id_timestamp", "user_id", "timestamp"),
+        Index("ix_emergency_requests_type_subtype_timestamp", "type_code", "subtype_code", "timestamp"),
+        Index("ix_emergency_requests_timestamp_request_id", "timestamp", "request_id"),
+        Index("ix_emergency_requests_geohash_type", "geohash", "type_code"),
+        Index("ux_emergency_requests_idempotency_key", "idempotency_key", unique=True),
+        Index("ix_emergency_requests_incident_id", "incident_id"),
+    )
+
+REQUEST_ROWID = literal_column("emergency_requests.rowid")
+
+# Reference data seeded into request_types/request_subtypes on a fresh database
+DEFAULT_REQUEST_TYPES = {
+    "ATTACK": "Report attack",
+    "INJURY": "Report injury/casualty",
+    "MEDICAL": "Find medical services",
+    "HELPLINE": "Call helpline"
+}
+DEFAULT_REQUEST_SUBTYPES = {
+    "BULLETS": ("Bullets", "ATTACK"),
+    "DRONES": ("Enemy drones", "ATTACK"),
+    "ARTILLERY": ("Heavy artillery / Bomblasts / Missiles", "ATTACK"),
+    "LIFE_THREAT": ("Life threatening injury", "INJURY"),
+    "DEATH": ("Death", "INJURY"),
+    "MINOR": ("Minor injuries", "INJURY")
+}
+
+# Ingest idempotency keys and the request each one created. Kept out of
+# emergency_requests so they outlive archiving: a retry of a report that has
+# since moved to the archive is still answered as a duplicate.
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    idempotency_key = Column(String, primary_key=True)
+    request_id = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+# Per-hour x type x subtype x grid-cell request counts, kept up to date on every
+# insert so analytics never have to scan emergency_requests.
+class RequestRollup(Base):
+    __tablename__ = "request_rollups_hourly"
+    hour = Column(DateTime, primary_key=True)
+    type_code = Column(String, primary_key=True, default="")
+    subtype_code = Column(String, primary_key=True, default="")
+    cell = Column(String, primary_key=True, default="")
+    count = Column(Integer, nullable=False, default=0)
+
+ROLLUP_CELL_PRECISION = 4  # geohash precision of the rollup grid (~39km x 20km)
+
+# Recomputing the rollups of [:start, :end) from emergency_requests, shared by
+# rebuild_rollups.py and the v7 migration
+ROLLUP_DELETE_SLICE = "DELETE FROM request_rollups_hourly WHERE hour >= :start AND hour < :end"
+ROLLUP_INSERT_SLICE = f"""
+    INSERT INTO request_rollups_hourly (hour, type_code, subtype_code, cell, count)
+    SELECT strftime('%Y-%m-%d %H:00:00.000000', timestamp),
+           coalesce(type_code, ''),
+           coalesce(subtype_code, ''),
+           coalesce(substr(geohash, 1, {ROLLUP_CELL_PRECISION}), ''),
+           count(*)
+    FROM emergency_requests
+    WHERE timestamp >= :start AND timestamp < :end
+    GROUP BY 1, 2, 3, 4
+"""
+
+# Cold tier: requests moved out by archive_requests.py into Parquet parts
+class ArchivePart(Base):
+    __tablename__ = "archive_parts"
+    path = Column(String, primary_key=True)  # relative to ARCHIVE_DIR
+    month = Column(String, nullable=False)
+    min_timestamp = Column(DateTime, nullable=False)
+    max_timestamp = Column(DateTime, nullable=False)
+    min_rowid = Column(Integer, nullable=False)
+    max_rowid = Column(Integer, nullable=False)
+    rows = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+# Change counters for tables that are edited in place, so API responses can
+# tell cheaply whether anything changed. Bumped by triggers on every write
+# path; emergency_requests only grows, so its rowid high-water mark is used.
+class TableVersion(Base):
+    __tablename__ = "table_versions"
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+VERSIONED_TABLES = ("users", "geofences")
+TABLE_VERSION_DDL = [
+    f"INSERT OR IGNORE INTO table_versions (table_name, version) VALUES ('{table}', 0)" for table in VERSIONED_TABLES
+] + [
+    f"""CREATE TRIGGER IF NOT EXISTS {table}_version_{op.lower()} AFTER {op} ON {table} BEGIN
+        UPDATE table_versions SET version = version + 1 WHERE table_name = '{table}';
+    END"""
+    for table in VERSIONED_TABLES for op in ("INSERT", "UPDATE", "DELETE")
+]
+
+# Incidents: clusters of ATTACK/INJURY reports, maintained by incidents.py
+class Incident(Base):
+    __tablename__ = "incidents"
+    incident_id = Column(String, primary_key=True)
+    type_code = Column(String, nullable=False)  # of the most severe report
+    subtype_code = Column(String, nullable=True)
+    latitude = Column(Float, nullable=False)  # centroid of the reports
+    longitude = Column(Float, nullable=False)
+    first_seen = Column(DateTime, nullable=False)
+    last_seen = Column(DateTime, nullable=False)
+    reports = Column(Integer, nullable=False)
+    severity = Column(Float, nullable=False)
+    priority = Column(Float, nullable=False)
+    merged_into = Column(String, nullable=True)
+    __table_args__ = (Index("ix_incidents_last_seen", "last_seen"),)
+
+# Geofences registered by responders and units, matched in memory by
+# geofences.py. geometry is the normalised circle or GeoJSON Polygon; cells is
+# the precomputed geohash covering so loading the index does no geometry.
+class Geofence(Base):
+    __tablename__ = "geofences"
+    geofence_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    name = Column(String, nullable=False)
+    subscriber = Column(String, nullable=False)
+    kind = Column(String, nullable=False)  # circle | Polygon
+    geometry = Column(String, nullable=False)
+    min_lat = Column(Float, nullable=False)
+    min_lon = Column(Float, nullable=False)
+    max_lat = Column(Float, nullable=False)
+    max_lon = Column(Float, nullable=False)
+    cells = Column(String, nullable=False)  # space separated
+    type_codes = Column(String, nullable=True)  # space separated; NULL matches all
+    subtype_codes = Column(String, nullable=True)
+    active = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    __table_args__ = (Index("ix_geofences_subscriber", "subscriber"),)
+
+# Transactional outbox: one row per (request, geofence) match, written in the
+# same transaction as the request and handed to the delivery channel by a
+# background task. A claimed row is 'sending' until available_at, after which
+# another worker may claim it again.
+class GeofenceOutbox(Base):
+    __tablename__ = "geofence_outbox"
+    outbox_id = Column(Integer, primary_key=True)
+    geofence_id = Column(String, nullable=False)
+    subscriber = Column(String, nullable=False)
+    request_id = Column(String, nullable=False)
+    payload = Column(String, nullable=False)  # JSON
+    status = Column(String, nullable=False, default="pending")  # pending | sending | delivered | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    delivered_at = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    __table_args__ = (
+        Index("ix_geofence_outbox_status_available", "status", "available_at"),
+        Index("ix_geofence_outbox_request_id", "request_id"),
+    )
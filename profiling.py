@@ -0,0 +1,122 @@
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+# On-demand profiles of slow requests. An admin arms the profiler for a path
+# prefix; the next matching requests run with a sampler that records the
+# event loop thread's Python stack every few milliseconds from a background
+# thread. Requests slower than the threshold keep their profile, as collapsed
+# stacks ("outer;inner;leaf count" lines) that flamegraph.pl or speedscope
+# read directly. Unarmed, nothing runs and requests pay nothing.
+#
+# The loop thread runs every task, so a profile shows what the loop was doing
+# while the request was in flight, including other requests' work and idle
+# time in the selector.
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler:
+    """Samples one thread's stack every `interval` seconds until stopped."""
+
+    def __init__(self, thread_id: int, interval: float = 0.005, max_depth: int = 64):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self) -> Counter:
+        """Stop sampling and return the stacks so far; does not wait for the thread.
+
+        stop() runs on the event loop, so it only signals the daemon thread,
+        which exits at its next wake-up, and returns a copy (taken in one
+        step under the GIL) that a sample landing late cannot change.
+        """
+        self.stopped.set()
+        return Counter(self.stacks)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None and len(names) < self.max_depth:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+                self.samples += 1
+
+class SlowRequestProfiler:
+    """Profiles requests on demand and keeps the slow ones.
+
+    arm() sets which requests to sample and how many profiles to capture;
+    the middleware calls begin() for each request and finish() when it ends.
+    One request is sampled at a time.
+    """
+
+    def __init__(self, interval: float = 0.005, keep: int = 20):
+        self.interval = interval
+        self.profiles = deque(maxlen=keep)
+        self.ids = itertools.count(1)
+        self.path_prefix = None
+        self.min_seconds = 0.0
+        self.remaining = 0
+        self.active = None
+
+    def arm(self, path_prefix: str, min_seconds: float, count: int = 1):
+        self.path_prefix = path_prefix
+        self.min_seconds = min_seconds
+        self.remaining = count
+
+    def disarm(self):
+        self.remaining = 0
+
+    def begin(self, path: str):
+        """A started sampler if this request should be profiled, else None."""
+        if self.remaining <= 0 or self.active is not None or not path.startswith(self.path_prefix):
+            return None
+        self.active = StackSampler(threading.get_ident(), self.interval)
+        self.active.start()
+        return self.active
+
+    def finish(self, sampler: StackSampler, method: str, route: str, seconds: float, status: int):
+        stacks = sampler.stop()
+        self.active = None
+        if seconds < self.min_seconds or self.remaining <= 0:
+            return
+        self.remaining -= 1
+        self.profiles.append({
+            "profile_id": next(self.ids),
+            "method": method,
+            "route": route,
+            "status": status,
+            "duration_ms": round(seconds * 1000, 1),
+            "samples": sum(stacks.values()),
+            "captured_at": time.time(),
+            "stacks": stacks,
+        })
+
+    def get(self, profile_id: int):
+        return next((p for p in self.profiles if p["profile_id"] == profile_id), None)
+
+    def stats(self) -> dict:
+        return {
+            "armed": self.remaining > 0,
+            "path_prefix": self.path_prefix,
+            "min_ms": round(self.min_seconds * 1000, 1),
+            "remaining": self.remaining,
+            "profiles": [{k: v for k, v in p.items() if k != "stacks"} for p in self.profiles],
+        }
+
+def collapsed_stacks(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
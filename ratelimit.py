@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import time
+from threading import Lock
+
+
+class MemoryBackend:
+    """Per-process limiter state: one float (theoretical arrival time) per key."""
+
+    def __init__(self, evict_interval: float = 60):
+        self.tats = {}
+        self.evict_interval = evict_interval
+        self._next_evict = time.time() + evict_interval
+        self._lock = Lock()
+
+    def update(self, key: str, now: float, decide):
+        with self._lock:
+            if now >= self._next_evict:
+                self.evict(now)
+            new_tat, allowed = decide(self.tats.get(key, now))
+            if allowed:
+                self.tats[key] = new_tat
+            return allowed, new_tat
+
+    def evict(self, now: float):
+        # A key whose TAT has passed is indistinguishable from a new one
+        for key in [k for k, tat in self.tats.items() if tat <= now]:
+            del self.tats[key]
+        self._next_evict = now + self.evict_interval
+
+    def __len__(self):
+        return len(self.tats)
+
+
+class SQLiteBackend:
+    """Limiter state in a small SQLite file shared by every worker process.
+
+    Each update is one short IMMEDIATE transaction, so concurrent workers
+    serialize on the file lock and limits hold across `uvicorn --workers N`.
+    """
+
+    def __init__(self, path: str, evict_interval: float = 60):
+        self.path = path
+        self.evict_interval = evict_interval
+        self._next_evict = time.time() + evict_interval
+        self._lock = Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self):
+        # Opened lazily and per process, so the backend survives a pre-fork import
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Losing the last few limiter updates on power loss is harmless
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tat REAL NOT NULL) WITHOUT ROWID"
+            )
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def update(self, key: str, now: float, decide):
+        with self._lock:
+            conn = self._connection()
+            if now >= self._next_evict:
+                self.evict(now)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tat FROM rate_limits WHERE key = ?", (key,)).fetchone()
+                new_tat, allowed = decide(row[0] if row else now)
+                if allowed:
+                    conn.execute(
+                        "INSERT INTO rate_limits (key, tat) VALUES (?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET tat = excluded.tat",
+                        (key, new_tat)
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return allowed, new_tat
+
+    def evict(self, now: float):
+        self._connection().execute("DELETE FROM rate_limits WHERE tat <= ?", (now,))
+        self._next_evict = now + self.evict_interval
+
+    def __len__(self):
+        return self._connection().execute("SELECT count(*) FROM rate_limits").fetchone()[0]
+
+
+class RateLimiter:
+    """GCRA limiter: at most `limit` hits per `period` seconds per key.
+
+    Capacity refills continuously (one hit every period/limit seconds), and
+    each key costs a single stored timestamp.
+    """
+
+    def __init__(self, limit: int, period: float, backend):
+        self.limit = limit
+        self.period = period
+        self.interval = period / limit
+        self.backend = backend
+
+    def hit(self, key: str, enforce: bool = True, now: float = None) -> bool:
+        """Count a hit for key; returns False (and counts nothing) when over the limit.
+
+        With enforce=False the hit is always allowed but still counted, so it
+        uses up capacity for later enforced hits.
+        """
+        now = time.time() if now is None else now
+
+        def decide(tat):
+            new_tat = max(tat, now) + self.interval
+            if not enforce:
+                return min(new_tat, now + self.period), True
+            return new_tat, new_tat - now <= self.period
+
+        allowed, _ = self.backend.update(key, now, decide)
+        return allowed
+
+
+def make_backend(kind: str, path: str = None):
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(path)
+    raise ValueError(f"Unknown rate limit backend: {kind}")
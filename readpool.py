@@ -0,0 +1,98 @@
+import asyncio
+import time
+from sqlalchemy import event
+
+# Read-only connections for the admin dashboard and analytics. They come from
+# their own engine, so a heavy scan never holds a connection that /submit
+# needs, and WAL lets them read while the writer commits. ReadGate caps how
+# many reads run at once (each holds one connection and some event loop time)
+# and make_read_only() interrupts statements that run past their time limit.
+
+PROGRESS_STEPS = 10000  # SQLite VM steps between time-limit checks
+
+def make_read_only(sync_engine, default_timeout):
+    """Make sync_engine's connections read-only and give statements a time limit.
+
+    The limit is default_timeout seconds, or the statement's "read_timeout"
+    execution option (None for no limit, e.g. exports). A statement past its
+    limit fails with sqlite3's OperationalError "interrupted"; the check runs
+    while rows are produced, so it also covers fetching.
+    """
+    @event.listens_for(sync_engine, "connect")
+    def read_only(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA query_only=1")
+        cursor.close()
+        deadline = connection_record.info["read_deadline"] = [None]
+
+        def past_deadline():
+            return deadline[0] is not None and time.monotonic() > deadline[0]
+
+        dbapi_connection.run_async(lambda conn: conn.set_progress_handler(past_deadline, PROGRESS_STEPS))
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_clock(conn, cursor, statement, parameters, context, executemany):
+        timeout = context.execution_options.get("read_timeout", default_timeout)
+        conn.info["read_deadline"][0] = None if timeout is None else time.monotonic() + timeout
+
+    @event.listens_for(sync_engine, "checkin")
+    def stop_clock(dbapi_connection, connection_record):
+        if "read_deadline" in connection_record.info:
+            connection_record.info["read_deadline"][0] = None
+
+def is_interrupted(error) -> bool:
+    return "interrupted" in str(getattr(error, "orig", error)).lower()
+
+class ReadLease:
+    """One slot of a ReadGate; release() is idempotent."""
+    __slots__ = ("gate", "released")
+
+    def __init__(self, gate: "ReadGate"):
+        self.gate = gate
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.gate.active -= 1
+            self.gate.slots.release()
+
+class ReadGate:
+    """At most `limit` concurrent reads; others queue for up to wait_timeout seconds."""
+
+    def __init__(self, limit: int, wait_timeout: float):
+        self.limit = limit
+        self.wait_timeout = wait_timeout
+        self.slots = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self.granted = 0
+        self.rejected = 0
+        self.interrupted = 0
+
+    async def lease(self, wait: bool = False):
+        """A ReadLease, or None if no slot freed up in time (wait=True waits indefinitely)."""
+        self.waiting += 1
+        try:
+            if wait:
+                await self.slots.acquire()
+            else:
+                await asyncio.wait_for(self.slots.acquire(), self.wait_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return None
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        self.granted += 1
+        return ReadLease(self)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "granted": self.granted,
+            "rejected": self.rejected,
+            "interrupted": self.interrupted,
+        }
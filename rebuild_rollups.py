@@ -0,0 +1,47 @@
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import text
+import models
+from main import engine, prepare_database
+
+# Backfills request_rollups_hourly from emergency_requests, one time slice per
+# transaction. Each slice is deleted and recomputed atomically, so this is safe
+# to run while the app keeps incrementing rollups for new submissions.
+
+DELETE_SLICE = text(models.ROLLUP_DELETE_SLICE)
+INSERT_SLICE = text(models.ROLLUP_INSERT_SLICE)
+
+async def rebuild(batch_hours: int):
+    await prepare_database()
+    async with engine.begin() as conn:
+        first, last = (await conn.execute(text("SELECT min(timestamp), max(timestamp) FROM emergency_requests"))).one()
+    if first is None:
+        print("No emergency requests; nothing to roll up.")
+        return
+    first = datetime.fromisoformat(first).replace(minute=0, second=0, microsecond=0)
+    # Archived hours are no longer in emergency_requests; keep their rollups
+    async with engine.connect() as conn:
+        archived_until = (await conn.execute(text("SELECT max(max_timestamp) FROM archive_parts"))).scalar()
+    if archived_until:
+        archived_until = datetime.fromisoformat(archived_until).replace(minute=0, second=0, microsecond=0)
+        first = max(first, archived_until + timedelta(hours=1))
+        print(f"Keeping rollups up to {archived_until:%Y-%m-%d %H:%M} (archived).")
+    last = datetime.fromisoformat(last)
+    step = timedelta(hours=batch_hours)
+    slice_start = first
+    while slice_start <= last:
+        slice_end = slice_start + step
+        params = {"start": slice_start.isoformat(" "), "end": slice_end.isoformat(" ")}
+        async with engine.begin() as conn:
+            await conn.execute(DELETE_SLICE, params)
+            await conn.execute(INSERT_SLICE, params)
+        print(f"Rolled up {slice_start:%Y-%m-%d %H:%M} - {slice_end:%Y-%m-%d %H:%M}")
+        slice_start = slice_end
+    print("Rollup rebuild complete.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild request_rollups_hourly from emergency_requests.")
+    parser.add_argument("--batch-hours", type=int, default=24, help="hours of history per transaction")
+    args = parser.parse_args()
+    asyncio.run(rebuild(args.batch_hours))
@@ -0,0 +1,44 @@
+import argparse
+import asyncio
+import time
+from sqlalchemy import text
+import search
+from main import engine, prepare_database
+
+# Rebuilds the FTS5 index over emergency_requests.details from the table
+# itself. Run it after a VACUUM (which may renumber rowids) or if the
+# integrity check reports a mismatch. The rebuild holds the write lock until
+# it finishes, so submissions wait meanwhile; run it in a quiet period.
+
+async def rebuild(optimize: bool, check: bool):
+    await prepare_database()
+    async with engine.begin() as conn:
+        await conn.run_sync(search.create_index)
+    if check:
+        async with engine.begin() as conn:
+            try:
+                await conn.exec_driver_sql(search.INTEGRITY_CHECK)
+                print("Search index matches emergency_requests.")
+            except Exception as e:
+                print(f"Search index integrity check failed: {e}")
+        return
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql(search.REBUILD)
+        indexed = (await conn.execute(text(
+            "SELECT count(*) FROM emergency_requests WHERE details IS NOT NULL AND details != ''"
+        ))).scalar()
+    print(f"Indexed {indexed:,} requests with details in {time.perf_counter() - started:.1f}s.")
+    if optimize:
+        started = time.perf_counter()
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql(search.OPTIMIZE)
+        print(f"Merged index segments in {time.perf_counter() - started:.1f}s.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the full-text search index over request details.")
+    parser.add_argument("--optimize", action="store_true", help="merge index segments afterwards for faster queries")
+    parser.add_argument("--check", action="store_true", help="only check that the index matches the table")
+    args = parser.parse_args()
+    engine.echo = False
+    asyncio.run(rebuild(args.optimize, args.check))
@@ -0,0 +1,140 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from starlette.responses import Response
+from cache import LRUCache
+
+# JSON responses for the admin APIs that the dashboard polls. Each response
+# carries a weak ETag built from a cheap version of the data behind it (a
+# table high-water mark, the catalog version, the query string), so a poll
+# that finds nothing new is answered with a 304 before any rows are read.
+# Bodies are encoded with orjson when it is installed and compressed with
+# brotli or gzip, whichever the client prefers.
+#
+# Last-Modified is the time this process first served an ETag, which is as
+# close to the change as a version number can tell; clients that send
+# If-None-Match (browsers do) never depend on it.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+def accepted_encoding(accept_encoding: str):
+    """The encoding to send: br or gzip, whichever Accept-Encoding prefers (br on a tie), else None."""
+    weights = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip()] = q
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for coding in ("br", "gzip") if brotli is not None else ("gzip",):
+        q = weights.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+class ConditionalJSON:
+    """Builds 200 and 304 JSON responses with validators and compression.
+
+    Bodies smaller than min_size are sent as they are; bodies over
+    thread_size are compressed on a worker thread to keep the event loop free.
+    """
+
+    def __init__(self, min_size: int = 1024, thread_size: int = 256 * 1024, gzip_level: int = 4,
+                 brotli_quality: int = 4, remember: int = 4096):
+        self.min_size = min_size
+        self.thread_size = thread_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.first_served = LRUCache(maxsize=remember)
+        self.not_modified = 0
+        self.compressed = 0
+
+    def etag(self, *parts) -> str:
+        """A weak ETag for the data identified by parts (versions, query string...)."""
+        return 'W/"%s"' % hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+    def _validators(self, etag: str) -> dict:
+        served = self.first_served.get(etag)
+        if served is None:
+            served = time.time()
+            self.first_served.set(etag, served)
+        return {"ETag": etag, "Last-Modified": formatdate(served, usegmt=True), "Vary": "Accept-Encoding"}
+
+    def _is_fresh(self, request, etag: str) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [_opaque(tag) for tag in if_none_match.split(",")]
+            return "*" in tags or _opaque(etag) in tags
+        if_modified_since = request.headers.get("if-modified-since")
+        served = self.first_served.get(etag)
+        if if_modified_since and served is not None:
+            try:
+                return int(served) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def not_modified_response(self, request, etag: str, headers: dict = None):
+        """A 304 if the client already has this version, else None."""
+        if not self._is_fresh(request, etag):
+            return None
+        self.not_modified += 1
+        return Response(status_code=304, headers={**(headers or {}), **self._validators(etag)})
+
+    async def response(self, request, data=None, body: bytes = None, etag: str = None, headers: dict = None,
+                       media_type: str = "application/json") -> Response:
+        """data (or an already encoded body) as a possibly compressed response, with validators if etag is set."""
+        if body is None:
+            body = dumps(data)
+        headers = dict(headers or {})
+        if etag is not None:
+            headers.update(self._validators(etag))
+        else:
+            headers["Vary"] = "Accept-Encoding"
+        encoding = accepted_encoding(request.headers.get("accept-encoding", "")) if len(body) >= self.min_size else None
+        if encoding:
+            if len(body) > self.thread_size:
+                body = await asyncio.to_thread(self.compress, body, encoding)
+            else:
+                body = self.compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            self.compressed += 1
+        return Response(content=body, media_type=media_type, headers=headers)
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, self.gzip_level, mtime=0)
+
+    def stats(self) -> dict:
+        return {
+            "encoder": "orjson" if orjson is not None else "json",
+            "brotli": brotli is not None,
+            "not_modified": self.not_modified,
+            "compressed": self.compressed,
+        }
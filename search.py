@@ -0,0 +1,69 @@
+import re
+from sqlalchemy import Table, MetaData, Column, Integer, String
+
+# Full-text index over emergency_requests.details: an external-content FTS5
+# table (it stores only the index, the text stays in emergency_requests) kept
+# in sync by triggers, so every write path is covered. The porter tokenizer
+# lets "bleeding" match "bleed". Every request has an entry, even without
+# details: FTS5 expects one per content row ('rebuild' creates them and the
+# integrity check compares against them), and an empty one costs a few bytes.
+#
+# The index is keyed by emergency_requests' implicit rowid, which VACUUM may
+# renumber; rebuild the index after a VACUUM (rebuild_search_index.py).
+
+SEARCH_TABLE = "emergency_requests_fts"
+MAX_TERMS = 8
+
+DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        details, content='emergency_requests', content_rowid='rowid',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert AFTER INSERT ON emergency_requests BEGIN
+        INSERT INTO {SEARCH_TABLE} (rowid, details) VALUES (new.rowid, new.details);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete AFTER DELETE ON emergency_requests BEGIN
+        INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rowid, details) VALUES ('delete', old.rowid, old.details);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update AFTER UPDATE OF details ON emergency_requests BEGIN
+        INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rowid, details) VALUES ('delete', old.rowid, old.details);
+        INSERT INTO {SEARCH_TABLE} (rowid, details) VALUES (new.rowid, new.details);
+    END""",
+]
+TRIGGERS = [f"{SEARCH_TABLE}_insert", f"{SEARCH_TABLE}_delete", f"{SEARCH_TABLE}_update"]
+REBUILD = f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('rebuild')"
+OPTIMIZE = f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')"
+INTEGRITY_CHECK = f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rank) VALUES ('integrity-check', 1)"
+
+# For queries only; the table is created by DDL above, not by create_all
+search_table = Table(SEARCH_TABLE, MetaData(), Column("rowid", Integer), Column("details", String))
+
+def create_index(conn) -> bool:
+    """Create the index and its triggers if missing (DB-API or SQLAlchemy connection).
+
+    Returns True if the index was just created; it then still has to be
+    filled from existing rows with REBUILD.
+    """
+    execute = conn.exec_driver_sql if hasattr(conn, "exec_driver_sql") else conn.execute
+    exists = execute(f"SELECT 1 FROM sqlite_master WHERE name = '{SEARCH_TABLE}'").fetchone()
+    for statement in DDL:
+        execute(statement)
+    return exists is None
+
+def match_query(text: str):
+    """FTS5 query for free text: every word must appear (as a word prefix).
+
+    Words are quoted, so FTS5 operators and punctuation in the input are
+    searched for literally instead of being parsed. None if there are no words.
+    """
+    words = re.findall(r"\w+", (text or "").lower())[:MAX_TERMS]
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+def matching_rowids(text: str):
+    """Subquery of emergency_requests rowids whose details match text, or None."""
+    match = match_query(text)
+    if match is None:
+        return None
+    return search_table.select().with_only_columns(search_table.c.rowid).where(search_table.c.details.op("MATCH")(match))
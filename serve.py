@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+
+# Pre-forking server. The parent imports main.py once, checks the database
+# schema, binds the listening socket and then forks the workers, so they
+# start from an already imported app and configuration and share those pages
+# copy-on-write instead of each holding its own copy. `uvicorn --workers N`
+# starts every worker as a fresh interpreter that imports everything again.
+#
+#   python serve.py --workers 4 --port 8000
+#
+# The parent only supervises: it forwards SIGTERM/SIGINT so each worker shuts
+# down cleanly and replaces workers that die. Nothing that holds a database
+# connection, thread or event loop is created before the fork.
+
+def bind(host: str, port: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+async def prepare(main):
+    await main.prepare_database()
+    # Connections must not be shared with the workers
+    await main.engine.dispose()
+
+def run_worker(sock: socket.socket, args):
+    import uvicorn
+    import main
+    # Ctrl-C reaches only the parent, which passes it on once
+    os.setpgid(0, 0)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    gc.enable()
+    config = uvicorn.Config(main.app, log_level=args.log_level, proxy_headers=args.proxy_headers,
+                            forwarded_allow_ips=args.forwarded_allow_ips)
+    uvicorn.Server(config).run(sockets=[sock])
+
+def serve(args):
+    # Objects created from here to the fork stay untouched by the collector,
+    # so workers do not copy the pages that hold them just to scan them
+    gc.disable()
+    import uvicorn  # noqa: F401 (preloaded for the workers)
+    import main
+    asyncio.run(prepare(main))
+    sock = bind(args.host, args.port, args.backlog)
+    gc.freeze()
+
+    workers = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(sock, args)
+            except BaseException:
+                logging.exception("Worker failed")
+                code = 1
+            finally:
+                os._exit(code)
+        workers[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(args.workers):
+        spawn()
+    logging.info(f"Serving on {args.host}:{args.port} with {args.workers} workers (parent {os.getpid()})")
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+        logging.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; starting another")
+        # A worker that dies right away would otherwise be restarted in a tight loop
+        if time.monotonic() - started < 1:
+            time.sleep(1)
+        spawn()
+    sock.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the app from N forked workers sharing one preloaded copy.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", 2)))
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--proxy-headers", action="store_true", help="trust X-Forwarded-* from --forwarded-allow-ips")
+    parser.add_argument("--forwarded-allow-ips", default="127.0.0.1")
+    serve(parser.parse_args())
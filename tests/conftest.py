@@ -0,0 +1,53 @@
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# The modules under test live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# main reads its configuration once, at import, so the app-level tests share one
+# throwaway data directory. Tests keep apart through unique phones and time ranges.
+DATA_DIR = tempfile.mkdtemp(prefix="sos-tests-")
+INGEST_KEY = "test-ingest-key"
+os.environ.update({
+    "DATA_DIR": DATA_DIR,
+    "FERNET_KEY": "Ekpu5BCIHUqK7ylLzTl2h70oKiu0gWjYHJS_G0QLrkU=",
+    "ADMIN_ALLOWED_IPS": "testclient",
+    "ADMIN_RATE_LIMIT": "1000",
+    "INGEST_API_KEY": INGEST_KEY,
+})
+
+_phones = itertools.count(1)
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+@pytest.fixture(scope="session")
+def main():
+    import main
+    return main
+
+@pytest.fixture(scope="session")
+def client(main):
+    from starlette.testclient import TestClient
+    with TestClient(main.app) as client:
+        yield client
+
+@pytest.fixture(scope="session")
+def admin(main):
+    return (main.ADMIN_USERNAME, main.ADMIN_PASSWORD)
+
+@pytest.fixture
+def phone():
+    """A phone number no other test has used"""
+    return lambda: f"9{next(_phones):09d}"
+
+@pytest.fixture
+def ingest(client):
+    def post(items):
+        return client.post("/api/ingest", json=items, headers={"X-Ingest-Key": INGEST_KEY})
+    return post
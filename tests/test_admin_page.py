@@ -0,0 +1,13 @@
+def test_dashboard_requires_admin_auth(client):
+    assert client.get("/supersecretadmin").status_code == 401
+    assert client.get("/supersecretadmin", auth=("admin", "wrong")).status_code == 401
+
+def test_dashboard_serves_the_shell_without_decrypting(client, admin, main, phone, monkeypatch):
+    async def no_crypto(*args, **kwargs):
+        raise AssertionError("the dashboard must not decrypt names")
+    client.post("/login", data={"phone": phone(), "name": "Asha"})
+    client.post("/submit", data={"type_code": "HELPLINE", "latitude": 28.6, "longitude": 77.2})
+    monkeypatch.setattr(main.crypto, "map", no_crypto)
+    response = client.get("/supersecretadmin", params={"page": 5}, auth=admin)
+    assert response.status_code == 200
+    assert "<html" in response.text.lower()
@@ -0,0 +1,66 @@
+import json
+from datetime import datetime, timedelta
+
+def day_range(day: datetime) -> dict:
+    return {"start": day.strftime("%Y-%m-%dT00:00"), "end": day.strftime("%Y-%m-%dT23:59")}
+
+def seed(ingest, phone, count, day=datetime(2021, 3, 1)):
+    """MEDICAL reports (not throttled) one minute apart on day, the last two sharing a timestamp.
+
+    Each test seeds a day of its own, so its date filter only sees its reports.
+    """
+    reports = [{
+        "phone": phone, "name": "Ravi", "type_code": "MEDICAL", "latitude": 19.07, "longitude": 72.87,
+        "timestamp": (day + timedelta(minutes=min(i, count - 2))).isoformat()
+    } for i in range(count)]
+    response = ingest(reports)
+    assert response.json()["summary"] == {"created": count}
+    return {r["request_id"] for r in response.json()["results"]}
+
+def test_requests_and_users_need_admin_auth(client):
+    for path in ("/admin/api/requests", "/admin/api/users"):
+        assert client.get(path).status_code == 401
+        assert client.get(path, auth=("admin", "wrong")).status_code == 401
+
+def test_requests_cursor_walks_every_row_once_newest_first(client, admin, ingest, phone):
+    day = datetime(2021, 3, 2)
+    created = seed(ingest, phone(), 7, day)
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = dict(day_range(day), limit=3, **({"cursor": cursor} if cursor else {}))
+        response = client.get("/admin/api/requests", params=params, auth=admin)
+        assert response.status_code == 200
+        seen += response.json()
+        pages += 1
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert pages == 3
+    assert {r["request_id"] for r in seen} == created and len(seen) == len(created)
+    keys = [(r["timestamp"], r["request_id"]) for r in seen]
+    assert keys == sorted(keys, reverse=True)
+
+def test_requests_ndjson_streams_the_filtered_set(client, admin, ingest, phone):
+    day = datetime(2021, 3, 3)
+    created = seed(ingest, phone(), 4, day)
+    response = client.get("/admin/api/requests", params=dict(day_range(day), format="ndjson"), auth=admin)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines() if line]
+    assert {r["request_id"] for r in rows} == created and len(rows) == 4
+
+def test_invalid_cursor_is_a_client_error(client, admin):
+    assert client.get("/admin/api/requests", params={"cursor": "not-a-cursor"}, auth=admin).status_code == 400
+
+def test_users_cursor_walks_every_user_once(client, admin, ingest, phone):
+    for _ in range(3):
+        seed(ingest, phone(), 2)
+    seen, cursor = [], None
+    while True:
+        response = client.get("/admin/api/users", params={"limit": 2, **({"cursor": cursor} if cursor else {})}, auth=admin)
+        assert response.status_code == 200
+        seen += [u["user_id"] for u in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert seen == sorted(seen) and len(seen) == len(set(seen)) >= 3
@@ -0,0 +1,32 @@
+import sqlite3
+
+import pytest
+
+pytest.importorskip("pyarrow")
+import archive_requests
+
+def report(phone, timestamp=None):
+    return {"phone": phone, "name": "Anil", "type_code": "MEDICAL", "latitude": 26.9, "longitude": 75.8,
+            **({"timestamp": timestamp} if timestamp else {})}
+
+def rowid_of(main, request_id):
+    with sqlite3.connect(main.DB_PATH) as conn:
+        row = conn.execute("SELECT rowid FROM emergency_requests WHERE request_id = ?", (request_id,)).fetchone()
+    return row and row[0]
+
+def test_newest_request_is_not_archived_so_its_rowid_is_never_reused(client, admin, main, ingest, phone):
+    user_phone = phone()
+    (old,) = [r["request_id"] for r in ingest([report(user_phone, "2000-06-01T08:00:00")]).json()["results"]]
+    old_rowid = rowid_of(main, old)
+    since = main.encode_cursor(old_rowid)
+
+    client.portal.call(archive_requests.archive_requests, 9000, 1000)
+    assert rowid_of(main, old) == old_rowid
+
+    (new,) = [r["request_id"] for r in ingest([report(user_phone)]).json()["results"]]
+    assert rowid_of(main, new) > old_rowid
+    client.portal.call(archive_requests.archive_requests, 9000, 1000)
+    assert rowid_of(main, old) is None
+    # A client that had seen the old request still gets the new one
+    delta = client.get("/admin/api/requests", params={"since": since}, auth=admin).json()
+    assert new in [r["request_id"] for r in delta]
@@ -0,0 +1,54 @@
+def medical(phone, timestamp="2021-07-01T12:00:00"):
+    return {"phone": phone, "name": "Arjun", "type_code": "MEDICAL", "latitude": 17.38, "longitude": 78.48,
+            "timestamp": timestamp}
+
+def test_requests_revalidate_until_a_request_is_added(client, admin, ingest, phone):
+    params = {"start": "2021-07-01T00:00", "end": "2021-07-01T23:59"}
+    ingest([medical(phone())])
+    first = client.get("/admin/api/requests", params=params, auth=admin)
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and etag.startswith('W/"')
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    again = client.get("/admin/api/requests", params=params, headers={"If-None-Match": etag}, auth=admin)
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["etag"] == etag and again.headers["vary"] == "Accept-Encoding"
+    by_date = client.get("/admin/api/requests", params=params, auth=admin,
+                         headers={"If-Modified-Since": first.headers["last-modified"]})
+    assert by_date.status_code == 304
+
+    # Another query of the same data is another representation
+    other = client.get("/admin/api/requests", params=dict(params, limit=1), headers={"If-None-Match": etag}, auth=admin)
+    assert other.status_code == 200 and other.headers["etag"] != etag
+
+    # Any new request, even outside the filtered range, changes the version
+    ingest([medical(phone(), "2021-07-02T12:00:00")])
+    changed = client.get("/admin/api/requests", params=params, headers={"If-None-Match": etag}, auth=admin)
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert changed.json() == first.json()
+
+def test_users_etag_follows_the_users_table(client, admin, phone):
+    params = {"limit": 1}
+    etag = client.get("/admin/api/users", params=params, auth=admin).headers["etag"]
+    assert client.get("/admin/api/users", params=params, headers={"If-None-Match": etag}, auth=admin).status_code == 304
+    assert client.post("/login", data={"phone": phone(), "name": "Zoya"}).json()["success"]
+    assert client.get("/admin/api/users", params=params, headers={"If-None-Match": etag}, auth=admin).status_code == 200
+
+def test_types_revalidate(client):
+    first = client.get("/admin/api/types")
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.headers["cache-control"] == "no-cache"
+    assert client.get("/admin/api/types", headers={"If-None-Match": f'"other", {etag}'}).status_code == 304
+    assert client.get("/admin/api/types", headers={"If-None-Match": "*"}).status_code == 304
+    assert client.get("/admin/api/types", headers={"If-None-Match": '"other"'}).status_code == 200
+
+def test_a_valid_etag_does_not_skip_auth(client, admin):
+    etag = client.get("/admin/api/requests", params={"limit": 1}, auth=admin).headers["etag"]
+    assert client.get("/admin/api/requests", params={"limit": 1}, headers={"If-None-Match": etag}).status_code == 401
+
+def test_large_pages_are_compressed(client, admin, ingest, phone):
+    ingest([medical(phone(), f"2021-07-03T12:{i:02d}:00") for i in range(30)])
+    params = {"start": "2021-07-03T00:00", "end": "2021-07-03T23:59"}
+    response = client.get("/admin/api/requests", params=params, headers={"Accept-Encoding": "gzip"}, auth=admin)
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()) == 30
@@ -0,0 +1,55 @@
+import csv
+import gzip
+import io
+import json
+
+DETAILS = ["=HYPERLINK(\"http://x\")", "+91 calling", "-1+2", "@SUM(A1)", 'plain, with "quotes"\nand a newline', "खून बह रहा है"]
+
+def seed(ingest, phone, day: str) -> dict:
+    """One ATTACK report per DETAILS on day (YYYY-MM-DD); returns the date filter for it."""
+    reports = [{"phone": phone(), "name": "Neha", "type_code": "ATTACK", "subtype_code": "DRONES", "details": details,
+                "latitude": 30.7, "longitude": 76.7, "timestamp": f"{day}T10:{i:02d}:00"}
+               for i, details in enumerate(DETAILS)]
+    assert ingest(reports).json()["summary"] == {"created": len(DETAILS)}
+    return {"start": f"{day}T00:00", "end": f"{day}T23:59"}
+
+def export(client, admin, **params):
+    response = client.get("/admin/api/requests/export", params=params, auth=admin)
+    assert response.status_code == 200
+    return response
+
+def test_csv_escapes_formulas_and_keeps_text_intact(client, admin, main, ingest, phone, monkeypatch):
+    day = seed(ingest, phone, "2021-05-01")
+    monkeypatch.setattr(main, "EXPORT_CHUNK_ROWS", 2)
+    response = export(client, admin, format="csv", **day)
+    assert response.headers["content-type"] == "text/csv; charset=utf-8"
+    assert response.headers["content-disposition"].endswith('.csv"')
+    header, *rows = list(csv.reader(io.StringIO(response.content.decode("utf-8"))))
+    assert header[:2] == ["request_id", "user_id"]
+    details = sorted(row[header.index("details")] for row in rows)
+    assert details == sorted([
+        "'=HYPERLINK(\"http://x\")", "'+91 calling", "'-1+2", "'@SUM(A1)", 'plain, with "quotes"\nand a newline', "खून बह रहा है"
+    ])
+    assert {row[header.index("subtype_name")] for row in rows} == {"Enemy drones"}
+
+def test_geojson_and_ndjson_keep_the_raw_values(client, admin, ingest, phone):
+    day = seed(ingest, phone, "2021-05-02")
+    collection = export(client, admin, format="geojson", **day).json()
+    assert collection["type"] == "FeatureCollection"
+    assert sorted(f["properties"]["details"] for f in collection["features"]) == sorted(DETAILS)
+    assert collection["features"][0]["geometry"] == {"type": "Point", "coordinates": [76.7, 30.7]}
+    lines = export(client, admin, format="ndjson", **day).text.splitlines()
+    assert sorted(json.loads(line)["details"] for line in lines) == sorted(DETAILS)
+
+def test_gzip_wraps_the_same_bytes(client, admin, ingest, phone):
+    day = seed(ingest, phone, "2021-05-03")
+    plain = export(client, admin, format="ndjson", **day)
+    # The client must not undo the compression, so read the raw stream
+    with client.stream("GET", "/admin/api/requests/export", params=dict(day, format="ndjson", gzip="true"), auth=admin) as response:
+        assert response.headers["content-type"] == "application/gzip"
+        assert response.headers["content-disposition"].endswith('.ndjson.gz"')
+        compressed = b"".join(response.iter_raw())
+    assert sorted(gzip.decompress(compressed).splitlines()) == sorted(plain.content.splitlines())
+
+def test_export_needs_admin_auth(client):
+    assert client.get("/admin/api/requests/export").status_code == 401
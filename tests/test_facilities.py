@@ -0,0 +1,67 @@
+import json
+import os
+import random
+import pytest
+from facilities import FacilityDirectory, FacilityIndex, haversine_km, read_facilities
+
+def make_facilities(n: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    return [{"facility_id": str(i), "name": f"Facility {i}", "kind": "hospital",
+             "latitude": rng.uniform(-60, 70), "longitude": rng.uniform(-180, 180), "capacity": None}
+            for i in range(n)]
+
+def brute_force(facilities, latitude, longitude, k):
+    distances = sorted((haversine_km(latitude, longitude, f["latitude"], f["longitude"]), f["facility_id"])
+                       for f in facilities)
+    return distances[:k]
+
+@pytest.mark.parametrize("n", [1, 7, 8, 9, 100, 2000])
+def test_nearest_matches_brute_force(n):
+    facilities = make_facilities(n)
+    index = FacilityIndex(facilities)
+    rng = random.Random(n)
+    for _ in range(200):
+        lat, lon = rng.uniform(-90, 90), rng.uniform(-180, 180)
+        k = rng.choice([1, 3, 10])
+        got = index.nearest(lat, lon, k)
+        expected = brute_force(facilities, lat, lon, k)
+        assert len(got) == min(k, n)
+        assert [d for d, _ in got] == pytest.approx([d for d, _ in expected], abs=1e-6)
+        assert [d for d, _ in got] == sorted(d for d, _ in got)
+
+def test_nearest_across_the_antimeridian():
+    facilities = [{"facility_id": "east", "name": "", "kind": "", "latitude": 0.0, "longitude": 179.9, "capacity": None},
+                  {"facility_id": "far", "name": "", "kind": "", "latitude": 0.0, "longitude": 170.0, "capacity": None}]
+    (distance, facility), _ = FacilityIndex(facilities).nearest(0.0, -179.9, 2)
+    assert facility["facility_id"] == "east"
+    assert distance == pytest.approx(haversine_km(0.0, -179.9, 0.0, 179.9))
+
+def test_empty_index():
+    assert FacilityIndex([]).nearest(10.0, 10.0) == []
+    assert FacilityIndex(make_facilities(5)).nearest(10.0, 10.0, 0) == []
+
+def test_read_facilities_skips_invalid_rows(tmp_path):
+    path = tmp_path / "facilities.csv"
+    path.write_text("facility_id,name,kind,latitude,longitude,capacity\n"
+                    "a,Alpha,hospital,28.6,77.2,120\n"
+                    "b,Bravo,clinic,,77.2,\n"
+                    "c,Charlie,clinic,95,77.2,\n"
+                    ",Delta,clinic,19.0,72.8,n/a\n")
+    facilities = read_facilities(str(path))
+    assert [f["name"] for f in facilities] == ["Alpha", "Delta"]
+    assert facilities[0]["capacity"] == 120 and facilities[1]["capacity"] is None
+    assert facilities[1]["facility_id"] == "3"
+
+def test_directory_reloads_on_change_and_keeps_index_on_error(tmp_path):
+    path = tmp_path / "facilities.json"
+    directory = FacilityDirectory(str(path))
+    assert not directory.check()
+    path.write_text(json.dumps(make_facilities(3)))
+    assert directory.check() and len(directory.index) == 3
+    assert not directory.check()
+    path.write_text("not json")
+    os.utime(path, ns=(0, 10**9))
+    assert not directory.check()
+    assert len(directory.index) == 3 and directory.errors == 1
+    path.write_text(json.dumps(make_facilities(4)))
+    assert directory.check() and len(directory.index) == 4 and directory.reloads == 2
@@ -0,0 +1,67 @@
+import json
+
+def tip(client, admin, main):
+    """The delta cursor of the newest stored request."""
+    cursor = main.encode_cursor(0)
+    while True:
+        response = client.get("/admin/api/requests", params={"since": cursor, "limit": 5000}, auth=admin)
+        if not response.json():
+            return cursor
+        cursor = response.headers["x-next-cursor"]
+
+def reports(phone, count, type_code="MEDICAL"):
+    return [{"phone": phone, "name": "Lata", "type_code": type_code, "latitude": 12.97, "longitude": 77.59,
+             **({"subtype_code": "BULLETS", "details": "catch-up"} if type_code == "ATTACK" else {})}
+            for _ in range(count)]
+
+def test_since_returns_what_was_committed_after_the_cursor(client, admin, main, ingest, phone):
+    since = tip(client, admin, main)
+    created = [r["request_id"] for r in ingest(reports(phone(), 3)).json()["results"]]
+
+    first = client.get("/admin/api/requests", params={"since": since, "limit": 2}, auth=admin)
+    second = client.get("/admin/api/requests", params={"since": first.headers["x-next-cursor"], "limit": 2}, auth=admin)
+    assert [r["request_id"] for r in first.json() + second.json()] == created
+    assert first.json()[-1]["cursor"] == first.headers["x-next-cursor"]
+    # Nothing new: the same cursor comes back
+    last = second.headers["x-next-cursor"]
+    third = client.get("/admin/api/requests", params={"since": last}, auth=admin)
+    assert third.json() == [] and third.headers["x-next-cursor"] == last
+
+def test_since_applies_the_filters(client, admin, main, ingest, phone):
+    since = tip(client, admin, main)
+    user_phone = phone()
+    ingest(reports(user_phone, 2) + reports(user_phone, 1, type_code="ATTACK"))
+    response = client.get("/admin/api/requests", params={"since": since, "type_code": "ATTACK"}, auth=admin)
+    assert [r["type_code"] for r in response.json()] == ["ATTACK"]
+
+def test_since_rejects_bad_cursors(client, admin, main):
+    assert client.get("/admin/api/requests", params={"since": "abc"}, auth=admin).status_code == 400
+    both = {"since": main.encode_cursor(0), "cursor": main.encode_cursor("2021-01-01T00:00:00", "x")}
+    assert client.get("/admin/api/requests", params=both, auth=admin).status_code == 400
+
+def test_stream_replays_missed_requests_from_last_event_id(client, admin, main, ingest, phone):
+    since = tip(client, admin, main)
+    created = [r["request_id"] for r in ingest(reports(phone(), 2)).json()["results"]]
+
+    # The stream never ends by itself, so read its first events straight off the body
+    async def first_events(count):
+        from starlette.requests import Request
+        request = Request({"type": "http", "method": "GET", "path": "/admin/api/requests/stream", "query_string": b"",
+                           "headers": [(b"last-event-id", since.encode())], "client": ("testclient", 50000)})
+        response = await main.api_requests_stream(request, type_code=None, subtype_code=None, since=None, authorized=True)
+        body = response.body_iterator
+        try:
+            return [await anext(body) for _ in range(count)]
+        finally:
+            await body.aclose()
+
+    events = client.portal.call(first_events, len(created))
+    assert [json.loads(event.split("data: ", 1)[1])["request_id"] for event in events] == created
+    assert all(event.startswith("id: ") for event in events)
+
+def test_stream_resets_when_too_far_behind(client, admin, main, ingest, phone, monkeypatch):
+    since = tip(client, admin, main)
+    ingest(reports(phone(), 3))
+    monkeypatch.setattr(main, "FEED_CATCHUP_LIMIT", 2)
+    response = client.get("/admin/api/requests/stream", params={"since": since}, auth=admin)
+    assert response.text == "event: reset\ndata: {}\n\n"
@@ -0,0 +1,127 @@
+import math
+import random
+from types import SimpleNamespace
+import pytest
+import geohash
+import geofences
+from geofences import Geofence, GeofenceIndex, parse_geofence, point_in_polygon
+
+SQUARE = [[77.0, 28.0], [77.2, 28.0], [77.2, 28.2], [77.0, 28.2], [77.0, 28.0]]
+HOLE = [[77.05, 28.05], [77.15, 28.05], [77.15, 28.15], [77.05, 28.15]]
+
+def stored(geofence_id, body) -> Geofence:
+    """A Geofence as a worker loads it from its stored row."""
+    row = SimpleNamespace(geofence_id=geofence_id, **parse_geofence(body))
+    return Geofence.from_row(row)
+
+def random_body(rng, i: int) -> dict:
+    lat, lon = rng.uniform(18, 20), rng.uniform(72, 74)
+    radius_m = math.exp(rng.uniform(math.log(200), math.log(30000)))
+    body = {"name": f"Geofence {i}", "subscriber": "unit-1"}
+    if rng.random() < 0.3:
+        body["type_codes"] = rng.choice([["ATTACK"], ["INJURY", "ATTACK"]])
+    if rng.random() < 0.5:
+        body["circle"] = {"latitude": lat, "longitude": lon, "radius_m": radius_m}
+        return body
+    dlat = radius_m / 1000 / geofences.KM_PER_DEGREE
+    dlon = dlat / math.cos(math.radians(lat))
+    vertices = rng.randint(3, 12)
+    ring = [[lon + dlon * rng.uniform(0.3, 1) * math.cos(2 * math.pi * k / vertices),
+             lat + dlat * rng.uniform(0.3, 1) * math.sin(2 * math.pi * k / vertices)] for k in range(vertices)]
+    body["geometry"] = {"type": "Polygon", "coordinates": [ring]}
+    return body
+
+def test_index_matches_brute_force():
+    rng = random.Random(5)
+    index = GeofenceIndex()
+    fences = [stored(f"G{i}", random_body(rng, i)) for i in range(1500)]
+    for geofence in fences:
+        index.add(geofence)
+    assert len(index) == len(fences) and len(index.levels) > 1
+    matched = 0
+    for _ in range(2000):
+        lat, lon = rng.uniform(17.8, 20.2), rng.uniform(71.8, 74.2)
+        type_code = rng.choice(["ATTACK", "INJURY", "MEDICAL"])
+        expected = {g.geofence_id for g in fences if g.accepts(type_code, None) and g.contains(lat, lon)}
+        got = {g.geofence_id for g in index.match(lat, lon, type_code, None, geohash.encode(lat, lon))}
+        assert got == expected
+        matched += len(got)
+    assert matched > 0
+
+def test_remove_and_replace():
+    index = GeofenceIndex()
+    small = stored("a", {"name": "a", "subscriber": "s", "circle": {"latitude": 28.6, "longitude": 77.2, "radius_m": 500}})
+    index.add(small)
+    assert [g.geofence_id for g in index.match(28.6, 77.2)] == ["a"]
+    assert not index.match(28.65, 77.2)
+    large = stored("a", {"name": "a", "subscriber": "s", "circle": {"latitude": 28.6, "longitude": 77.2, "radius_m": 10000}})
+    index.add(large)
+    assert len(index) == 1 and [g.radius_km for g in index.match(28.65, 77.2)] == [10.0]
+    assert index.remove("a") and not index.remove("a")
+    assert index.match(28.6, 77.2) == [] and index.cells == {} and index.precisions == {}
+
+def test_point_in_a_hole_is_outside():
+    fence = stored("p", {"name": "p", "subscriber": "s",
+                         "geometry": {"type": "Polygon", "coordinates": [SQUARE, HOLE]}})
+    assert fence.contains(28.02, 77.02)
+    assert not fence.contains(28.1, 77.1)
+    assert not fence.contains(28.3, 77.1)
+    index = GeofenceIndex()
+    index.add(fence)
+    assert index.match(28.1, 77.1) == [] and len(index.match(28.02, 77.02)) == 1
+
+def test_point_in_polygon_concave():
+    # An L shape: the notch at the top right is outside
+    ring = [(0, 0), (2, 0), (2, 1), (1, 1), (1, 2), (0, 2)]
+    assert point_in_polygon(0.5, 0.5, [ring])
+    assert point_in_polygon(1.5, 0.5, [ring])
+    assert not point_in_polygon(1.5, 1.5, [ring])
+
+def test_type_and_subtype_filters():
+    fence = stored("f", {"name": "f", "subscriber": "s", "circle": {"latitude": 0, "longitude": 0, "radius_m": 1000},
+                         "type_codes": ["ATTACK"], "subtype_codes": ["DRONES", "BULLETS", "DRONES"]})
+    assert fence.type_codes == {"ATTACK"} and fence.subtype_codes == {"BULLETS", "DRONES"}
+    assert fence.accepts("ATTACK", "DRONES")
+    assert not fence.accepts("ATTACK", "ARTILLERY")
+    assert not fence.accepts("INJURY", "DRONES")
+
+def test_parse_geofence_stores_the_covering_cells():
+    row = parse_geofence({"name": " Depot ", "subscriber": "unit-7",
+                          "geometry": {"type": "Polygon", "coordinates": [SQUARE]}})
+    assert row["name"] == "Depot" and row["kind"] == "Polygon"
+    assert (row["min_lat"], row["min_lon"], row["max_lat"], row["max_lon"]) == (28.0, 77.0, 28.2, 77.2)
+    cells = row["cells"].split()
+    assert 1 <= len(cells) <= geofences.MAX_CELLS
+    assert cells == geofences.covering((28.0, 77.0, 28.2, 77.2))
+
+CIRCLE = {"latitude": 28.6, "longitude": 77.2, "radius_m": 500}
+
+@pytest.mark.parametrize("body, message", [
+    ([], "JSON object"),
+    ({"subscriber": "s", "circle": CIRCLE}, "required"),
+    ({"name": "n", "subscriber": "s"}, "either"),
+    ({"name": "n", "subscriber": "s", "circle": CIRCLE, "geometry": {}}, "either"),
+    ({"name": "n", "subscriber": "s", "circle": [1, 2]}, "object"),
+    ({"name": "n", "subscriber": "s", "circle": dict(CIRCLE, latitude=91)}, "circle.latitude"),
+    ({"name": "n", "subscriber": "s", "circle": dict(CIRCLE, longitude="77")}, "circle.longitude"),
+    ({"name": "n", "subscriber": "s", "circle": dict(CIRCLE, radius_m=True)}, "circle.radius_m"),
+    ({"name": "n", "subscriber": "s", "circle": dict(CIRCLE, radius_m=0)}, "positive"),
+    ({"name": "n", "subscriber": "s", "circle": dict(CIRCLE, radius_m=geofences.MAX_RADIUS_M + 1)}, "circle.radius_m"),
+    ({"name": "n", "subscriber": "s", "geometry": {"type": "Point", "coordinates": [77, 28]}}, "GeoJSON Polygon"),
+    ({"name": "n", "subscriber": "s", "geometry": {"type": "Polygon", "coordinates": [[[77, 28], [77.1]]]}}, "rings"),
+    ({"name": "n", "subscriber": "s", "geometry": {"type": "Polygon", "coordinates": [[[77, 28], [77.1, 28], [77, 28]]]}},
+     "3 distinct"),
+    ({"name": "n", "subscriber": "s", "geometry": {"type": "Polygon", "coordinates": []}}, "positions"),
+    ({"name": "n", "subscriber": "s", "geometry": {"type": "Polygon", "coordinates": [[[-179, 0], [179, 0], [179, 1]]]}},
+     "antimeridian"),
+    ({"name": "n", "subscriber": "s", "circle": CIRCLE, "type_codes": "ATTACK"}, "type_codes"),
+    ({"name": "n", "subscriber": "s", "circle": CIRCLE, "subtype_codes": ["TWO WORDS"]}, "subtype_codes"),
+])
+def test_parse_geofence_rejects(body, message):
+    with pytest.raises(ValueError, match=message):
+        parse_geofence(body)
+
+def test_parse_geofence_limits_vertices():
+    ring = [[77 + 0.1 * math.cos(k / 400), 28 + 0.1 * math.sin(k / 400)] for k in range(geofences.MAX_VERTICES + 1)]
+    with pytest.raises(ValueError, match="positions"):
+        parse_geofence({"name": "n", "subscriber": "s", "geometry": {"type": "Polygon", "coordinates": [ring]}})
@@ -0,0 +1,48 @@
+import random
+import pytest
+import geohash
+
+def test_encode_known_values():
+    assert geohash.encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert geohash.encode(42.6, -5.6, 5) == "ezs42"
+    assert len(geohash.encode(0.0, 0.0)) == geohash.STORED_PRECISION
+
+def test_prefix_of_finer_precision():
+    cell = geohash.encode(19.076, 72.8777, 9)
+    for precision in range(1, 9):
+        assert geohash.encode(19.076, 72.8777, precision) == cell[:precision]
+
+@pytest.mark.parametrize("precision", [1, 4, 7, 9])
+def test_decode_bbox_contains_point_and_matches_cell_size(precision):
+    rng = random.Random(precision)
+    height, width = geohash.cell_size(precision)
+    for _ in range(200):
+        lat, lon = rng.uniform(-89.9, 89.9), rng.uniform(-179.9, 179.9)
+        min_lat, min_lon, max_lat, max_lon = geohash.decode_bbox(geohash.encode(lat, lon, precision))
+        assert min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+        assert max_lat - min_lat == pytest.approx(height)
+        assert max_lon - min_lon == pytest.approx(width)
+
+def test_covering_cells_cover_every_point_of_the_box():
+    rng = random.Random(7)
+    for _ in range(50):
+        min_lat, min_lon = rng.uniform(8, 34), rng.uniform(68, 96)
+        bbox = (min_lat, min_lon, min_lat + rng.uniform(0.001, 1), min_lon + rng.uniform(0.001, 1))
+        cells = geohash.covering_cells(*bbox, max_cells=16)
+        assert 1 <= len(cells) <= 16
+        assert len({len(cell) for cell in cells}) == 1
+        for _ in range(50):
+            lat, lon = rng.uniform(bbox[0], bbox[2]), rng.uniform(bbox[1], bbox[3])
+            assert geohash.encode(lat, lon)[:len(cells[0])] in cells
+
+def test_covering_cells_uses_the_finest_precision_that_fits():
+    lat, lon = 28.6139, 77.2090
+    assert geohash.covering_cells(lat, lon, lat, lon) == [geohash.encode(lat, lon)]
+    coarse = geohash.covering_cells(8.0, 68.0, 35.0, 97.0, max_cells=4)
+    assert len(coarse) <= 4 and len(coarse[0]) == 1
+
+def test_prefix_upper_bound_sorts_after_every_cell():
+    prefix = "ttnf"
+    bound = geohash.prefix_upper_bound(prefix)
+    assert prefix + "zzzzz" < bound
+    assert "ttng" > bound
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from group_commit import GroupCommitWriter
+
+def test_failed_batch_fails_every_caller_and_the_writer_keeps_going():
+    flushed = []
+    async def flush(items):
+        if "bad" in items:
+            raise RuntimeError("disk full")
+        flushed.append(items)
+        return [item.upper() for item in items]
+
+    async def run():
+        writer = GroupCommitWriter(flush, max_batch=10, max_delay=0.05)
+        await writer.start()
+        failed = await asyncio.gather(*(writer.submit(item) for item in ("a", "bad", "c")), return_exceptions=True)
+        ok = await asyncio.gather(writer.submit("d"), writer.submit("e"))
+        await writer.stop()
+        return failed, ok, writer.stats()
+
+    failed, ok, stats = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in failed)
+    assert ok == ["D", "E"]
+    assert flushed == [["d", "e"]]
+    assert stats == {"queued": 0, "batches": 1, "items": 2, "avg_batch": 2.0}
+
+def test_write_behind_submit_reports_a_failed_commit(client, admin, main, phone, monkeypatch):
+    writer = GroupCommitWriter(main.flush_requests, max_delay=0.001)
+    client.portal.call(writer.start)
+    monkeypatch.setattr(main, "submit_writer", writer)
+    user_phone = phone()
+    assert client.post("/login", data={"phone": user_phone, "name": "Dev"}).json()["success"]
+    data = {"type_code": "ATTACK", "subtype_code": "BULLETS", "details": "group commit", "latitude": 28.6, "longitude": 77.2}
+    try:
+        with monkeypatch.context() as patch:
+            async def broken(session, rows):
+                raise RuntimeError("database is locked")
+            patch.setattr(main, "insert_requests", broken)
+            for _ in range(main.SUBMIT_LIMIT):
+                with pytest.raises(RuntimeError):
+                    client.post("/submit", data=data)
+        # None of the failures was stored or used up a throttle slot
+        for _ in range(main.SUBMIT_LIMIT):
+            assert client.post("/submit", data=data).json()["success"]
+    finally:
+        client.portal.call(writer.stop)
+    assert writer.stats()["items"] == main.SUBMIT_LIMIT
+    users = client.get("/admin/api/users", params={"limit": 5000}, auth=admin).json()
+    user_id = next(u["user_id"] for u in users if u["phone"] == user_phone)
+    stored = client.get("/admin/api/requests", params={"limit": 5000}, auth=admin).json()
+    assert sum(r["user_id"] == user_id for r in stored) == main.SUBMIT_LIMIT
@@ -0,0 +1,157 @@
+import random
+import uuid
+from datetime import datetime, timedelta
+from facilities import haversine_km
+from incidents import IncidentClusterer, PriorityQueue
+
+START = datetime(2026, 1, 1, 12, 0)
+
+def report(latitude, longitude, minutes=0, type_code="ATTACK", subtype_code="BULLETS", request_id=None):
+    return {"request_id": request_id or str(uuid.uuid4()), "latitude": latitude, "longitude": longitude,
+            "timestamp": START + timedelta(minutes=minutes), "type_code": type_code, "subtype_code": subtype_code}
+
+def random_reports(n: int, seed: int) -> list:
+    rng = random.Random(seed)
+    rows = [report(28.6 + rng.gauss(0, 0.01), 77.2 + rng.gauss(0, 0.01), rng.uniform(0, 240),
+                   rng.choice(["ATTACK", "INJURY"]), rng.choice(["BULLETS", "DEATH", "MINOR", None]))
+            for _ in range(n)]
+    return sorted(rows, key=lambda row: row["timestamp"])
+
+def brute_force(rows, radius_m, window) -> list:
+    """Connected components of reports within radius_m and window of each other."""
+    parent = list(range(len(rows)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, a in enumerate(rows):
+        for j in range(i):
+            b = rows[j]
+            if (abs(a["timestamp"] - b["timestamp"]) <= window
+                    and haversine_km(a["latitude"], a["longitude"], b["latitude"], b["longitude"]) <= radius_m / 1000):
+                parent[find(i)] = find(j)
+    return [find(i) for i in range(len(rows))]
+
+def partition(labels) -> set:
+    groups = {}
+    for i, label in enumerate(labels):
+        groups.setdefault(label, set()).add(i)
+    return {frozenset(group) for group in groups.values()}
+
+def test_assign_matches_brute_force_clustering():
+    clusterer = IncidentClusterer(radius_m=300)
+    rows = random_reports(600, seed=3)
+    merged_into = {}
+    for i in range(0, len(rows), 50):
+        _, merges = clusterer.assign(rows[i:i + 50])
+        merged_into.update(merges)
+    # Rows assigned before a merge are moved to the surviving incident, as the app does in the database
+    labels = []
+    for row in rows:
+        incident_id = row["incident_id"]
+        while incident_id in merged_into:
+            incident_id = merged_into[incident_id]
+        labels.append(incident_id)
+    assert partition(labels) == partition(brute_force(rows, 300, clusterer.window))
+    assert clusterer.merges > 0
+
+def test_reports_join_nearby_incidents_within_the_window():
+    clusterer = IncidentClusterer(radius_m=500, window=timedelta(minutes=30))
+    rows = [report(28.6, 77.2, 0), report(28.6005, 77.2, 10), report(28.7, 77.2, 10), report(28.6, 77.2, 45)]
+    changed, merges = clusterer.assign(rows)
+    ids = [row["incident_id"] for row in rows]
+    assert ids[0] == ids[1] and len({ids[0], ids[2], ids[3]}) == 3
+    assert merges == [] and len(changed) == 3
+    assert clusterer.incidents[ids[0]].reports == 2
+
+def test_non_incident_types_are_not_clustered():
+    clusterer = IncidentClusterer()
+    rows = [report(28.6, 77.2, type_code="MEDICAL", subtype_code=None)]
+    assert clusterer.assign(rows) == ([], [])
+    assert rows[0]["incident_id"] is None
+
+def test_repeated_request_id_is_not_counted_twice():
+    clusterer = IncidentClusterer()
+    first = report(28.6, 77.2, request_id="r1")
+    clusterer.assign([first])
+    again = report(28.6, 77.2, request_id="r1")
+    assert clusterer.assign([again]) == ([], [])
+    assert again["incident_id"] == first["incident_id"]
+    assert clusterer.incidents[first["incident_id"]].reports == 1
+
+def test_bridging_report_merges_incidents():
+    clusterer = IncidentClusterer(radius_m=500)
+    west, east = report(28.6, 77.2, 0), report(28.6, 77.208, 1)
+    clusterer.assign([west, east])
+    assert west["incident_id"] != east["incident_id"]
+    bridge = report(28.6, 77.204, 2, subtype_code="DEATH")
+    changed, merges = clusterer.assign([bridge])
+    assert len(merges) == 1 and len(changed) == 1
+    merged, into = merges[0]
+    assert bridge["incident_id"] == into and merged not in clusterer.incidents
+    incident = clusterer.incidents[into]
+    assert incident.reports == 3 and incident.subtype_code == "DEATH"
+    assert {point.request_id for point in incident.points} == {west["request_id"], east["request_id"],
+                                                              bridge["request_id"]}
+
+def test_restore_places_saved_reports_and_returns_the_rest():
+    clusterer = IncidentClusterer()
+    rows = [report(28.6, 77.2, 0), report(28.6001, 77.2, 1)]
+    changed, _ = clusterer.assign(rows)
+    saved = [incident.to_row() for incident in changed]
+    orphan = dict(report(19.0, 72.8, 2), incident_id="gone")
+    restored = IncidentClusterer()
+    unplaced = restored.restore(saved, rows + [orphan])
+    assert unplaced == [orphan]
+    assert restored.incidents[rows[0]["incident_id"]].reports == 2
+    assert restored.assign([report(28.6002, 77.2, 3)])[0][0].incident_id == rows[0]["incident_id"]
+
+def test_catch_up_follows_the_other_process():
+    writer, reader = IncidentClusterer(radius_m=300), IncidentClusterer(radius_m=300)
+    rows = random_reports(300, seed=11)
+    committed = []
+    for i in range(0, len(rows), 30):
+        batch = rows[i:i + 30]
+        changed, merges = writer.assign(batch)
+        committed.extend(batch)
+        saved = {incident_id: incident.to_row() for incident_id, incident in writer.incidents.items()}
+        # Reports are saved under their incident after any later merge
+        for row in committed:
+            point = writer.reports.get(row["request_id"])
+            if point is not None:
+                row["incident_id"] = point.incident.incident_id
+        assert reader.catch_up(batch, saved) == len(batch)
+    assert set(reader.incidents) == set(writer.incidents)
+    for incident_id, incident in writer.incidents.items():
+        assert reader.incidents[incident_id].to_row() == incident.to_row()
+    assert [reader.incidents[i].priority for i in reader.queue.top(5)] == \
+        [writer.incidents[i].priority for i in writer.queue.top(5)]
+    assert reader.catch_up(rows[-30:], saved) == 0
+
+def test_top_drops_incidents_idle_for_longer_than_active():
+    clusterer = IncidentClusterer(active=timedelta(hours=1))
+    old, new = report(28.6, 77.2, 0, subtype_code="DEATH"), report(19.0, 72.8, 90, subtype_code="MINOR")
+    clusterer.assign([old, new])
+    now = START + timedelta(minutes=100)
+    assert [incident.incident_id for incident in clusterer.top(5, now)] == [new["incident_id"]]
+    assert old["incident_id"] not in clusterer.incidents
+
+def test_priority_queue_update_remove_and_top():
+    queue = PriorityQueue()
+    for key, priority in [("a", 1.0), ("b", 5.0), ("c", 3.0)]:
+        queue.update(key, priority)
+    queue.update("a", 9.0)
+    queue.remove("b")
+    assert queue.top(2) == ["a", "c"]
+    assert queue.top(10) == ["a", "c"]
+    assert len(queue) == 2
+
+def test_priority_queue_compacts_stale_entries():
+    queue = PriorityQueue()
+    for i in range(5000):
+        queue.update("a", float(i))
+    assert len(queue.heap) <= 2 * len(queue) + 1024
+    assert queue.top(1) == ["a"] and queue.current["a"][0] == 4999.0
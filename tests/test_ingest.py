@@ -0,0 +1,89 @@
+import json
+import sqlite3
+
+import pytest
+
+from conftest import INGEST_KEY
+
+def attack(phone, **fields):
+    return dict({"phone": phone, "name": "Sunil", "type_code": "ATTACK", "subtype_code": "BULLETS",
+                 "details": "ingest test", "latitude": 22.57, "longitude": 88.36}, **fields)
+
+def statuses(response) -> list:
+    assert response.status_code == 200
+    return [r["status"] for r in response.json()["results"]]
+
+def test_needs_the_ingest_key(client):
+    assert client.post("/api/ingest", json=[]).status_code == 401
+    assert client.post("/api/ingest", json=[], headers={"X-Ingest-Key": "wrong"}).status_code == 401
+
+def test_invalid_items_do_not_fail_the_batch(ingest, phone):
+    user_phone = phone()
+    response = ingest([
+        attack(user_phone),
+        "not an object",
+        attack(user_phone, name=5),
+        attack(user_phone, details={"text": "nested"}),
+        attack(user_phone, type_code=["ATTACK"]),
+        attack(user_phone, subtype_code=7),
+        attack(user_phone, idempotency_key=12),
+        attack("12345"),
+        attack(user_phone, type_code="NOPE"),
+        attack(user_phone, latitude="north"),
+        attack(user_phone, timestamp="yesterday"),
+        attack(phone(), name=None),
+    ])
+    assert statuses(response) == ["created"] + ["invalid"] * 11
+    results = response.json()["results"]
+    assert [r["index"] for r in results] == list(range(12))
+    assert results[2]["message"] == "name must be a string."
+    assert response.json()["summary"] == {"created": 1, "invalid": 11}
+
+def test_duplicate_keys_within_and_across_batches(ingest, phone):
+    user_phone = phone()
+    first = ingest([
+        attack(user_phone, idempotency_key="dup-a"),
+        attack(user_phone, idempotency_key="dup-a"),
+        attack(user_phone, idempotency_key="dup-b"),
+    ])
+    assert statuses(first) == ["created", "duplicate", "created"]
+    a, repeat, b = first.json()["results"]
+    assert repeat["request_id"] == a["request_id"]
+
+    # A retry of the whole batch creates nothing and uses no throttle slot
+    retry = ingest([attack(user_phone, idempotency_key="dup-b"), attack(user_phone, idempotency_key="dup-a")])
+    assert statuses(retry) == ["duplicate", "duplicate"]
+    assert [r["request_id"] for r in retry.json()["results"]] == [b["request_id"], a["request_id"]]
+    assert statuses(ingest([attack(user_phone, idempotency_key="dup-c")])) == ["created"]
+
+def test_throttle_counts_the_whole_batch(ingest, phone, main):
+    user_phone = phone()
+    batch = [attack(user_phone) for _ in range(main.SUBMIT_LIMIT + 1)]
+    batch.append(attack(user_phone, type_code="MEDICAL", subtype_code=None))
+    assert statuses(ingest(batch)) == ["created"] * main.SUBMIT_LIMIT + ["throttled", "created"]
+    assert statuses(ingest([attack(user_phone)])) == ["throttled"]
+
+def test_ndjson_body(client, phone):
+    user_phone = phone()
+    body = "\n".join(json.dumps(attack(user_phone, type_code="HELPLINE", subtype_code=None)) for _ in range(2)) + "\n{bad json\n"
+    response = client.post("/api/ingest", content=body,
+                           headers={"X-Ingest-Key": INGEST_KEY, "Content-Type": "application/x-ndjson"})
+    assert statuses(response) == ["created", "created", "invalid"]
+
+def test_duplicate_key_after_the_request_is_archived(client, main, ingest, phone):
+    pytest.importorskip("pyarrow")
+    import archive_requests
+    user_phone = phone()
+    old = attack(user_phone, idempotency_key="archived-a", timestamp="2001-05-01T10:00:00")
+    # The second report keeps the archived one from being the newest row
+    first = ingest([old, attack(user_phone)])
+    assert statuses(first) == ["created", "created"]
+    request_id = first.json()["results"][0]["request_id"]
+
+    client.portal.call(archive_requests.archive_requests, 9000, 1000)
+    with sqlite3.connect(main.DB_PATH) as conn:
+        assert not conn.execute("SELECT 1 FROM emergency_requests WHERE request_id = ?", (request_id,)).fetchall()
+
+    retry = ingest([old])
+    assert statuses(retry) == ["duplicate"]
+    assert retry.json()["results"][0]["request_id"] == request_id
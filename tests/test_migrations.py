@@ -0,0 +1,69 @@
+import sqlite3
+
+import pytest
+
+import geohash
+import migrations
+
+ROWS = 23
+
+@pytest.fixture
+def db(tmp_path):
+    """A current database rolled back to v3: v4 onwards pending and no geohash filled in."""
+    path = str(tmp_path / "emergency.db")
+    conn = sqlite3.connect(path, isolation_level=None)
+    migrations.create_schema(conn)
+    conn.execute("INSERT INTO users (user_id, phone, name) VALUES ('u1', '9876543210', 'x')")
+    conn.executemany(
+        "INSERT INTO emergency_requests (request_id, user_id, name, latitude, longitude, timestamp, type_code) "
+        "VALUES (?, 'u1', 'x', ?, ?, '2024-01-01 00:00:00', 'MEDICAL')",
+        [(f"r{i}", 10 + i / 10, 70 + i / 10) for i in range(ROWS)]
+    )
+    conn.execute("DELETE FROM schema_migrations WHERE version >= 4")
+    conn.close()
+    return path
+
+def query(path, sql):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(sql).fetchall()
+
+def test_interrupted_backfill_resumes_from_its_checkpoint(db, monkeypatch, capsys):
+    runner = migrations.MigrationRunner(db, batch_size=5)
+    update_chunk = migrations.Backfill.update_chunk
+    calls = []
+    def interrupted(self, conn, after, until):
+        calls.append(after)
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        return update_chunk(self, conn, after, until)
+    with monkeypatch.context() as patch:
+        patch.setattr(migrations.Backfill, "update_chunk", interrupted)
+        runner.migrate()
+    assert "run again to resume" in capsys.readouterr().out
+    # Two chunks committed; the third rolled back with its checkpoint
+    assert query(db, "SELECT count(*) FROM emergency_requests WHERE geohash IS NOT NULL") == [(10,)]
+    assert query(db, "SELECT version, step, last_rowid, rows_done FROM migration_checkpoints") == [(4, "geohash", 10, 10)]
+    assert query(db, "SELECT max(version) FROM schema_migrations") == [(3,)]
+
+    migrations.MigrationRunner(db, batch_size=5).migrate()
+    assert "resuming after rowid 10 (10 rows already updated)" in capsys.readouterr().out
+    rows = query(db, "SELECT latitude, longitude, geohash FROM emergency_requests")
+    assert all(value == geohash.encode(lat, lon) for lat, lon, value in rows)
+    assert query(db, "SELECT count(*) FROM migration_checkpoints") == [(0,)]
+    assert query(db, "SELECT max(version) FROM schema_migrations") == [(migrations.LATEST_VERSION,)]
+
+def test_dry_run_estimates_and_changes_nothing(db, capsys):
+    before = query(db, "SELECT version FROM schema_migrations ORDER BY version")
+    migrations.MigrationRunner(db, batch_size=5).dry_run()
+    out = capsys.readouterr().out
+    assert "backfill geohash" in out and f"{ROWS} rows" in out
+    assert "nothing was changed" in out
+    assert query(db, "SELECT count(*) FROM emergency_requests WHERE geohash IS NOT NULL") == [(0,)]
+    assert query(db, "SELECT version FROM schema_migrations ORDER BY version") == before
+    assert query(db, "SELECT count(*) FROM migration_checkpoints") == [(0,)]
+
+def test_target_stops_after_the_given_version(db):
+    migrations.MigrationRunner(db).migrate(target=5)
+    assert query(db, "SELECT max(version) FROM schema_migrations") == [(5,)]
+    migrations.MigrationRunner(db).migrate()
+    assert query(db, "SELECT max(version) FROM schema_migrations") == [(migrations.LATEST_VERSION,)]
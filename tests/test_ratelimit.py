@@ -0,0 +1,62 @@
+import pytest
+from ratelimit import MemoryBackend, SQLiteBackend, RateLimiter, make_backend
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    return make_backend(request.param, str(tmp_path / "limits.db"))
+
+def test_burst_up_to_the_limit_then_denied(backend):
+    limiter = RateLimiter(5, 60, backend)
+    assert [limiter.hit("k", now=1000.0) for _ in range(6)] == [True] * 5 + [False]
+
+def test_capacity_refills_one_hit_per_interval(backend):
+    limiter = RateLimiter(5, 60, backend)
+    for _ in range(5):
+        assert limiter.hit("k", now=1000.0)
+    assert not limiter.hit("k", now=1011.9)
+    assert limiter.hit("k", now=1012.0)
+    assert not limiter.hit("k", now=1012.0)
+    # A full period later every hit is available again
+    assert [limiter.hit("k", now=1072.0) for _ in range(6)] == [True] * 5 + [False]
+
+def test_denied_hits_use_no_capacity(backend):
+    limiter = RateLimiter(2, 10, backend)
+    assert limiter.hit("k", now=0.0) and limiter.hit("k", now=0.0)
+    for _ in range(10):
+        assert not limiter.hit("k", now=1.0)
+    assert limiter.hit("k", now=5.0)
+
+def test_keys_are_independent(backend):
+    limiter = RateLimiter(1, 60, backend)
+    assert limiter.hit("a", now=0.0)
+    assert not limiter.hit("a", now=0.0)
+    assert limiter.hit("b", now=0.0)
+
+def test_unenforced_hits_count_but_are_capped_at_one_period(backend):
+    limiter = RateLimiter(3, 30, backend)
+    for _ in range(10):
+        assert limiter.hit("k", enforce=False, now=0.0)
+    assert not limiter.hit("k", now=0.0)
+    # Capped at one period, so the key is not locked out for 10 intervals
+    assert limiter.hit("k", now=10.0)
+
+def test_memory_backend_evicts_expired_keys():
+    backend = MemoryBackend()
+    limiter = RateLimiter(1, 10, backend)
+    limiter.hit("a", now=0.0)
+    limiter.hit("b", now=5.0)
+    backend.evict(12.0)
+    assert set(backend.tats) == {"b"}  # a's TAT passed at 10
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "limits.db")
+    first = RateLimiter(2, 60, SQLiteBackend(path))
+    second = RateLimiter(2, 60, SQLiteBackend(path))
+    assert first.hit("k", now=0.0)
+    assert second.hit("k", now=0.0)
+    assert not first.hit("k", now=0.0)
+    assert not second.hit("k", now=0.0)
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        make_backend("redis")
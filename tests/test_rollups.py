@@ -0,0 +1,39 @@
+import sqlite3
+
+RANGE = {"start": "2021-04-01T00:00", "end": "2021-04-01T23:59"}
+
+def report(phone, hour, minute, type_code="MEDICAL", latitude=19.07, longitude=72.87):
+    return {"phone": phone, "name": "Kiran", "type_code": type_code, "latitude": latitude, "longitude": longitude,
+            "timestamp": f"2021-04-01T{hour:02d}:{minute:02d}:00"}
+
+def test_batches_add_to_existing_buckets(client, admin, main, ingest, phone):
+    mumbai, delhi = phone(), phone()
+    # The 10:00 Mumbai bucket is hit twice in one batch and again by a later batch
+    assert ingest([report(mumbai, 10, 5), report(mumbai, 10, 40), report(mumbai, 11, 0)]).status_code == 200
+    assert ingest([report(mumbai, 10, 59), report(delhi, 10, 15, latitude=28.6, longitude=77.2)]).status_code == 200
+
+    response = client.get("/admin/api/stats", params=dict(RANGE, group_by="hour"), auth=admin)
+    assert response.json()["data"] == [
+        {"hour": "2021-04-01T10:00:00", "count": 4},
+        {"hour": "2021-04-01T11:00:00", "count": 1},
+    ]
+    with sqlite3.connect(main.DB_PATH) as conn:
+        buckets = conn.execute(
+            "SELECT hour, cell, count FROM request_rollups_hourly WHERE hour LIKE '2021-04-01%' ORDER BY hour, count"
+        ).fetchall()
+    # One row per bucket: the upsert added to it rather than inserting another
+    assert [count for _, _, count in buckets] == [1, 3, 1]
+    assert len({(hour, cell) for hour, cell, _ in buckets}) == 3
+
+def test_stats_match_the_stored_requests(client, admin, ingest, phone):
+    day = {"start": "2021-04-02T00:00", "end": "2021-04-02T23:59"}
+    attacker = phone()
+    reports = [dict(report(phone(), hour, 30), timestamp=f"2021-04-02T{hour:02d}:30:00") for hour in (1, 2, 2, 9)]
+    reports.append({"phone": attacker, "name": "Kiran", "type_code": "ATTACK", "subtype_code": "BULLETS",
+                    "latitude": 28.6, "longitude": 77.2, "timestamp": "2021-04-02T02:10:00"})
+    assert ingest(reports).json()["summary"] == {"created": 5}
+
+    total = client.get("/admin/api/stats", params=dict(day, group_by=""), auth=admin).json()["total"]
+    assert total == len(client.get("/admin/api/requests", params=day, auth=admin).json()) == 5
+    by_type = client.get("/admin/api/stats", params=dict(day, group_by="type_code"), auth=admin).json()
+    assert by_type["data"] == [{"type_code": "ATTACK", "count": 1}, {"type_code": "MEDICAL", "count": 4}]
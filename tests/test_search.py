@@ -0,0 +1,77 @@
+import sqlite3
+import pytest
+import search
+
+@pytest.fixture
+def db():
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    conn.execute("CREATE TABLE emergency_requests (request_id VARCHAR PRIMARY KEY, details VARCHAR)")
+    assert search.create_index(conn)
+    assert not search.create_index(conn)
+    yield conn
+    conn.close()
+
+def matches(conn, text) -> list:
+    query = search.match_query(text)
+    return sorted(row[0] for row in conn.execute(
+        f"SELECT request_id FROM emergency_requests WHERE rowid IN "
+        f"(SELECT rowid FROM {search.SEARCH_TABLE} WHERE details MATCH ?)", (query,)))
+
+def test_match_query_quotes_every_word_as_a_prefix():
+    assert search.match_query("Bleeding  school") == '"bleeding"* "school"*'
+    assert search.match_query('fire NOT "hospital" OR (near*)') == '"fire"* "not"* "hospital"* "or"* "near"*'
+
+@pytest.mark.parametrize("text", [None, "", "   ", "!!!", '"*-()'])
+def test_match_query_without_words(text):
+    assert search.match_query(text) is None
+    assert search.matching_rowids(text) is None
+
+def test_match_query_keeps_the_first_max_terms_words():
+    words = [f"w{i}" for i in range(search.MAX_TERMS + 3)]
+    assert search.match_query(" ".join(words)).split() == [f'"{word}"*' for word in words[:search.MAX_TERMS]]
+
+def test_index_follows_inserts_updates_and_deletes(db):
+    db.executemany("INSERT INTO emergency_requests VALUES (?, ?)",
+                   [("a", "Heavy bleeding near the school"), ("b", "Fire at the school gate"), ("c", None),
+                    ("d", "Café collapsed")])
+    assert matches(db, "bleed") == ["a"]
+    assert matches(db, "school") == ["a", "b"]
+    assert matches(db, "school fire") == ["b"]
+    assert matches(db, "cafe") == ["d"]
+    assert matches(db, "NOT school") == []
+    db.execute("UPDATE emergency_requests SET details = 'All clear' WHERE request_id = 'b'")
+    db.execute("DELETE FROM emergency_requests WHERE request_id = 'a'")
+    assert matches(db, "school") == []
+    assert matches(db, "clear") == ["b"]
+    db.execute(search.INTEGRITY_CHECK)
+
+def test_search_api_pages_with_cursors_and_filters(client, admin, ingest, phone):
+    day = {"start": "2021-06-01T00:00", "end": "2021-06-01T23:59"}
+    reports = []
+    for i in range(5):
+        reports.append({"phone": phone(), "name": "Pooja", "type_code": "ATTACK", "subtype_code": "ARTILLERY",
+                        "details": f"Shelling near the zorblat market, wave {i}", "latitude": 34.08, "longitude": 74.8,
+                        "timestamp": f"2021-06-01T09:{i:02d}:00"})
+    reports.append({"phone": phone(), "name": "Pooja", "type_code": "INJURY", "subtype_code": "MINOR",
+                    "details": "Zorblat school, two children hurt", "latitude": 34.08, "longitude": 74.8,
+                    "timestamp": "2021-06-01T09:30:00"})
+    reports.append({"phone": phone(), "name": "Pooja", "type_code": "ATTACK", "subtype_code": "ARTILLERY",
+                    "details": "Shelling, no market", "latitude": 34.08, "longitude": 74.8,
+                    "timestamp": "2021-06-01T09:40:00"})
+    assert ingest(reports).json()["summary"] == {"created": 7}
+
+    seen, cursor = [], None
+    while True:
+        params = dict(day, search="zorbl market", type_code="ATTACK", limit=2, **({"cursor": cursor} if cursor else {}))
+        response = client.get("/admin/api/requests", params=params, auth=admin)
+        assert response.status_code == 200
+        seen += response.json()
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert [r["details"][-6:] for r in seen] == [f"wave {i}" for i in range(4, -1, -1)]
+
+    everything = client.get("/admin/api/requests", params=dict(day, search="ZORBLAT"), auth=admin).json()
+    assert sorted(r["type_code"] for r in everything) == ["ATTACK"] * 5 + ["INJURY"]
+    assert client.get("/admin/api/requests", params=dict(day, search="!!!"), auth=admin).json() == []
+    assert client.get("/admin/api/requests", params={"search": "zorblat"}).status_code == 401
@@ -0,0 +1,32 @@
+import pytest
+
+ATTACK = {"type_code": "ATTACK", "subtype_code": "BULLETS", "details": "test", "latitude": 28.6, "longitude": 77.2}
+
+def login(client, phone):
+    assert client.post("/login", data={"phone": phone, "name": "Meera"}).json()["success"]
+
+def test_limit_per_hour_except_medical(client, main, phone):
+    login(client, phone())
+    for _ in range(main.SUBMIT_LIMIT):
+        assert client.post("/submit", data=ATTACK).status_code == 200
+    assert client.post("/submit", data=ATTACK).status_code == 429
+    medical = {"type_code": "MEDICAL", "latitude": 28.6, "longitude": 77.2}
+    assert client.post("/submit", data=medical).status_code == 200
+
+def test_failed_submit_hands_the_slot_back(client, main, phone, monkeypatch):
+    login(client, phone())
+    async def broken(name):
+        raise RuntimeError("crypto pool down")
+    with monkeypatch.context() as patch:
+        patch.setattr(main.crypto, "encrypt", broken)
+        for _ in range(main.SUBMIT_LIMIT + 1):
+            with pytest.raises(RuntimeError):
+                client.post("/submit", data=ATTACK)
+    for _ in range(main.SUBMIT_LIMIT):
+        assert client.post("/submit", data=ATTACK).status_code == 200
+    assert client.post("/submit", data=ATTACK).status_code == 429
+
+def test_submit_needs_a_session(main):
+    from starlette.testclient import TestClient
+    # A fresh client has no session cookie; no lifespan is needed for the 401
+    assert TestClient(main.app).post("/submit", data=ATTACK).status_code == 401